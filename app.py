@@ -1,5 +1,6 @@
 import os
 import sys
+import time
 
 # Ensure site-packages is in path (Windows-specific fix for Store Python)
 if os.name == 'nt':
@@ -7,9 +8,17 @@ if os.name == 'nt':
     if os.path.exists(site_packages) and site_packages not in sys.path:
         sys.path.append(site_packages)
 
-from flask import Flask, render_template, request, jsonify, flash, redirect, url_for, session
-from utils import bytes_human, get_local_ip, get_all_ips
+from flask import Flask, render_template, request, jsonify, flash, redirect, url_for, session, g
+from utils import bytes_human, format_timestamp, get_local_ip, get_all_ips
 from i18n import inject_i18n, tr
+import telemetry
+from server import ensure_cert, serve, start_background
+from sessions import init_sessions, load_secret_key
+
+try:
+    from flask_sock import Sock
+except ImportError:  # optional: interactive PTY terminal
+    Sock = None
 
 # Import routes
 from routes import main, files, terminal, monitor, processes, services, ports, network, disks, system, tasks, logs, power, scripts
@@ -17,14 +26,57 @@ from routes import auth
 
 def create_app():
     app = Flask(__name__)
-    app.secret_key = os.environ.get("FLASK_SECRET_KEY", "dev-secret-key")
 
     base_dir = os.environ.get("RSC_BASE_DIR", os.getcwd())
     scripts_dir = os.environ.get("RSC_SCRIPTS_DIR", os.path.join(base_dir, "scripts"))
 
     app.config["BASE_DIR"] = os.path.abspath(base_dir)
     app.config["SCRIPTS_DIR"] = os.path.abspath(scripts_dir)
+    app.config["DATA_DIR"] = os.path.abspath(os.environ.get("RSC_DATA_DIR", os.path.join(base_dir, ".rsc")))
     app.config["LOCAL_IP"] = get_local_ip()
+    app.secret_key = load_secret_key(app.config["DATA_DIR"])
+    # Production mode server processes (gunicorn workers) and threads per process.
+    # With more than one worker, shared state moves to DATA_DIR (SQLite, lock files).
+    app.config["WORKERS"] = max(1, int(os.environ.get("RSC_WORKERS", "1")))
+    app.config["THREADS"] = max(1, int(os.environ.get("RSC_THREADS", "16")))
+    # Session data lives server-side ("memory" or "sqlite"); the cookie holds only an ID
+    app.config["SESSION_BACKEND"] = os.environ.get("RSC_SESSION_BACKEND", "memory")
+    app.config["SESSION_TTL"] = float(os.environ.get("RSC_SESSION_TTL_HOURS", "24")) * 3600
+    # Not sent with requests started by other sites (CSRF, WebSocket hijacking)
+    app.config["SESSION_COOKIE_SAMESITE"] = "Lax"
+    init_sessions(app)
+    # Optional bearer token for /metrics/prometheus; without it the endpoint needs a login session
+    app.config["METRICS_TOKEN"] = os.environ.get("RSC_METRICS_TOKEN", "")
+    app.config["METRICS_INTERVAL"] = float(os.environ.get("RSC_METRICS_INTERVAL", "1"))
+    app.config["METRICS_HISTORY"] = int(os.environ.get("RSC_METRICS_HISTORY", "600"))
+    # Script run logs: one append-only file per run, rotated at RUN_LOG_MAX_BYTES
+    app.config["RUNS_DIR"] = os.path.join(app.config["DATA_DIR"], "runs")
+    app.config["RUN_LOG_MAX_BYTES"] = int(float(os.environ.get("RSC_RUN_LOG_MAX_MB", "64")) * 1024 * 1024)
+    app.config["RUN_KEEP"] = int(os.environ.get("RSC_RUN_KEEP", "20"))
+    app.config["RUN_MAX_AGE_DAYS"] = float(os.environ.get("RSC_RUN_MAX_AGE_DAYS", "30"))
+    # Runs executing at once (all scripts) and default parallel runs per script
+    app.config["RUN_MAX_WORKERS"] = int(os.environ.get("RSC_RUN_MAX_WORKERS", "4"))
+    app.config["RUN_CONCURRENCY"] = int(os.environ.get("RSC_RUN_CONCURRENCY", "1"))
+    # Delegated cgroup v2 directory (e.g. /sys/fs/cgroup/rsc) for per-run memory/CPU caps
+    app.config["RUN_CGROUP_ROOT"] = os.environ.get("RSC_CGROUP_ROOT") or None
+    # Terminal output history, kept server-side; RSC_TERM_HISTORY_PERSIST=1 also stores it in SQLite
+    app.config["TERM_HISTORY_BUDGET"] = int(float(os.environ.get("RSC_TERM_HISTORY_MB", "32")) * 1024 * 1024)
+    if os.environ.get("RSC_TERM_HISTORY_PERSIST", "0") == "1":
+        app.config["TERM_HISTORY_DB"] = os.path.join(app.config["DATA_DIR"], "terminal.db")
+    # Streamed terminal commands: output cap and hard time limit
+    app.config["TERM_STREAM_MAX_BYTES"] = int(float(os.environ.get("RSC_TERM_STREAM_MAX_MB", "16")) * 1024 * 1024)
+    app.config["TERM_STREAM_TIMEOUT"] = float(os.environ.get("RSC_TERM_STREAM_TIMEOUT", "3600"))
+    # Interactive terminal: concurrent PTY shells, and seconds a detached one survives
+    app.config["PTY_MAX_SESSIONS"] = int(os.environ.get("RSC_PTY_MAX_SESSIONS", "8"))
+    app.config["PTY_IDLE_TIMEOUT"] = float(os.environ.get("RSC_PTY_IDLE_TIMEOUT", "900"))
+    # Threads compressing backups, shared by all downloads
+    app.config["BACKUP_THREADS"] = int(os.environ.get("RSC_BACKUP_THREADS", str(os.cpu_count() or 1)))
+    # File search index; RSC_SEARCH_PERSIST=1 keeps it in DATA_DIR across restarts
+    app.config["SEARCH_PERSIST"] = os.environ.get("RSC_SEARCH_PERSIST", "0") == "1"
+    app.config["PROC_INTERVAL"] = float(os.environ.get("RSC_PROC_INTERVAL", "2"))
+    # Long-term metric history on disk; set RSC_METRICS_STORE=0 to disable
+    if os.environ.get("RSC_METRICS_STORE", "1") == "1":
+        app.config["METRICS_STORE_DIR"] = os.path.join(app.config["DATA_DIR"], "metrics")
 
     # Context processors
     app.context_processor(inject_i18n)
@@ -36,13 +88,25 @@ def create_app():
     
     # Filters
     app.add_template_filter(bytes_human, "bytes_human")
+    app.add_template_filter(format_timestamp, "timestamp")
 
     # Routes
     app.add_url_rule("/", "index", main.index)
     app.add_url_rule("/lang/<lang>", "set_lang", main.set_lang)
     app.add_url_rule("/login", "login", auth.login, methods=["GET", "POST"])
-    app.add_url_rule("/logout", "logout", auth.logout)
+    app.add_url_rule("/logout", "logout", auth.logout, methods=["GET", "POST"])
     
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_latency(response):
+        start = g.get("request_start")
+        if start is not None:
+            telemetry.REQUEST_LATENCY.observe(time.perf_counter() - start, request.endpoint or "unmatched", request.method)
+        return response
+
     @app.before_request
     def require_login():
         from flask import request, redirect, url_for, session
@@ -52,17 +116,26 @@ def create_app():
         allowed = set(["static", "login", "set_lang"])
         if request.endpoint and request.endpoint in allowed:
             return None
+        if request.endpoint == "metrics_prometheus" and app.config["METRICS_TOKEN"]:
+            return None
         if not session.get("auth"):
             next_url = request.full_path if request.query_string else request.path
             return redirect(url_for("login", next=next_url))
+        # Browsers don't apply CORS to WebSocket handshakes: refuse the shell to other sites
+        if request.endpoint == "terminal_ws" and not terminal.same_origin():
+            return (tr("auth.access_denied"), 403)
         return None
     
     app.add_url_rule("/files", "browse", files.browse)
+    app.add_url_rule("/api/files", "api_files", files.api_files)
+    app.add_url_rule("/files/search", "search", files.search)
+    app.add_url_rule("/api/search", "api_search", files.api_search)
     app.add_url_rule("/upload", "upload", files.upload, methods=["POST"])
     app.add_url_rule("/view", "view_file", files.view_file)
     app.add_url_rule("/edit", "edit_file", files.edit_file, methods=["GET", "POST"])
     app.add_url_rule("/download", "download_file", files.download_file)
     app.add_url_rule("/backup", "backup", files.backup, methods=["GET", "POST"])
+    app.add_url_rule("/backup/plan/<backup_id>", "backup_plan", files.backup_plan)
     
     # Trash routes
     app.add_url_rule("/files/trash", "trash_list", files.trash_list)
@@ -75,17 +148,31 @@ def create_app():
     app.add_url_rule("/terminal/exec", "terminal_exec", terminal.terminal_exec, methods=["POST"])
     app.add_url_rule("/terminal/clear", "terminal_clear", terminal.terminal_clear, methods=["POST"])
     app.add_url_rule("/terminal/reset", "terminal_reset", terminal.terminal_reset, methods=["POST"])
+    app.add_url_rule("/terminal/history", "terminal_history", terminal.terminal_history)
+    app.add_url_rule("/terminal/cancel", "terminal_cancel", terminal.terminal_cancel, methods=["POST"])
+    app.add_url_rule("/terminal/pty", "terminal_pty", terminal.terminal_pty)
+    app.add_url_rule("/terminal/pty/close", "terminal_pty_close", terminal.terminal_pty_close, methods=["POST"])
+    if Sock is not None:
+        Sock(app).route("/terminal/ws")(terminal.terminal_ws)
     
     app.add_url_rule("/monitor", "monitor", monitor.monitor)
     app.add_url_rule("/metrics", "metrics", monitor.metrics)
+    app.add_url_rule("/metrics/history", "metrics_history", monitor.metrics_history)
+    app.add_url_rule("/metrics/stream", "metrics_stream", monitor.metrics_stream)
+    app.add_url_rule("/metrics/range", "metrics_range", monitor.metrics_range)
+    app.add_url_rule("/metrics/prometheus", "metrics_prometheus", monitor.metrics_prometheus)
     
     app.add_url_rule("/processes", "processes", processes.processes)
     app.add_url_rule("/processes/kill", "processes_kill", processes.processes_kill, methods=["POST"])
+    app.add_url_rule("/processes/kill_tree", "processes_kill_tree", processes.processes_kill_tree, methods=["POST"])
+    app.add_url_rule("/api/processes", "api_processes", processes.api_processes)
+    app.add_url_rule("/api/processes/tree", "api_processes_tree", processes.api_processes_tree)
     
     app.add_url_rule("/services", "services", services.services)
     app.add_url_rule("/services/action", "services_action", services.services_action, methods=["POST"])
     
     app.add_url_rule("/ports", "ports", ports.ports)
+    app.add_url_rule("/api/ports", "api_ports", ports.api_ports)
     
     app.add_url_rule("/network", "network", network.network, methods=["GET", "POST"])
     
@@ -94,6 +181,9 @@ def create_app():
     app.add_url_rule("/system", "system_info", system.system_info)
     
     app.add_url_rule("/tasks", "tasks", tasks.tasks, methods=["GET", "POST"])
+    app.add_url_rule("/tasks/schedule", "schedule_add", tasks.schedule_add, methods=["POST"])
+    app.add_url_rule("/tasks/schedule/action", "schedule_action", tasks.schedule_action, methods=["POST"])
+    app.add_url_rule("/api/schedules", "api_schedules", tasks.api_schedules)
     
     app.add_url_rule("/logs", "logs", logs.logs, methods=["GET", "POST"])
     
@@ -104,13 +194,24 @@ def create_app():
     app.add_url_rule("/scripts/upload", "upload_script", scripts.upload_script, methods=["POST"])
     app.add_url_rule("/scripts/stop/<name>", "stop_script", scripts.stop_script, methods=["POST"])
     app.add_url_rule("/scripts/output/<name>", "get_script_output", scripts.get_script_output)
+    app.add_url_rule("/scripts/settings/<name>", "script_settings", scripts.script_settings, methods=["POST"])
+    app.add_url_rule("/scripts/history", "script_history", scripts.script_history)
+    app.add_url_rule("/scripts/runs/<name>/<run_id>/output", "get_run_output", scripts.get_run_output)
+    app.add_url_rule("/scripts/runs/<name>/<run_id>/stop", "stop_run", scripts.stop_run, methods=["POST"])
 
     return app
 
 if __name__ == "__main__":
     app = create_app()
     port = int(os.environ.get("PORT", "5000"))
-    debug_flag = os.environ.get("FLASK_DEBUG", "1") == "1"
+    # "prod" (or RSC_MODE=production) serves with a real server and never the debugger
+    production = "prod" in sys.argv or "--prod" in sys.argv or os.environ.get("RSC_MODE") == "production"
+    debug_flag = not production and os.environ.get("FLASK_DEBUG", "1") == "1"
+
+    # Scheduled scripts must fire without anyone opening /tasks. With the reloader
+    # only the child process (WERKZEUG_RUN_MAIN) serves requests, so start it there.
+    if not production and (not debug_flag or os.environ.get("WERKZEUG_RUN_MAIN") == "true"):
+        start_background(app)
     
     local_ip = app.config["LOCAL_IP"]
     all_ips = get_all_ips()
@@ -127,7 +228,11 @@ if __name__ == "__main__":
         else:
             print(f" * Secure Network Access: https://{local_ip}:{port}")
         print(f"{'='*50}\n")
-        app.run(host="0.0.0.0", port=port, debug=debug_flag, use_reloader=debug_flag, ssl_context='adhoc')
+        cert = ensure_cert(app.config["DATA_DIR"])
+        if production:
+            serve(app, "0.0.0.0", port, workers=app.config["WORKERS"], threads=app.config["THREADS"], cert=cert)
+        else:
+            app.run(host="0.0.0.0", port=port, debug=debug_flag, use_reloader=debug_flag, ssl_context=cert)
     else:
         print(f"\n{'='*50}")
         print(f" RSC Server Starting (HTTP Mode)...")
@@ -138,4 +243,7 @@ if __name__ == "__main__":
         else:
             print(f" Network Access: http://{local_ip}:{port}")
         print(f"{'='*50}\n")
-        app.run(host="0.0.0.0", port=port, debug=debug_flag, use_reloader=debug_flag)
+        if production:
+            serve(app, "0.0.0.0", port, workers=app.config["WORKERS"], threads=app.config["THREADS"])
+        else:
+            app.run(host="0.0.0.0", port=port, debug=debug_flag, use_reloader=debug_flag)
@@ -0,0 +1,419 @@
+import os
+import queue
+import struct
+import tarfile
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:  # optional: .tar.zst backups
+    zstandard = None
+
+CHUNK = 64 * 1024  # file read size and the size of chunks handed to the response
+QUEUE_CHUNKS = 16  # chunks buffered between the writer thread and the response
+ZIP64_FILE = 1 << 31  # files larger than this get ZIP64 local headers up front
+BLOCK = 1024 * 1024  # unit of parallel deflate
+WINDOW = 32 * 1024  # deflate history carried into the next block
+SAMPLE = 64 * 1024  # bytes test-compressed to spot incompressible files
+
+# level name -> (deflate level, zstd level); deflate level 0 stores
+LEVELS = {"store": (0, 1), "fast": (1, 1), "normal": (6, 3), "best": (9, 19)}
+
+# Already compressed formats: stored as-is instead of deflated again
+STORE_EXTS = {
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".lz4", ".7z", ".rar", ".cab",
+    ".jar", ".apk", ".whl", ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".epub",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".avif",
+    ".mp3", ".m4a", ".aac", ".ogg", ".opus", ".flac",
+    ".mp4", ".m4v", ".mkv", ".webm", ".avi", ".mov", ".wmv",
+    ".woff", ".woff2",
+}
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+# format -> (mimetype, extension)
+FORMATS = {
+    "zip": ("application/zip", ".zip"),
+    "tar.gz": ("application/gzip", ".tar.gz"),
+    "tar.zst": ("application/zstd", ".tar.zst"),
+}
+
+class ArchiveCancelled(Exception):
+    pass
+
+class QueueSink:
+    """Write-only, unseekable file object feeding a bounded queue. ZIP entries
+    carry data descriptors and tar is written in stream mode, so an archive
+    is produced front to back while the response
+    consumes it; the bounded queue keeps memory constant and stalls the
+    writer when the client reads slowly."""
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=QUEUE_CHUNKS)
+        self.buf = bytearray()
+        self.pos = 0
+        self.cancelled = False
+
+    def write(self, data):
+        self.buf += data
+        self.pos += len(data)
+        if len(self.buf) >= CHUNK:
+            self._put(bytes(self.buf))
+            self.buf.clear()
+        return len(data)
+
+    def tell(self):
+        return self.pos
+
+    def flush(self):
+        pass
+
+    def _put(self, item):
+        while True:
+            if self.cancelled:
+                raise ArchiveCancelled()
+            try:
+                self.queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def finish(self, error=None):
+        if error is None and self.buf:
+            self._put(bytes(self.buf))
+            self.buf.clear()
+        self._put(error)  # None marks the end
+
+def available_formats():
+    return [f for f in FORMATS if f != "tar.zst" or zstandard is not None]
+
+def iter_files(target, exclude=()):
+    """(path, arcname) of every file to archive; names are relative to the
+    parent of `target`, so the archive unpacks into a directory of its name.
+    Directories in `exclude` (absolute paths) are skipped with everything
+    below them."""
+    target = os.path.abspath(target)
+    exclude = {os.path.abspath(p) for p in exclude}
+    if any(os.path.commonpath([target, p]) == p for p in exclude):
+        return
+    if os.path.isfile(target):
+        yield target, os.path.basename(target)
+        return
+    parent = os.path.dirname(target)
+    for dirpath, dirnames, filenames in os.walk(target):
+        dirnames[:] = sorted(d for d in dirnames if os.path.join(dirpath, d) not in exclude)
+        for fn in sorted(filenames):
+            fp = os.path.join(dirpath, fn)
+            if os.path.isfile(fp):
+                yield fp, os.path.relpath(fp, parent).replace(os.sep, "/")
+
+def get_pool(threads):
+    """Compression threads shared by all backups, so concurrent downloads
+    don't multiply the CPU load. zlib releases the GIL while compressing."""
+    global _POOL
+    if threads <= 1:
+        return None
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="rsc-deflate")
+    return _POOL
+
+def incompressible(path, size):
+    """True for known compressed formats, or when a sample from the middle
+    of the file barely shrinks under fast deflate (high entropy data)."""
+    if os.path.splitext(path)[1].lower() in STORE_EXTS:
+        return True
+    if size < 4096:
+        return False
+    try:
+        with open(path, "rb") as f:
+            if size > 2 * SAMPLE:
+                f.seek(size // 2)
+            sample = f.read(SAMPLE)
+    except OSError:
+        return False
+    return len(zlib.compress(sample, 1)) > 0.95 * len(sample)
+
+def deflate_block(data, level, zdict, last):
+    """Raw deflate of one block. Blocks end on a byte boundary (sync flush)
+    so independently compressed blocks concatenate into one valid stream;
+    `zdict` (the previous block's tail) keeps matches across block edges."""
+    if zdict:
+        c = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=zdict)
+    else:
+        c = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return c.compress(data) + c.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+def _submit(pool, fn, *args):
+    if pool is not None:
+        return pool.submit(fn, *args)
+    done = Future()
+    done.set_result(fn(*args))
+    return done
+
+def stream_archive(target, fmt="zip", level="normal", threads=1, exclude=()):
+    """Generator of archive bytes for a file or directory tree, built on a
+    writer thread as the response is sent. Files that can't be read are
+    skipped. Closing the generator (client gone) stops the writer."""
+    return stream_files(iter_files(target, exclude), fmt, level, threads)
+
+def stream_files(files, fmt="zip", level="normal", threads=1):
+    """Like stream_archive() for an iterable of (path, arcname), which is
+    consumed on the writer thread."""
+    deflate_level, zstd_level = LEVELS.get(level, LEVELS["normal"])
+    if fmt == "zip":
+        write = lambda sink: write_zip(sink, files, deflate_level, threads)
+    elif fmt == "tar.gz":
+        write = lambda sink: write_tar_gz(sink, files, deflate_level, threads)
+    elif fmt == "tar.zst" and zstandard is not None:
+        write = lambda sink: write_tar_zst(sink, files, zstd_level, threads)
+    else:
+        raise ValueError(f"Unsupported archive format: {fmt}")
+    return _pipe(write)
+
+def _pipe(write):
+    sink = QueueSink()
+
+    def produce():
+        try:
+            write(sink)
+        except ArchiveCancelled:
+            return
+        except Exception as e:
+            try:
+                sink.finish(e)
+            except ArchiveCancelled:
+                pass
+            return
+        try:
+            sink.finish()
+        except ArchiveCancelled:
+            pass
+
+    threading.Thread(target=produce, name="rsc-archive", daemon=True).start()
+    try:
+        while True:
+            item = sink.queue.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item  # the download ends truncated
+            yield item
+    finally:
+        sink.cancelled = True
+
+class _OrderedOutput:
+    """Writes pieces to `out` in submission order while up to `window` of
+    them are still being compressed. Pieces are bytes, Futures of bytes, or
+    callables run at write time (for headers that need final offsets)."""
+
+    def __init__(self, out, window):
+        self.out = out
+        self.window = window
+        self.pending = deque()
+        self.pos = 0
+
+    def put(self, item):
+        self.pending.append(item)
+        while len(self.pending) > self.window:
+            self._write_one()
+
+    def _write_one(self):
+        item = self.pending.popleft()
+        if isinstance(item, Future):
+            item = item.result()
+        elif callable(item):
+            item = item()
+        if item:
+            self.out.write(item)
+            self.pos += len(item)
+
+    def drain(self):
+        while self.pending:
+            self._write_one()
+
+class _ParallelDeflater:
+    """Splits one logical stream into BLOCK-sized pieces deflated on the pool
+    and emitted in order, tracking CRC-32 and length of the raw data. With
+    `level` None the data is passed through uncompressed (ZIP "stored")."""
+
+    def __init__(self, output, pool, level):
+        self.output = output
+        self.pool = pool
+        self.level = level
+        self.buf = bytearray()
+        self.tail = b""
+        self.crc = 0
+        self.size = 0
+
+    def write(self, data):
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+        if self.level is None:
+            self.output.put(data)
+            return len(data)
+        self.buf += data
+        while len(self.buf) >= BLOCK:
+            self._block(bytes(self.buf[:BLOCK]), False)
+            del self.buf[:BLOCK]
+        return len(data)
+
+    def tell(self):
+        return self.size
+
+    def set_level(self, level):
+        """Switch level at this point of the stream: what is buffered so far
+        is emitted as a block at the old level first."""
+        if level != self.level and self.buf:
+            self._block(bytes(self.buf), False)
+            self.buf.clear()
+        self.level = level
+
+    def _block(self, data, last):
+        self.output.put(_submit(self.pool, deflate_block, data, self.level, self.tail, last))
+        self.tail = data[-WINDOW:] if self.level else b""
+
+    def finish(self):
+        if self.level is None:
+            return
+        self._block(bytes(self.buf), True)
+        self.buf.clear()
+
+def _dos_time(mtime):
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1  # 1980-01-01 00:00
+    year = min(t.tm_year, 2107) - 1980
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), (year << 9) | (t.tm_mon << 5) | t.tm_mday
+
+def write_zip(out, files, level=6, threads=1):
+    """ZIP written front to back: each entry has a data descriptor after its
+    data, ZIP64 fields are used where sizes, offsets or the entry count need
+    them. Files are deflated in blocks on the shared pool, or stored when
+    `level` is 0 or the content looks incompressible."""
+    pool = get_pool(threads)
+    output = _OrderedOutput(out, max(2, threads * 2))
+    entries = []
+    for path, arcname in files:
+        try:
+            st = os.stat(path)
+            f = open(path, "rb")
+        except OSError:
+            continue
+        with f:
+            stored = level == 0 or incompressible(path, st.st_size)
+            entry = {
+                "name": arcname.encode("utf-8"),
+                "method": 0 if stored else 8,
+                "zip64": st.st_size > ZIP64_FILE,
+                "mode": st.st_mode,
+                "dos": _dos_time(st.st_mtime),
+            }
+            entries.append(entry)
+            output.put(lambda e=entry: _zip_local_header(e, output.pos))
+            deflater = _ParallelDeflater(output, pool, None if stored else level)
+            remaining = st.st_size  # a file growing meanwhile is cut at its stat size
+            while remaining > 0:
+                data = f.read(min(CHUNK if stored else BLOCK, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                deflater.write(data)
+            deflater.finish()
+            output.put(lambda e=entry, d=deflater: _zip_descriptor(e, d, output.pos))
+    output.drain()
+    out.write(_zip_central(entries, output.pos))
+
+def _zip_local_header(entry, offset):
+    entry["offset"] = offset
+    extra = b""
+    size32 = 0
+    if entry["zip64"]:
+        extra = struct.pack("<HHQQ", 1, 16, 0, 0)
+        size32 = 0xFFFFFFFF
+    name = entry["name"]
+    entry["data_start"] = offset + 30 + len(name) + len(extra)
+    return struct.pack(
+        "<IHHHHHIIIHH", 0x04034B50, 45 if entry["zip64"] else 20, 0x0808, entry["method"],
+        entry["dos"][0], entry["dos"][1], 0, size32, size32, len(name), len(extra),
+    ) + name + extra
+
+def _zip_descriptor(entry, deflater, pos):
+    entry["crc"] = deflater.crc
+    entry["size"] = deflater.size
+    entry["csize"] = pos - entry["data_start"]
+    if entry["zip64"]:
+        return struct.pack("<IIQQ", 0x08074B50, entry["crc"], entry["csize"], entry["size"])
+    return struct.pack("<IIII", 0x08074B50, entry["crc"], entry["csize"], entry["size"])
+
+def _zip_central(entries, cd_offset):
+    cd = bytearray()
+    for e in entries:
+        extra = b""
+        size, csize, offset = e["size"], e["csize"], e["offset"]
+        fields = []
+        for value in (size, csize, offset):
+            if value >= 0xFFFFFFFF:
+                fields.append(value)
+        if fields:
+            extra = struct.pack("<HH", 1, 8 * len(fields)) + struct.pack("<%dQ" % len(fields), *fields)
+            size, csize, offset = (min(v, 0xFFFFFFFF) for v in (size, csize, offset))
+        needed = 45 if (fields or e["zip64"]) else 20
+        cd += struct.pack(
+            "<IHHHHHHIIIHHHHHII", 0x02014B50, (3 << 8) | 45, needed, 0x0808, e["method"],
+            e["dos"][0], e["dos"][1], e["crc"], csize, size, len(e["name"]), len(extra),
+            0, 0, 0, (e["mode"] & 0xFFFF) << 16, offset,
+        ) + e["name"] + extra
+    end = bytearray(cd)
+    count, cd_size = len(entries), len(cd)
+    if count >= 0xFFFF or cd_size >= 0xFFFFFFFF or cd_offset >= 0xFFFFFFFF:
+        zip64_end = cd_offset + cd_size
+        end += struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, (3 << 8) | 45, 45, 0, 0,
+                           count, count, cd_size, cd_offset)
+        end += struct.pack("<IIQI", 0x07064B50, 0, zip64_end, 1)
+        count, cd_size, cd_offset = min(count, 0xFFFF), min(cd_size, 0xFFFFFFFF), min(cd_offset, 0xFFFFFFFF)
+    end += struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, count, count, cd_size, cd_offset, 0)
+    return bytes(end)
+
+def write_tar_gz(out, files, level=6, threads=1):
+    """tar.gz with the gzip body deflated in parallel blocks (as pigz does):
+    one gzip member whose deflate stream is the concatenation of the blocks.
+    Incompressible files pass through as stored deflate blocks. The tar is
+    written in "w" rather than stream mode, so tarfile keeps no buffer of its
+    own and a level change applies exactly from the next file's header."""
+    output = _OrderedOutput(out, max(2, threads * 2))
+    deflater = _ParallelDeflater(output, get_pool(threads), level)
+    output.put(struct.pack("<BBBBIBB", 0x1F, 0x8B, 8, 0, int(time.time()), 0, 255))
+    with tarfile.open(fileobj=deflater, mode="w", format=tarfile.PAX_FORMAT) as tf:
+        for path, arcname in files:
+            try:
+                info = tf.gettarinfo(path, arcname)
+                f = open(path, "rb")
+            except OSError:
+                continue
+            with f:
+                deflater.set_level(0 if level == 0 or incompressible(path, info.size) else level)
+                tf.addfile(info, f)
+    deflater.finish()
+    output.drain()
+    out.write(struct.pack("<II", deflater.crc, deflater.size & 0xFFFFFFFF))
+
+def write_tar_zst(out, files, level=3, threads=1):
+    # zstd has its own worker threads
+    comp = zstandard.ZstdCompressor(level=level, threads=threads if threads > 1 else 0)
+    with comp.stream_writer(out, closefd=False) as zst, \
+            tarfile.open(fileobj=zst, mode="w|", format=tarfile.PAX_FORMAT) as tf:
+        for path, arcname in files:
+            try:
+                info = tf.gettarinfo(path, arcname)
+                f = open(path, "rb")
+            except OSError:
+                continue
+            with f:
+                tf.addfile(info, f)
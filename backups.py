@@ -0,0 +1,252 @@
+import gzip
+import hashlib
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from archive import FORMATS, iter_files
+
+HASH_CHUNK = 1024 * 1024
+MANIFEST_DIR = ".rsc-backup"  # folder holding the manifest inside each archive
+PENDING_MAX_AGE = 86400  # unfinished downloads leave a pending manifest behind
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+def new_backup_id():
+    return time.strftime("%Y%m%d-%H%M%S") + "-" + secrets.token_hex(2)
+
+def file_hash(path):
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(HASH_CHUNK)
+                if not data:
+                    break
+                h.update(data)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+class HashCache:
+    """SHA-256 of files by absolute path, valid while size and mtime match."""
+
+    def __init__(self, path):
+        self.path = path
+        db = sqlite3.connect(path, timeout=10)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("CREATE TABLE IF NOT EXISTS hashes (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, hash TEXT)")
+        db.commit()
+        db.close()
+
+    def load(self, prefix):
+        """{path: (size, mtime_ns, hash)} for everything under `prefix`."""
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            rows = db.execute("SELECT path, size, mtime, hash FROM hashes WHERE path >= ? AND path < ?",
+                              (prefix, prefix + "\uffff")).fetchall()
+        finally:
+            db.close()
+        return {r[0]: (r[1], r[2], r[3]) for r in rows}
+
+    def store(self, rows):
+        if not rows:
+            return
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:
+                db.executemany("INSERT OR REPLACE INTO hashes (path, size, mtime, hash) VALUES (?, ?, ?, ?)", rows)
+        finally:
+            db.close()
+
+class BackupStore:
+    """Manifests of past backups, one chain per target directory. A full
+    backup archives everything; an incremental one only files whose content
+    changed since the previous backup of the same target. Each manifest
+    lists every file of the target as [size, mtime_ns, sha256, backup_id],
+    the last field naming the archive that holds that version, which is
+    what the restore plan is built from.
+
+    A file whose size and mtime match the previous manifest is not read at
+    all; otherwise its hash comes from the cache when size and mtime match
+    there, and is computed only as a last resort. A touched but unchanged
+    file is therefore hashed once and not archived again.
+
+    Manifests are committed only once the archive was sent completely, so
+    an interrupted download never becomes the base of the next increment."""
+
+    def __init__(self, root, base_dir, exclude=()):
+        self.root = root
+        self.base_dir = base_dir
+        # Never archived: DATA_DIR with the secret key, and always the store itself,
+        # or each backup of a parent would carry every earlier manifest
+        self.exclude = [os.path.abspath(root)] + list(exclude)
+        self.dir = os.path.join(root, "manifests")
+        os.makedirs(self.dir, exist_ok=True)
+        self.hashes = HashCache(os.path.join(root, "hashes.db"))
+
+    def _summary_path(self, backup_id, pending=False):
+        return os.path.join(self.dir, backup_id + (".pending" if pending else ".json"))
+
+    def _files_path(self, backup_id):
+        return os.path.join(self.dir, backup_id + ".files.json.gz")
+
+    def list(self, target=None):
+        """Summaries of committed backups, newest first."""
+        out = []
+        now = time.time()
+        for name in os.listdir(self.dir):
+            path = os.path.join(self.dir, name)
+            if name.endswith(".pending"):
+                try:
+                    if now - os.path.getmtime(path) > PENDING_MAX_AGE:
+                        self.discard(name[:-len(".pending")])
+                except OSError:
+                    pass
+                continue
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    summary = json.load(f)
+            except Exception:
+                continue
+            if target is None or summary.get("target") == target:
+                out.append(summary)
+        out.sort(key=lambda s: s.get("created") or 0, reverse=True)
+        return out
+
+    def get(self, backup_id):
+        try:
+            with open(self._summary_path(backup_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def files(self, backup_id):
+        with gzip.open(self._files_path(backup_id), "rt", encoding="utf-8") as f:
+            return json.load(f)
+
+    def latest(self, target):
+        backups = self.list(target)
+        return backups[0] if backups else None
+
+    def start(self, target, fmt, incremental):
+        """New backup of `target` (absolute path). Returns the summary and
+        the (path, arcname) iterator for the archive writer; the iterator
+        ends with the manifest itself. Call commit() after the archive was
+        fully sent."""
+        rel = os.path.relpath(target, self.base_dir)
+        parent = self.latest(rel) if incremental else None
+        backup_id = new_backup_id()
+        name = os.path.basename(target) or "backup"
+        summary = {
+            "id": backup_id,
+            "target": rel,
+            "kind": "incremental" if parent else "full",
+            "parent": parent["id"] if parent else None,
+            "base": parent["base"] if parent else backup_id,
+            "format": fmt,
+            "archive": f"{name}-{backup_id}{FORMATS[fmt][1]}",
+            "created": time.time(),
+        }
+        return summary, self._files(summary, target, parent)
+
+    def _files(self, summary, target, parent):
+        prev = self.files(parent["id"]) if parent else {}
+        cache = self.hashes.load(target)
+        new_hashes = []
+        files = {}
+        archived = archived_bytes = 0
+        for path, arcname in iter_files(target, self.exclude):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            size, mtime = st.st_size, st.st_mtime_ns
+            old = prev.get(arcname)
+            if old and old[0] == size and old[1] == mtime:
+                files[arcname] = old  # unchanged: not even read
+                continue
+            cached = cache.get(path)
+            if cached and cached[0] == size and cached[1] == mtime:
+                digest = cached[2]
+            else:
+                digest = file_hash(path)
+                if digest is None:
+                    continue
+                new_hashes.append((path, size, mtime, digest))
+            if old and old[2] == digest:
+                files[arcname] = [size, mtime, digest, old[3]]  # touched, same content
+                continue
+            files[arcname] = [size, mtime, digest, summary["id"]]
+            archived += 1
+            archived_bytes += size
+            yield path, arcname
+        self.hashes.store(new_hashes)
+        summary.update(
+            files=len(files),
+            bytes=sum(f[0] for f in files.values()),
+            archived=archived,
+            archived_bytes=archived_bytes,
+            deleted=sorted(set(prev) - set(files)),
+        )
+        # Written now so the manifest also travels inside the archive
+        files_path = self._files_path(summary["id"])
+        with gzip.open(files_path, "wt", encoding="utf-8") as f:
+            json.dump(files, f)
+        with open(self._summary_path(summary["id"], pending=True), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        yield files_path, f"{MANIFEST_DIR}/{summary['id']}.files.json.gz"
+
+    def commit(self, summary):
+        os.replace(self._summary_path(summary["id"], pending=True), self._summary_path(summary["id"]))
+
+    def discard(self, backup_id):
+        for path in (self._summary_path(backup_id, pending=True), self._files_path(backup_id)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def plan(self, backup_id):
+        """Archives to extract to restore `backup_id`: base first, then each
+        increment, each with the files to take from it. Files deleted since
+        the base are in none of the lists, so they don't come back."""
+        summary = self.get(backup_id)
+        if summary is None:
+            return None
+        chain = []
+        cur = summary
+        while cur is not None:
+            chain.append(cur)
+            cur = self.get(cur["parent"]) if cur.get("parent") else None
+        chain.reverse()
+        by_backup = {}
+        for arcname, entry in self.files(backup_id).items():
+            by_backup.setdefault(entry[3], []).append(arcname)
+        steps = []
+        for s in chain:
+            names = sorted(by_backup.pop(s["id"], []))
+            if names:
+                steps.append({"backup": s["id"], "archive": s["archive"], "kind": s["kind"], "files": names})
+        return {
+            "backup": backup_id,
+            "target": summary["target"],
+            "files": summary.get("files", 0),
+            "bytes": summary.get("bytes", 0),
+            "steps": steps,
+            "missing": sorted(n for names in by_backup.values() for n in names),
+        }
+
+def get_backup_store(app):
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = BackupStore(os.path.join(app.config["DATA_DIR"], "backups"), app.config["BASE_DIR"],
+                                     exclude=[app.config["DATA_DIR"]])
+    return _STORE
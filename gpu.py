@@ -0,0 +1,188 @@
+import shutil
+import subprocess
+import threading
+import time
+
+class GpuBackend:
+    """Interface for GPU metric sources. `open()` raises when the backend is
+    unusable on this host; `read()` returns a list of GPU dicts."""
+    name = "base"
+    # Minimum seconds between real reads; the provider serves cached data in between
+    min_interval = 0.0
+
+    def open(self):
+        pass
+
+    def read(self):
+        return []
+
+    def close(self):
+        pass
+
+class NvmlBackend(GpuBackend):
+    name = "nvml"
+
+    def __init__(self):
+        self.nvml = None
+        self.devices = []
+
+    def open(self):
+        import pynvml
+        pynvml.nvmlInit()
+        self.nvml = pynvml
+        self.devices = []
+        count = pynvml.nvmlDeviceGetCount()
+        if not count:
+            # Let the next backend try, and keep re-probing for a GPU
+            raise RuntimeError("NVML reported no GPUs")
+        for i in range(count):
+            h = pynvml.nvmlDeviceGetHandleByIndex(i)
+            name = pynvml.nvmlDeviceGetName(h)
+            if isinstance(name, bytes):
+                name = name.decode("utf-8", errors="ignore")
+            self.devices.append((i, h, name))
+
+    def read(self):
+        nvml = self.nvml
+        gpus = []
+        for i, h, name in self.devices:
+            util = nvml.nvmlDeviceGetUtilizationRates(h)
+            mem = nvml.nvmlDeviceGetMemoryInfo(h)
+            gpus.append(
+                {
+                    "index": i,
+                    "name": name,
+                    "util_percent": int(getattr(util, "gpu", 0)),
+                    "mem_total": int(getattr(mem, "total", 0)),
+                    "mem_used": int(getattr(mem, "used", 0)),
+                }
+            )
+        return gpus
+
+    def close(self):
+        if self.nvml is not None:
+            try:
+                self.nvml.nvmlShutdown()
+            except Exception:
+                pass
+        self.nvml = None
+        self.devices = []
+
+class NvidiaSmiBackend(GpuBackend):
+    name = "nvidia-smi"
+    # Each read forks a process, so don't do it on every sample
+    min_interval = 5.0
+
+    def __init__(self):
+        self.binary = None
+
+    def open(self):
+        self.binary = shutil.which("nvidia-smi")
+        if not self.binary:
+            raise RuntimeError("nvidia-smi not found")
+        if not self.read():
+            raise RuntimeError("nvidia-smi reported no GPUs")
+
+    def read(self):
+        gpus = []
+        proc = subprocess.run(
+            [self.binary, "--query-gpu=name,utilization.gpu,memory.total,memory.used", "--format=csv,noheader,nounits"],
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            timeout=3,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip() or "nvidia-smi failed")
+        for idx, line in enumerate(proc.stdout.strip().splitlines()):
+            parts = [p.strip() for p in line.split(",")]
+            if len(parts) >= 4:
+                try:
+                    name, util, mem_total, mem_used = parts[:4]
+                    gpus.append(
+                        {
+                            "index": idx,
+                            "name": name,
+                            "util_percent": int(float(util)),
+                            "mem_total": int(float(mem_total) * 1024 * 1024),  # MB -> bytes
+                            "mem_used": int(float(mem_used) * 1024 * 1024),
+                        }
+                    )
+                except Exception:
+                    continue
+        return gpus
+
+class GpuProvider:
+    """Keeps one GPU backend open for the life of the process. The first
+    backend whose open() succeeds wins; if none do, "no GPU" is remembered
+    and probing is retried only every `reprobe_interval` seconds."""
+
+    def __init__(self, backends=None, reprobe_interval=300.0):
+        self.backend_factories = backends or [NvmlBackend, NvidiaSmiBackend]
+        self.reprobe_interval = reprobe_interval
+        self.backend = None
+        self.next_probe = 0.0
+        self.cache = []
+        self.cache_time = 0.0
+        self.lock = threading.Lock()
+
+    def _probe(self):
+        for factory in self.backend_factories:
+            backend = factory() if isinstance(factory, type) else factory
+            try:
+                backend.open()
+                return backend
+            except Exception:
+                try:
+                    backend.close()
+                except Exception:
+                    pass
+        return None
+
+    def read(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.backend is None:
+                if now < self.next_probe:
+                    return []
+                self.backend = self._probe()
+                if self.backend is None:
+                    self.next_probe = now + self.reprobe_interval
+                    return []
+            if self.cache_time and now - self.cache_time < self.backend.min_interval:
+                return self.cache
+            try:
+                self.cache = self.backend.read()
+                self.cache_time = now
+            except Exception:
+                # Driver went away or device vanished: drop it and re-probe later
+                self.backend.close()
+                self.backend = None
+                self.cache = []
+                self.cache_time = 0.0
+                self.next_probe = now + self.reprobe_interval
+            return self.cache
+
+    def close(self):
+        with self.lock:
+            if self.backend is not None:
+                self.backend.close()
+            self.backend = None
+            self.cache = []
+            self.cache_time = 0.0
+            self.next_probe = 0.0
+
+_PROVIDER = GpuProvider()
+
+def get_gpu_provider():
+    return _PROVIDER
+
+def set_gpu_provider(provider):
+    """Swap the process-wide provider, e.g. for one built on a fake backend."""
+    global _PROVIDER
+    old = _PROVIDER
+    _PROVIDER = provider
+    if old is not provider:
+        old.close()
+    return provider
@@ -214,9 +214,9 @@ TRANSLATIONS = {
         "logs.date": "Date",
         "logs.select_msg": "Select a log file to view",
         "logs.last_lines": "Last 400 lines",
-        "backup.warning": "Create zip up to 100 MB. Path must be within BASE_DIR.",
+        "backup.warning": "The archive is streamed while it is being created, with no size limit. Path must be within BASE_DIR.",
         "backup.path_ph": "Relative path from BASE_DIR or filename",
-        "backup.download_btn": "Download ZIP",
+        "backup.download_btn": "Download archive",
         "power.disabled_msg": "To enable actions set env variable ALLOW_POWER=1. Actions disabled.",
         "mon.freq": "Freq",
         "mon.cores": "Cores",
@@ -273,7 +273,94 @@ TRANSLATIONS = {
         "power.reboot_init": "Reboot initiated",
         "power.shutdown_init": "Shutdown initiated",
         "backup.invalid_path": "Invalid path",
-        "backup.limit_exceeded": "Archive size exceeds 100MB limit",
+        "monitor.history": "History",
+        "mon.disk_pct": "Disk %",
+        "proc.threads": "Threads",
+        "proc.io": "I/O",
+        "proc.search_ph": "Name, PID or pattern",
+        "proc.regex": "Regex",
+        "proc.live": "Live",
+        "proc.load_more": "Load more",
+        "proc.tree": "Tree",
+        "proc.fds": "files",
+        "proc.kill_tree": "Kill tree",
+        "proc.kill_tree_confirm": "Terminate this process and all of its children?",
+        "proc.tree_terminated": "Process tree terminated",
+        "ports.port": "Port",
+        "ports.filter": "Filter",
+        "ports.reset": "Reset",
+        "ports.shown": "Shown",
+        "scripts.history": "Run history",
+        "scripts.all_runs": "All scripts",
+        "scripts.queued": "Queued",
+        "scripts.workers": "Workers",
+        "scripts.concurrency": "Max parallel runs",
+        "scripts.run_id": "Run",
+        "scripts.started": "Started",
+        "scripts.duration": "Duration",
+        "scripts.peak_rss": "Peak RSS",
+        "scripts.no_runs": "No runs recorded",
+        "msg.run_queued": "All workers are busy, run queued",
+        "msg.run_queue_full": "Run queue is full",
+        "scripts.limits": "Limits",
+        "scripts.max_wall": "Max wall time, s",
+        "scripts.max_rss": "Max RSS, MB",
+        "scripts.cpu_pct": "CPU cap, % of one core",
+        "scripts.limits_hint": "Leave empty for no limit. Runs exceeding wall time or RSS are killed with their child processes; the CPU cap needs a cgroup v2 root (RSC_CGROUP_ROOT).",
+        "scripts.cpu_time": "CPU time",
+        "scripts.killed": "Killed",
+        "msg.settings_saved": "Settings saved",
+        "sched.title": "Scheduled scripts",
+        "sched.add": "Add",
+        "sched.added": "Schedule added",
+        "sched.bad_cron": "Invalid cron expression",
+        "sched.cron": "Schedule",
+        "sched.cron_hint": "minute hour day month weekday, e.g. */15 * * * * or @daily",
+        "sched.jitter": "Jitter, s",
+        "sched.catchup": "Missed runs",
+        "sched.catchup_skip": "Skip missed",
+        "sched.catchup_once": "Catch up once",
+        "sched.last": "Last run",
+        "sched.skipped_missed": "Skipped (still running) / missed",
+        "sched.none": "No schedules",
+        "term.pty_mode": "Interactive terminal (PTY)",
+        "term.simple_mode": "Command mode",
+        "term.pty_close": "End session",
+        "term.pty_close_confirm": "End the shell session? Running programs will be terminated.",
+        "term.pty_connected": "Connected",
+        "term.pty_disconnected": "Disconnected",
+        "term.pty_unavailable": "Interactive terminal needs Linux/macOS and the flask-sock package",
+        "term.cancel": "Cancel",
+        "nav.logout": "Log out",
+        "nav.logout_all": "Log out all sessions",
+        "backup.format": "Format",
+        "backup.level": "Compression",
+        "backup.level_store": "No compression",
+        "backup.level_fast": "Fast",
+        "backup.level_normal": "Normal",
+        "backup.level_best": "Maximum",
+        "backup.mode": "Mode",
+        "backup.full": "Full",
+        "backup.incremental": "Incremental",
+        "backup.archive": "Archive",
+        "backup.target": "Path",
+        "backup.archived": "In archive",
+        "backup.total": "Total",
+        "backup.plan": "Restore plan",
+        "backup.plan_hint": "Extract the listed files from each archive in this order; later archives override earlier ones. Files deleted since the full backup are not listed.",
+        "backup.plan_missing": "Files whose archive is no longer known",
+        "backup.plan_files": "Files",
+        "table.modified": "Modified",
+        "search.title": "Search",
+        "search.placeholder": "File or folder name, e.g. report, *.log or src/main",
+        "search.mode_substring": "Contains",
+        "search.mode_glob": "Glob",
+        "search.mode_fuzzy": "Fuzzy",
+        "search.in": "Only in",
+        "search.folder": "Folder",
+        "search.hint": "Matches names; a \"/\" also matches the folder they are in",
+        "search.indexing": "Indexing files…",
+        "search.indexed": "indexed",
     },
     "ru": {
         "nav.home": "Главная",
@@ -488,9 +575,9 @@ TRANSLATIONS = {
         "logs.date": "Дата",
         "logs.select_msg": "Выберите файл лога для просмотра",
         "logs.last_lines": "Последние 400 строк",
-        "backup.warning": "Создание zip до 100 MB. Путь должен быть в пределах BASE_DIR.",
+        "backup.warning": "Архив передаётся по мере создания, без ограничения размера. Путь должен быть в пределах BASE_DIR.",
         "backup.path_ph": "Относительный путь от BASE_DIR или имя файла",
-        "backup.download_btn": "Скачать ZIP",
+        "backup.download_btn": "Скачать архив",
         "power.disabled_msg": "Для включения действий установите переменную окружения ALLOW_POWER=1. Пока действия отключены.",
         "mon.freq": "Частота",
         "mon.cores": "Ядра",
@@ -547,7 +634,94 @@ TRANSLATIONS = {
         "power.reboot_init": "Перезагрузка инициирована",
         "power.shutdown_init": "Выключение инициировано",
         "backup.invalid_path": "Недопустимый путь",
-        "backup.limit_exceeded": "Размер архива превышает лимит 100MB",
+        "monitor.history": "История",
+        "mon.disk_pct": "Диск %",
+        "proc.threads": "Потоки",
+        "proc.io": "Ввод/вывод",
+        "proc.search_ph": "Имя, PID или шаблон",
+        "proc.regex": "Регулярное выражение",
+        "proc.live": "Автообновление",
+        "proc.load_more": "Показать ещё",
+        "proc.tree": "Дерево",
+        "proc.fds": "файлы",
+        "proc.kill_tree": "Завершить дерево",
+        "proc.kill_tree_confirm": "Завершить этот процесс и все его дочерние процессы?",
+        "proc.tree_terminated": "Дерево процессов завершено",
+        "ports.port": "Порт",
+        "ports.filter": "Фильтр",
+        "ports.reset": "Сбросить",
+        "ports.shown": "Показано",
+        "scripts.history": "История запусков",
+        "scripts.all_runs": "Все скрипты",
+        "scripts.queued": "В очереди",
+        "scripts.workers": "Исполнители",
+        "scripts.concurrency": "Макс. параллельных запусков",
+        "scripts.run_id": "Запуск",
+        "scripts.started": "Начало",
+        "scripts.duration": "Длительность",
+        "scripts.peak_rss": "Пик RSS",
+        "scripts.no_runs": "Запусков нет",
+        "msg.run_queued": "Все исполнители заняты, запуск поставлен в очередь",
+        "msg.run_queue_full": "Очередь запусков заполнена",
+        "scripts.limits": "Ограничения",
+        "scripts.max_wall": "Макс. время, с",
+        "scripts.max_rss": "Макс. RSS, МБ",
+        "scripts.cpu_pct": "Лимит CPU, % одного ядра",
+        "scripts.limits_hint": "Пустое поле — без ограничения. Запуски, превысившие время или RSS, завершаются вместе с дочерними процессами; лимит CPU требует корня cgroup v2 (RSC_CGROUP_ROOT).",
+        "scripts.cpu_time": "Время CPU",
+        "scripts.killed": "Прерван",
+        "msg.settings_saved": "Настройки сохранены",
+        "sched.title": "Запуск скриптов по расписанию",
+        "sched.add": "Добавить",
+        "sched.added": "Расписание добавлено",
+        "sched.bad_cron": "Неверное cron-выражение",
+        "sched.cron": "Расписание",
+        "sched.cron_hint": "минута час день месяц день_недели, напр. */15 * * * * или @daily",
+        "sched.jitter": "Разброс, с",
+        "sched.catchup": "Пропущенные запуски",
+        "sched.catchup_skip": "Пропускать",
+        "sched.catchup_once": "Догнать один раз",
+        "sched.last": "Последний запуск",
+        "sched.skipped_missed": "Пропущено (ещё работает) / упущено",
+        "sched.none": "Расписаний нет",
+        "term.pty_mode": "Интерактивный терминал (PTY)",
+        "term.simple_mode": "Режим команд",
+        "term.pty_close": "Завершить сеанс",
+        "term.pty_close_confirm": "Завершить сеанс оболочки? Запущенные программы будут остановлены.",
+        "term.pty_connected": "Подключено",
+        "term.pty_disconnected": "Отключено",
+        "term.pty_unavailable": "Интерактивному терминалу нужны Linux/macOS и пакет flask-sock",
+        "term.cancel": "Отмена",
+        "nav.logout": "Выйти",
+        "nav.logout_all": "Завершить все сеансы",
+        "backup.format": "Формат",
+        "backup.level": "Сжатие",
+        "backup.level_store": "Без сжатия",
+        "backup.level_fast": "Быстрое",
+        "backup.level_normal": "Обычное",
+        "backup.level_best": "Максимальное",
+        "backup.mode": "Режим",
+        "backup.full": "Полный",
+        "backup.incremental": "Инкрементный",
+        "backup.archive": "Архив",
+        "backup.target": "Путь",
+        "backup.archived": "В архиве",
+        "backup.total": "Всего",
+        "backup.plan": "План восстановления",
+        "backup.plan_hint": "Распакуйте перечисленные файлы из каждого архива в указанном порядке; более поздние архивы заменяют ранние. Файлы, удалённые после полного бэкапа, не перечислены.",
+        "backup.plan_missing": "Файлы, архив которых больше неизвестен",
+        "backup.plan_files": "Файлы",
+        "table.modified": "Изменён",
+        "search.title": "Поиск",
+        "search.placeholder": "Имя файла или папки, например report, *.log или src/main",
+        "search.mode_substring": "Содержит",
+        "search.mode_glob": "Шаблон",
+        "search.mode_fuzzy": "Нечёткий",
+        "search.in": "Только в",
+        "search.folder": "Папка",
+        "search.hint": "Ищет по именам; с \"/\" учитывается и папка",
+        "search.indexing": "Индексация файлов…",
+        "search.indexed": "в индексе",
     },
     "cs": {
         "nav.home": "Domů",
@@ -762,9 +936,9 @@ TRANSLATIONS = {
         "logs.date": "Datum",
         "logs.select_msg": "Vyberte soubor logu k zobrazení",
         "logs.last_lines": "Posledních 400 řádků",
-        "backup.warning": "Vytvoření zip do 100 MB. Cesta musí být uvnitř BASE_DIR.",
+        "backup.warning": "Archiv se odesílá průběžně během vytváření, bez omezení velikosti. Cesta musí být uvnitř BASE_DIR.",
         "backup.path_ph": "Relativní cesta od BASE_DIR nebo název souboru",
-        "backup.download_btn": "Stáhnout ZIP",
+        "backup.download_btn": "Stáhnout archiv",
         "power.disabled_msg": "Pro povolení akcí nastavte proměnnou prostředí ALLOW_POWER=1. Akce jsou zakázány.",
         "mon.freq": "Frekvence",
         "mon.cores": "Jádra",
@@ -821,6 +995,93 @@ TRANSLATIONS = {
         "power.reboot_init": "Restart zahájen",
         "power.shutdown_init": "Vypnutí zahájeno",
         "backup.invalid_path": "Neplatná cesta",
-        "backup.limit_exceeded": "Velikost archivu překračuje limit 100 MB",
+        "monitor.history": "Historie",
+        "mon.disk_pct": "Disk %",
+        "proc.threads": "Vlákna",
+        "proc.io": "I/O",
+        "proc.search_ph": "Název, PID nebo vzor",
+        "proc.regex": "Regulární výraz",
+        "proc.live": "Živě",
+        "proc.load_more": "Načíst další",
+        "proc.tree": "Strom",
+        "proc.fds": "soubory",
+        "proc.kill_tree": "Ukončit strom",
+        "proc.kill_tree_confirm": "Ukončit tento proces a všechny jeho potomky?",
+        "proc.tree_terminated": "Strom procesů ukončen",
+        "ports.port": "Port",
+        "ports.filter": "Filtrovat",
+        "ports.reset": "Obnovit",
+        "ports.shown": "Zobrazeno",
+        "scripts.history": "Historie spuštění",
+        "scripts.all_runs": "Všechny skripty",
+        "scripts.queued": "Ve frontě",
+        "scripts.workers": "Pracovníci",
+        "scripts.concurrency": "Max. souběžných spuštění",
+        "scripts.run_id": "Spuštění",
+        "scripts.started": "Začátek",
+        "scripts.duration": "Trvání",
+        "scripts.peak_rss": "Špička RSS",
+        "scripts.no_runs": "Žádná spuštění",
+        "msg.run_queued": "Všichni pracovníci jsou zaneprázdněni, spuštění je ve frontě",
+        "msg.run_queue_full": "Fronta spuštění je plná",
+        "scripts.limits": "Limity",
+        "scripts.max_wall": "Max. doba běhu, s",
+        "scripts.max_rss": "Max. RSS, MB",
+        "scripts.cpu_pct": "Limit CPU, % jednoho jádra",
+        "scripts.limits_hint": "Prázdné pole znamená bez limitu. Spuštění překračující dobu nebo RSS jsou ukončena i s podřízenými procesy; limit CPU vyžaduje kořen cgroup v2 (RSC_CGROUP_ROOT).",
+        "scripts.cpu_time": "Čas CPU",
+        "scripts.killed": "Ukončeno",
+        "msg.settings_saved": "Nastavení uloženo",
+        "sched.title": "Plánované skripty",
+        "sched.add": "Přidat",
+        "sched.added": "Plán přidán",
+        "sched.bad_cron": "Neplatný výraz cron",
+        "sched.cron": "Plán",
+        "sched.cron_hint": "minuta hodina den měsíc den_v_týdnu, např. */15 * * * * nebo @daily",
+        "sched.jitter": "Rozptyl, s",
+        "sched.catchup": "Zmeškaná spuštění",
+        "sched.catchup_skip": "Přeskočit",
+        "sched.catchup_once": "Dohnat jednou",
+        "sched.last": "Poslední spuštění",
+        "sched.skipped_missed": "Přeskočeno (stále běží) / zmeškáno",
+        "sched.none": "Žádné plány",
+        "term.pty_mode": "Interaktivní terminál (PTY)",
+        "term.simple_mode": "Režim příkazů",
+        "term.pty_close": "Ukončit relaci",
+        "term.pty_close_confirm": "Ukončit relaci shellu? Spuštěné programy budou ukončeny.",
+        "term.pty_connected": "Připojeno",
+        "term.pty_disconnected": "Odpojeno",
+        "term.pty_unavailable": "Interaktivní terminál vyžaduje Linux/macOS a balíček flask-sock",
+        "term.cancel": "Zrušit",
+        "nav.logout": "Odhlásit",
+        "nav.logout_all": "Odhlásit všechny relace",
+        "backup.format": "Formát",
+        "backup.level": "Komprese",
+        "backup.level_store": "Bez komprese",
+        "backup.level_fast": "Rychlá",
+        "backup.level_normal": "Normální",
+        "backup.level_best": "Maximální",
+        "backup.mode": "Režim",
+        "backup.full": "Úplná",
+        "backup.incremental": "Přírůstková",
+        "backup.archive": "Archiv",
+        "backup.target": "Cesta",
+        "backup.archived": "V archivu",
+        "backup.total": "Celkem",
+        "backup.plan": "Plán obnovy",
+        "backup.plan_hint": "Rozbalte uvedené soubory z každého archivu v tomto pořadí; pozdější archivy přepisují dřívější. Soubory smazané od úplné zálohy nejsou uvedeny.",
+        "backup.plan_missing": "Soubory, jejichž archiv už není znám",
+        "backup.plan_files": "Soubory",
+        "table.modified": "Změněno",
+        "search.title": "Hledat",
+        "search.placeholder": "Název souboru nebo složky, např. report, *.log nebo src/main",
+        "search.mode_substring": "Obsahuje",
+        "search.mode_glob": "Maska",
+        "search.mode_fuzzy": "Přibližně",
+        "search.in": "Jen v",
+        "search.folder": "Složka",
+        "search.hint": "Hledá v názvech; s \"/\" i ve složce, kde leží",
+        "search.indexing": "Indexuji soubory…",
+        "search.indexed": "v indexu",
     },
 }
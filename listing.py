@@ -0,0 +1,122 @@
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+
+MAX_DIRS = 64  # directories kept in the listing cache
+MAX_ENTRIES = 500_000  # total entries across cached directories
+MAX_AGE = 30  # rescan after this many seconds anyway: file sizes change without touching the dir
+RACY_WINDOW = 2  # a dir modified this close to its scan may have changed within the same mtime tick
+MAX_VIEWS = 8  # sorted/filtered views kept per directory
+
+# Entries are tuples, which keeps 50k-entry directories small in memory
+NAME, IS_DIR, SIZE, MTIME, EXT = range(5)
+
+# key -> (sort key, natural order is descending); directories always come first
+SORT_KEYS = {
+    "name": (lambda e: e[NAME].casefold(), False),
+    "type": (lambda e: (e[EXT], e[NAME].casefold()), False),
+    "size": (lambda e: e[SIZE] or 0, True),
+    "mtime": (lambda e: e[MTIME] or 0, True),
+}
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+def scan_dir(path):
+    """Entries of `path` with exactly one stat() per entry (none on Windows,
+    where scandir already has it). Symlinks are followed; broken ones are
+    listed as files without size."""
+    entries = []
+    with os.scandir(path) as it:
+        for e in it:
+            try:
+                st = e.stat()
+                is_dir = stat.S_ISDIR(st.st_mode)
+                size = None if is_dir else st.st_size
+                mtime = st.st_mtime
+            except OSError:
+                is_dir, size, mtime = False, None, None
+            ext = "" if is_dir else os.path.splitext(e.name)[1].lower()
+            entries.append((e.name, is_dir, size, mtime, ext))
+    return entries
+
+class Listing:
+    """One scanned directory plus the sorted (and filtered) views built from
+    it on demand, so paging through 50k entries sorts them only once."""
+
+    def __init__(self, path, mtime_ns, entries):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.scanned = time.time()
+        # Changed in the same tick as the scan: don't trust the mtime check
+        self.racy = self.scanned - mtime_ns / 1e9 < RACY_WINDOW
+        self.entries = entries
+        self.views = OrderedDict()
+        self.lock = threading.Lock()
+
+    def view(self, sort, reverse=False, q=""):
+        key = (sort, reverse, q)
+        with self.lock:
+            view = self.views.get(key)
+            if view is not None:
+                self.views.move_to_end(key)
+                return view
+        fn, natural_desc = SORT_KEYS[sort]
+        rows = self.entries
+        if q:
+            needle = q.casefold()
+            rows = [e for e in rows if needle in e[NAME].casefold()]
+        rows = sorted(rows, key=fn, reverse=natural_desc != reverse)
+        view = [e for e in rows if e[IS_DIR]] + [e for e in rows if not e[IS_DIR]]
+        with self.lock:
+            self.views[key] = view
+            while len(self.views) > MAX_VIEWS:
+                self.views.popitem(last=False)
+        return view
+
+class DirCache:
+    """Listings by path, reused while the directory's mtime is unchanged
+    (entries added, removed or renamed bump it) and not older than
+    MAX_AGE. Least recently used directories are dropped first."""
+
+    def __init__(self, max_dirs=MAX_DIRS, max_entries=MAX_ENTRIES, hidden=()):
+        self.max_dirs = max_dirs
+        self.max_entries = max_entries
+        self.hidden = {os.path.abspath(p) for p in hidden}  # never listed, e.g. DATA_DIR
+        self.lock = threading.Lock()
+        self.listings = OrderedDict()
+        self.size = 0
+
+    def get(self, path):
+        mtime_ns = os.stat(path).st_mtime_ns
+        with self.lock:
+            cached = self.listings.get(path)
+            if (cached is not None and cached.mtime_ns == mtime_ns and not cached.racy
+                    and time.time() - cached.scanned < MAX_AGE):
+                self.listings.move_to_end(path)
+                return cached
+        entries = scan_dir(path)
+        if self.hidden:
+            entries = [e for e in entries if os.path.join(path, e[NAME]) not in self.hidden]
+        listing = Listing(path, mtime_ns, entries)
+        with self.lock:
+            old = self.listings.pop(path, None)
+            if old is not None:
+                self.size -= len(old.entries)
+            self.listings[path] = listing
+            self.size += len(listing.entries)
+            while len(self.listings) > 1 and (len(self.listings) > self.max_dirs or self.size > self.max_entries):
+                _, dropped = self.listings.popitem(last=False)
+                self.size -= len(dropped.entries)
+        return listing
+
+def get_dir_cache(app):
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = DirCache(max_entries=app.config.get("LISTING_MAX_ENTRIES", MAX_ENTRIES),
+                                  hidden=[app.config["DATA_DIR"]])
+    return _CACHE
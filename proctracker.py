@@ -0,0 +1,216 @@
+import threading
+import time
+import psutil
+
+_TRACKER = None
+_TRACKER_LOCK = threading.Lock()
+
+# sort key -> (row key function, natural order is descending)
+SORT_KEYS = {
+    "cpu": (lambda r: r["cpu"], True),
+    "rss": (lambda r: r["mem"], True),
+    "pid": (lambda r: r["pid"], False),
+    "name": (lambda r: (r["name"] or "").lower(), False),
+    "user": (lambda r: (r["user"] or "").lower(), False),
+    "threads": (lambda r: r["threads"], True),
+    "io": (lambda r: r["io"] or 0, True),
+}
+
+class ProcessSnapshot:
+    """Immutable result of one sweep; rows are sorted by CPU descending.
+    `order[key]` holds the rows sorted ascending by (key, pid) for every
+    SORT_KEYS entry and `keys[key]` those (key, pid) pairs, built once per
+    sweep in the tracker thread so requests only bisect and slice."""
+
+    def __init__(self, generation, ts, rows, births, deaths, duration):
+        self.generation = generation
+        self.ts = ts
+        self.rows = rows
+        self.by_pid = {r["pid"]: r for r in rows}
+        self.births = births
+        self.deaths = deaths
+        self.duration = duration
+        self.order = {}
+        self.keys = {}
+        for key, (fn, _) in SORT_KEYS.items():
+            ordered = sorted(rows, key=lambda r, fn=fn: (fn(r), r["pid"]))
+            self.order[key] = ordered
+            self.keys[key] = [(fn(r), r["pid"]) for r in ordered]
+        self._tree = None
+
+    def tree(self):
+        """Parent/child links and per-subtree totals, built once per snapshot
+        from the ppid column: (children, roots, totals) where totals[pid] is
+        {"cpu", "mem", "fds", "count"} over the process and its descendants."""
+        if self._tree is not None:
+            return self._tree
+        children = {}
+        roots = []
+        for r in self.rows:
+            ppid = r["ppid"]
+            if ppid == r["pid"] or ppid not in self.by_pid:
+                roots.append(r["pid"])
+            else:
+                children.setdefault(ppid, []).append(r["pid"])
+        totals = {}
+        # Iterative post-order so deep chains don't hit the recursion limit
+        stack = [(pid, False) for pid in roots]
+        while stack:
+            pid, done = stack.pop()
+            if not done:
+                stack.append((pid, True))
+                stack.extend((c, False) for c in children.get(pid, ()))
+                continue
+            r = self.by_pid[pid]
+            t = {"cpu": r["cpu"], "mem": r["mem"], "fds": r["fds"] or 0, "count": 1}
+            for c in children.get(pid, ()):
+                ct = totals[c]
+                t["cpu"] += ct["cpu"]
+                t["mem"] += ct["mem"]
+                t["fds"] += ct["fds"]
+                t["count"] += ct["count"]
+            t["cpu"] = round(t["cpu"], 1)
+            totals[pid] = t
+        by_load = lambda pid: totals[pid]["cpu"]
+        for kids in children.values():
+            kids.sort(key=by_load, reverse=True)
+        roots.sort(key=by_load, reverse=True)
+        self._tree = (children, roots, totals)
+        return self._tree
+
+class ProcessTracker:
+    """Keeps psutil.Process objects alive between sweeps so cpu_percent()
+    measures the interval since the previous sweep, and refreshes the table
+    in a background thread while someone is looking at it."""
+
+    def __init__(self, interval=2.0, idle_timeout=60.0):
+        self.interval = max(0.5, float(interval))
+        self.idle_timeout = idle_timeout
+        self.procs = {}
+        self.generation = 0
+        self.current = None
+        self.last_access = 0.0
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self._run, name="rsc-process-tracker", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            if time.monotonic() - self.last_access > self.idle_timeout:
+                # Nobody is watching: stop sweeping /proc until the next request
+                self.wake.clear()
+                self.wake.wait()
+            try:
+                self.refresh()
+            except Exception:
+                pass
+            time.sleep(self.interval)
+
+    def _read(self, proc):
+        with proc.oneshot():
+            try:
+                mem = proc.memory_info()
+                rss = mem.rss
+            except (psutil.AccessDenied, psutil.ZombieProcess):
+                rss = 0
+            try:
+                user = proc.username()
+            except (psutil.AccessDenied, psutil.ZombieProcess, KeyError):
+                user = None
+            try:
+                threads = proc.num_threads()
+            except (psutil.AccessDenied, psutil.ZombieProcess):
+                threads = 0
+            try:
+                io = proc.io_counters()
+                io_bytes = io.read_bytes + io.write_bytes
+            except (psutil.AccessDenied, psutil.ZombieProcess, AttributeError, NotImplementedError):
+                io_bytes = None
+            try:
+                cpu = proc.cpu_percent(None)
+            except (psutil.AccessDenied, psutil.ZombieProcess):
+                cpu = 0.0
+            try:
+                fds = proc.num_fds() if hasattr(proc, "num_fds") else proc.num_handles()
+            except (psutil.AccessDenied, psutil.ZombieProcess):
+                fds = None
+            try:
+                status = proc.status()
+            except (psutil.AccessDenied, psutil.ZombieProcess):
+                status = "?"
+            return {
+                "pid": proc.pid,
+                "ppid": proc.ppid(),
+                "name": proc.name(),
+                "user": user,
+                "cpu": round(cpu, 1),
+                "mem": rss,
+                "threads": threads,
+                "io": io_bytes,
+                "fds": fds,
+                "status": status,
+                "create_time": proc.create_time(),
+            }
+
+    def refresh(self):
+        started = time.monotonic()
+        with self.lock:
+            old = self.procs
+            procs = {}
+            births = []
+            rows = []
+            for pid in psutil.pids():
+                proc = old.get(pid)
+                if proc is not None and not proc.is_running():
+                    # PID was reused by a new process
+                    proc = None
+                if proc is None:
+                    try:
+                        proc = psutil.Process(pid)
+                        proc.cpu_percent(None)
+                    except (psutil.NoSuchProcess, psutil.AccessDenied):
+                        continue
+                    if old:
+                        births.append(pid)
+                try:
+                    rows.append(self._read(proc))
+                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                    continue
+                procs[pid] = proc
+            deaths = [pid for pid in old if pid not in procs]
+            self.procs = procs
+            rows.sort(key=lambda r: r["cpu"], reverse=True)
+            self.generation += 1
+            self.current = ProcessSnapshot(self.generation, time.time(), rows, births, deaths, time.monotonic() - started)
+            return self.current
+
+    def snapshot(self):
+        self.last_access = time.monotonic()
+        if not self.wake.is_set():
+            self.wake.set()
+        snap = self.current
+        if snap is None:
+            # First sweep only primes cpu_percent(); take a second one shortly after
+            self.refresh()
+            time.sleep(0.25)
+            snap = self.refresh()
+        elif time.time() - snap.ts > self.interval * 5:
+            # The tracker was idle: sweep now so the page isn't stale
+            snap = self.refresh()
+        return snap
+
+def get_process_tracker(app):
+    global _TRACKER
+    if _TRACKER is None:
+        with _TRACKER_LOCK:
+            if _TRACKER is None:
+                t = ProcessTracker(interval=app.config.get("PROC_INTERVAL", 2.0))
+                t.start()
+                _TRACKER = t
+    return _TRACKER
@@ -0,0 +1,213 @@
+import codecs
+import os
+import selectors
+import signal
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+    import pty
+    import termios
+    PTY_AVAILABLE = True
+except ImportError:  # Windows
+    PTY_AVAILABLE = False
+
+SCROLLBACK = 64 * 1024  # output replayed to a client that (re)attaches
+READ_CHUNK = 64 * 1024
+
+_MANAGER = None
+_MANAGER_LOCK = threading.Lock()
+
+class PtyLimitError(Exception):
+    pass
+
+class PtySession:
+    """A login shell on its own pseudo-terminal. Output is fanned out to every
+    attached WebSocket by the manager's reader thread."""
+
+    def __init__(self, sid, shell, cwd, cols=80, rows=24):
+        pid, fd = pty.fork()
+        if pid == 0:
+            # Child: becomes session leader with the pty as controlling terminal
+            try:
+                os.chdir(cwd)
+                env = dict(os.environ, TERM="xterm-256color")
+                os.execvpe(shell, [shell, "-l"], env)
+            finally:
+                os._exit(127)
+        self.sid = sid
+        self.pid = pid
+        self.fd = fd
+        self.shell = shell
+        self.created = time.time()
+        self.detached_at = self.created
+        self.alive = True
+        self.clients = []
+        self.lock = threading.Lock()
+        self.scrollback = bytearray()
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.resize(cols, rows)
+
+    def resize(self, cols, rows):
+        cols = max(2, min(int(cols), 1000))
+        rows = max(2, min(int(rows), 1000))
+        try:
+            fcntl.ioctl(self.fd, termios.TIOCSWINSZ, struct.pack("HHHH", rows, cols, 0, 0))
+        except OSError:
+            pass
+
+    def write(self, data):
+        while data and self.alive:
+            try:
+                n = os.write(self.fd, data)
+            except BlockingIOError:
+                time.sleep(0.01)
+                continue
+            except OSError:
+                return
+            data = data[n:]
+
+    def feed(self, data):
+        """Called by the reader thread with fresh output."""
+        with self.lock:
+            self.scrollback += data
+            if len(self.scrollback) > 2 * SCROLLBACK:
+                del self.scrollback[:len(self.scrollback) - SCROLLBACK]
+            text = self.decoder.decode(data)
+            clients = list(self.clients)
+        if text:
+            for ws in clients:
+                try:
+                    ws.send(text)
+                except Exception:
+                    self.detach(ws)
+
+    def attach(self, ws):
+        with self.lock:
+            if self.scrollback:
+                # May start mid-sequence; the replacement char is harmless
+                ws.send(bytes(self.scrollback[-SCROLLBACK:]).decode("utf-8", errors="replace"))
+            self.clients.append(ws)
+
+    def detach(self, ws):
+        with self.lock:
+            if ws in self.clients:
+                self.clients.remove(ws)
+            if not self.clients:
+                self.detached_at = time.time()
+
+    def close(self):
+        self.alive = False
+        try:
+            os.killpg(self.pid, signal.SIGHUP)
+        except OSError:
+            pass
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+        # The shell normally exits on SIGHUP; don't leave a zombie either way
+        for _ in range(20):
+            try:
+                if os.waitpid(self.pid, os.WNOHANG)[0]:
+                    break
+            except ChildProcessError:
+                break
+            time.sleep(0.05)
+        else:
+            try:
+                os.killpg(self.pid, signal.SIGKILL)
+                os.waitpid(self.pid, 0)
+            except OSError:
+                pass
+        with self.lock:
+            clients, self.clients = self.clients, []
+        for ws in clients:
+            try:
+                ws.send("\r\n[session closed]\r\n")
+                ws.close()
+            except Exception:
+                pass
+
+class PtyManager:
+    """Owns all PTY sessions. One thread multiplexes the master side of every
+    session with a selector, so idle shells cost no threads. Sessions with no
+    client attached for `idle_timeout` seconds are reaped; at most
+    `max_sessions` exist at once."""
+
+    def __init__(self, max_sessions=8, idle_timeout=900):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.selector = selectors.DefaultSelector()
+        self.wake_r, self.wake_w = os.pipe()
+        self.selector.register(self.wake_r, selectors.EVENT_READ, None)
+        self.thread = threading.Thread(target=self._run, name="rsc-pty", daemon=True)
+        self.thread.start()
+
+    def open(self, sid, shell, cwd, cols=80, rows=24):
+        """Existing live session for `sid`, or a new one."""
+        with self.lock:
+            sess = self.sessions.get(sid)
+            if sess is not None and sess.alive:
+                return sess
+            if len(self.sessions) >= self.max_sessions:
+                raise PtyLimitError(f"Too many terminal sessions (max {self.max_sessions})")
+            sess = PtySession(sid, shell, cwd, cols, rows)
+            self.sessions[sid] = sess
+            self.selector.register(sess.fd, selectors.EVENT_READ, sess)
+        os.write(self.wake_w, b"x")
+        return sess
+
+    def close(self, sid):
+        with self.lock:
+            sess = self.sessions.pop(sid, None)
+            if sess is not None:
+                try:
+                    self.selector.unregister(sess.fd)
+                except (KeyError, ValueError):
+                    pass
+        if sess is not None:
+            sess.close()
+        return sess is not None
+
+    def _run(self):
+        last_reap = time.monotonic()
+        while True:
+            for key, _ in self.selector.select(timeout=1.0):
+                sess = key.data
+                if sess is None:
+                    os.read(self.wake_r, 4096)
+                    continue
+                try:
+                    data = os.read(sess.fd, READ_CHUNK)
+                except OSError:
+                    data = b""  # EIO: the shell exited
+                if data:
+                    sess.feed(data)
+                else:
+                    self.close(sess.sid)
+            if time.monotonic() - last_reap >= 5:
+                last_reap = time.monotonic()
+                self._reap()
+
+    def _reap(self):
+        now = time.time()
+        with self.lock:
+            idle = [s.sid for s in self.sessions.values() if not s.clients and now - s.detached_at > self.idle_timeout]
+        for sid in idle:
+            self.close(sid)
+
+def get_pty_manager(app):
+    global _MANAGER
+    if _MANAGER is None:
+        with _MANAGER_LOCK:
+            if _MANAGER is None:
+                _MANAGER = PtyManager(
+                    max_sessions=app.config.get("PTY_MAX_SESSIONS", 8),
+                    idle_timeout=app.config.get("PTY_IDLE_TIMEOUT", 900),
+                )
+    return _MANAGER
@@ -1,9 +1,14 @@
 import os
-from flask import render_template, request, redirect, url_for, session, flash
+import sqlite3
+import threading
+from flask import current_app, render_template, request, redirect, url_for, session, flash
 from i18n import tr
+from telemetry import FAILED_LOGINS
 
 FAILED_ATTEMPTS = {}
+FAILED_LOCK = threading.Lock()
 BLACKLIST_CACHE = None
+BLACKLIST_MTIME = None
 BLACKLIST_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "blacklist.txt")
 
 def get_client_ip():
@@ -13,9 +18,15 @@ def get_client_ip():
     return request.remote_addr or ""
 
 def load_blacklist():
-    global BLACKLIST_CACHE
-    if BLACKLIST_CACHE is not None:
+    # Reloaded when the file changes, e.g. another worker process blacklisted an IP
+    global BLACKLIST_CACHE, BLACKLIST_MTIME
+    try:
+        mtime = os.stat(BLACKLIST_PATH).st_mtime_ns
+    except OSError:
+        mtime = None
+    if BLACKLIST_CACHE is not None and mtime == BLACKLIST_MTIME:
         return BLACKLIST_CACHE
+    BLACKLIST_MTIME = mtime
     s = set()
     try:
         with open(BLACKLIST_PATH, "r", encoding="utf-8") as f:
@@ -44,6 +55,39 @@ def blacklist_ip(ip):
         pass
     bl.add(ip)
 
+def _failures_db():
+    """With several worker processes failed attempts are counted in SQLite
+    so every worker sees them; None means the in-process dict is enough."""
+    if current_app.config.get("WORKERS", 1) <= 1:
+        return None
+    db = sqlite3.connect(os.path.join(current_app.config["DATA_DIR"], "auth.db"), timeout=10)
+    db.execute("CREATE TABLE IF NOT EXISTS failed_attempts (ip TEXT PRIMARY KEY, count INTEGER)")
+    return db
+
+def record_failure(ip):
+    """Count a failed login from `ip`; returns the new count."""
+    db = _failures_db()
+    if db is None:
+        with FAILED_LOCK:
+            FAILED_ATTEMPTS[ip] = FAILED_ATTEMPTS.get(ip, 0) + 1
+            return FAILED_ATTEMPTS[ip]
+    with db:
+        db.execute("INSERT INTO failed_attempts (ip, count) VALUES (?, 1) "
+                   "ON CONFLICT(ip) DO UPDATE SET count = count + 1", (ip,))
+        cnt = db.execute("SELECT count FROM failed_attempts WHERE ip = ?", (ip,)).fetchone()[0]
+    db.close()
+    return cnt
+
+def clear_failures(ip):
+    db = _failures_db()
+    if db is None:
+        with FAILED_LOCK:
+            FAILED_ATTEMPTS.pop(ip, None)
+        return
+    with db:
+        db.execute("DELETE FROM failed_attempts WHERE ip = ?", (ip,))
+    db.close()
+
 def login():
     next_url = request.args.get("next") or request.form.get("next") or url_for("index")
     ip = get_client_ip()
@@ -55,12 +99,15 @@ def login():
         username = request.form.get("username", "").strip()
         password = request.form.get("password", "").strip()
         if username == "alfa" and password == "1313":
+            if hasattr(session, "regenerate"):
+                # New ID on login so a session ID seen before login is worthless
+                session.regenerate()
             session["auth"] = True
             session["user"] = username
-            FAILED_ATTEMPTS.pop(ip, None)
+            clear_failures(ip)
             return redirect(next_url)
-        cnt = FAILED_ATTEMPTS.get(ip, 0) + 1
-        FAILED_ATTEMPTS[ip] = cnt
+        FAILED_LOGINS.inc()
+        cnt = record_failure(ip)
         if cnt >= 3:
             blacklist_ip(ip)
             return (tr("auth.access_denied"), 403)
@@ -68,5 +115,12 @@ def login():
     return render_template("login.html", hide_nav=True, next_url=next_url)
 
 def logout():
+    # With a server-side backend an emptied session is deleted from the store,
+    # so the old ID stops working even if the cookie was copied
     session.clear()
+    # Only as a POST: the Lax session cookie keeps other sites from sending it
+    if request.method == "POST" and request.form.get("all") == "1":
+        store = getattr(current_app.session_interface, "store", None)
+        if store is not None:
+            store.clear()  # revoke every session, on every device
     return redirect(url_for("login"))
@@ -1,13 +1,17 @@
 import os
 import mimetypes
-import zipfile
-import io
+import stat
 import shutil
 import json
 import time
-from flask import current_app, request, abort, flash, redirect, url_for, render_template, send_file
+from urllib.parse import quote
+from flask import current_app, request, abort, flash, redirect, url_for, render_template, send_file, Response, jsonify
 from werkzeug.utils import secure_filename
 from utils import safe_join, is_text_file
+from archive import FORMATS, LEVELS, available_formats, stream_files
+from backups import get_backup_store
+from listing import EXT, IS_DIR, MTIME, NAME, SIZE, SORT_KEYS, get_dir_cache
+from searchindex import MODES, get_search_index
 from i18n import tr
 
 def get_trash_dir():
@@ -35,46 +39,153 @@ def save_trash_map(data):
     with open(f, "w", encoding="utf-8") as fp:
         json.dump(data, fp, indent=2)
 
+LISTING_PAGE = 200
+SEARCH_LIMIT = 100
+
+def user_path(rel_path):
+    """safe_join() under BASE_DIR that also refuses DATA_DIR (secret key,
+    session databases, TLS key), which lives there by default."""
+    path = safe_join(current_app.config["BASE_DIR"], rel_path)
+    data_dir = current_app.config["DATA_DIR"]
+    try:
+        inside = os.path.commonpath([path, data_dir]) == data_dir
+    except ValueError:
+        inside = False  # another drive (Windows)
+    if inside:
+        abort(403)
+    return path
+
+def list_page(rel_dir, listing, sort, reverse, q, cursor, limit):
+    view = listing.view(sort, reverse, q)
+    page = view[cursor:cursor + limit]
+    items = [
+        {
+            "name": e[NAME],
+            "is_dir": e[IS_DIR],
+            "size": e[SIZE],
+            "mtime": e[MTIME],
+            "ext": e[EXT],
+            "rel_path": os.path.join(rel_dir, e[NAME]),
+        }
+        for e in page
+    ]
+    natural_desc = SORT_KEYS[sort][1]
+    return {
+        "generation": str(listing.mtime_ns),
+        "total": len(view),
+        "entries": len(listing.entries),
+        "sort": sort,
+        "order": "asc" if natural_desc == reverse else "desc",
+        "items": items,
+        "next_cursor": cursor + len(page) if cursor + len(page) < len(view) else None,
+    }
+
 def browse():
     rel_path = request.args.get("path", "")
-    current_path = safe_join(current_app.config["BASE_DIR"], rel_path)
+    current_path = user_path(rel_path)
     if not os.path.exists(current_path):
         abort(404)
 
     if os.path.isdir(current_path):
-        items = []
+        rel_norm = os.path.relpath(current_path, current_app.config["BASE_DIR"])
+        current_rel = "" if rel_norm == "." else rel_norm
         try:
-            for name in os.listdir(current_path):
-                full = os.path.join(current_path, name)
-                items.append(
-                    {
-                        "name": name,
-                        "is_dir": os.path.isdir(full),
-                        "size": os.path.getsize(full) if os.path.isfile(full) else None,
-                        "rel_path": os.path.relpath(full, current_app.config["BASE_DIR"]),
-                        "ext": os.path.splitext(name)[1].lower() if os.path.isfile(full) else "",
-                    }
-                )
+            listing = get_dir_cache(current_app).get(current_path)
+            first_page = list_page(current_rel, listing, "name", False, "", 0, LISTING_PAGE)
         except PermissionError:
             flash(tr("msg.no_access"), "warning")
-            items = []
+            first_page = None
 
         parent_rel = None
-        rel_norm = os.path.relpath(current_path, current_app.config["BASE_DIR"])
         if rel_norm != ".":
             parent_rel = os.path.relpath(os.path.dirname(current_path), current_app.config["BASE_DIR"])
+        # Only the first page is rendered; the table fetches the rest as it scrolls
         return render_template(
             "files.html",
-            items=sorted(items, key=lambda x: (not x["is_dir"], x["name"].lower())),
-            current_rel="" if rel_norm == "." else rel_norm,
+            first_page=first_page,
+            current_rel=current_rel,
             parent_rel=parent_rel if parent_rel != "." else "",
         )
     else:
         return redirect(url_for("view_file", path=rel_path))
 
+def api_files():
+    """Page through a directory listing.
+    path: directory relative to BASE_DIR; sort: name|type|size|mtime;
+    order: asc|desc (defaults to the key's natural order); q: substring of
+    the name; cursor/limit: pagination. Directories always come first."""
+    rel_path = request.args.get("path", "")
+    current_path = user_path(rel_path)
+    if not os.path.isdir(current_path):
+        return jsonify({"error": tr("msg.not_found")}), 404
+    sort = request.args.get("sort", "name")
+    if sort not in SORT_KEYS:
+        return jsonify({"error": f"Unknown sort key: {sort}"}), 400
+    order = request.args.get("order")
+    reverse = order is not None and (order == "desc") != SORT_KEYS[sort][1]
+    limit = max(1, min(request.args.get("limit", LISTING_PAGE, type=int), 1000))
+    cursor = max(0, request.args.get("cursor", 0, type=int))
+    q = request.args.get("q", "").strip()
+    try:
+        listing = get_dir_cache(current_app).get(current_path)
+    except PermissionError:
+        return jsonify({"error": tr("msg.no_access")}), 403
+    rel_norm = os.path.relpath(current_path, current_app.config["BASE_DIR"])
+    return jsonify(list_page("" if rel_norm == "." else rel_norm, listing, sort, reverse, q, cursor, limit))
+
+def search():
+    rel_path = request.args.get("path", "")
+    scope = os.path.relpath(user_path(rel_path), current_app.config["BASE_DIR"])
+    get_search_index(current_app)  # start crawling while the page loads
+    return render_template("search.html", scope="" if scope == "." else scope,
+                           q=request.args.get("q", ""), modes=MODES)
+
+def api_search():
+    """Search file and directory names of the whole tree.
+    q: the query; mode: substring|glob|fuzzy; path: only below this
+    directory; limit: results, best first. A "/" in q also matches the
+    directory, e.g. "src/main" finds main* in directories ending in src."""
+    base = current_app.config["BASE_DIR"]
+    mode = request.args.get("mode", "substring")
+    if mode not in MODES:
+        return jsonify({"error": f"Unknown mode: {mode}"}), 400
+    scope = os.path.relpath(user_path(request.args.get("path", "")), base)
+    limit = max(1, min(request.args.get("limit", SEARCH_LIMIT, type=int), 500))
+    index = get_search_index(current_app)
+    started = time.perf_counter()
+    paths, total, truncated = index.search(request.args.get("q", ""), mode, limit,
+                                           "" if scope == "." else scope.replace(os.sep, "/"))
+    took = time.perf_counter() - started
+    items = []
+    for rel in paths:
+        full = safe_join(base, rel)
+        try:
+            st = os.stat(full)
+        except OSError:
+            continue  # gone since it was indexed
+        is_dir = stat.S_ISDIR(st.st_mode)
+        items.append({
+            "name": os.path.basename(rel),
+            "rel_path": rel,
+            "dir": os.path.dirname(rel),
+            "is_dir": is_dir,
+            "size": None if is_dir else st.st_size,
+            "mtime": st.st_mtime,
+            "ext": "" if is_dir else os.path.splitext(rel)[1].lower(),
+        })
+    stats = index.stats()
+    return jsonify({
+        "ready": stats["ready"],
+        "indexed": stats["paths"],
+        "total": total,
+        "truncated": truncated,
+        "took_ms": round(took * 1000, 1),
+        "items": items,
+    })
+
 def upload():
     rel_path = request.form.get("path", "")
-    current_path = safe_join(current_app.config["BASE_DIR"], rel_path)
+    current_path = user_path(rel_path)
     if not os.path.isdir(current_path):
         abort(400)
     f = request.files.get("file")
@@ -92,7 +203,7 @@ def upload():
 
 def view_file():
     rel_path = request.args.get("path", "")
-    file_path = safe_join(current_app.config["BASE_DIR"], rel_path)
+    file_path = user_path(rel_path)
     if not os.path.isfile(file_path):
         abort(404)
     text = None
@@ -113,7 +224,7 @@ def edit_file():
     rel_path = request.args.get("path") if request.method == "GET" else request.form.get("path")
     if not rel_path:
         abort(400)
-    file_path = safe_join(current_app.config["BASE_DIR"], rel_path)
+    file_path = user_path(rel_path)
     if not os.path.isfile(file_path):
         abort(404)
     if request.method == "POST":
@@ -142,7 +253,7 @@ def edit_file():
 
 def download_file():
     rel_path = request.args.get("path", "")
-    file_path = safe_join(current_app.config["BASE_DIR"], rel_path)
+    file_path = user_path(rel_path)
     if not os.path.isfile(file_path):
         abort(404)
     mime, _ = mimetypes.guess_type(file_path)
@@ -151,38 +262,59 @@ def download_file():
 def backup():
     if request.method == "POST":
         rel = request.form.get("path", "")
+        fmt = request.form.get("format", "zip")
+        level = request.form.get("level", "normal")
+        incremental = request.form.get("mode") == "incremental"
         try:
-            target = safe_join(current_app.config["BASE_DIR"], rel)
+            target = user_path(rel)
         except Exception:
             flash(tr("backup.invalid_path"), "danger")
             return redirect(url_for("backup"))
-        max_bytes = 100 * 1024 * 1024
-        total = 0
-        buf = io.BytesIO()
-        with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-            if os.path.isfile(target):
-                total += os.path.getsize(target)
-                if total > max_bytes:
-                    flash(tr("backup.limit_exceeded"), "danger")
-                    return redirect(url_for("backup"))
-                zf.write(target, arcname=os.path.basename(target))
-            else:
-                for dirpath, dirnames, filenames in os.walk(target):
-                    for fn in filenames:
-                        fp = os.path.join(dirpath, fn)
-                        try:
-                            total += os.path.getsize(fp)
-                            if total > max_bytes:
-                                flash(tr("backup.limit_exceeded"), "danger")
-                                return redirect(url_for("backup"))
-                            arc = os.path.relpath(fp, os.path.dirname(target))
-                            zf.write(fp, arcname=arc)
-                        except Exception:
-                            continue
-        buf.seek(0)
-        name = (os.path.basename(target) or "backup") + ".zip"
-        return send_file(buf, as_attachment=True, download_name=name, mimetype="application/zip")
-    return render_template("backup.html")
+        if not os.path.exists(target):
+            flash(tr("msg.not_found"), "danger")
+            return redirect(url_for("backup"))
+        if fmt not in available_formats():
+            fmt = "zip"
+        if level not in LEVELS:
+            level = "normal"
+        store = get_backup_store(current_app)
+        summary, files = store.start(target, fmt, incremental)
+        # Streamed as it is compressed: no size cap, constant memory
+        stream = stream_files(files, fmt, level, threads=current_app.config.get("BACKUP_THREADS", 1))
+        mimetype, ext = FORMATS[fmt]
+        name = summary["archive"]
+        return Response(
+            commit_when_sent(store, summary, stream),
+            mimetype=mimetype,
+            headers={
+                "Content-Disposition": "attachment; filename=\"{}\"; filename*=UTF-8''{}".format(
+                    secure_filename(name) or "backup" + ext, quote(name)),
+                "X-Accel-Buffering": "no",
+            },
+        )
+    return render_template("backup.html", formats=available_formats(), levels=list(LEVELS),
+                           backups=get_backup_store(current_app).list()[:50])
+
+def commit_when_sent(store, summary, stream):
+    """Pass the archive through; record its manifest only if the client got
+    all of it, since the next incremental backup builds on it."""
+    sent = False
+    try:
+        yield from stream
+        sent = True
+    finally:
+        if sent:
+            store.commit(summary)
+        else:
+            store.discard(summary["id"])
+
+def backup_plan(backup_id):
+    plan = get_backup_store(current_app).plan(secure_filename(backup_id))
+    if plan is None:
+        abort(404)
+    if request.args.get("format") == "json":
+        return jsonify(plan)
+    return render_template("backup_plan.html", plan=plan)
 
 def trash_list():
     t_dir = get_trash_dir()
@@ -216,7 +348,7 @@ def trash_add():
         flash(tr("msg.not_found"), "danger")
         return redirect(url_for("browse"))
     
-    full_path = safe_join(current_app.config["BASE_DIR"], rel_path)
+    full_path = user_path(rel_path)
     if not os.path.exists(full_path):
         flash(tr("msg.not_found"), "danger")
         return redirect(url_for("browse"))
@@ -266,7 +398,7 @@ def trash_restore():
         flash(tr("msg.restore_error"), "danger")
         return redirect(url_for("trash_list"))
 
-    dest = safe_join(current_app.config["BASE_DIR"], orig_rel)
+    dest = user_path(orig_rel)
     
     if os.path.exists(dest):
         flash(tr("msg.restore_collision"), "warning")
@@ -1,50 +1,91 @@
+import hmac
+import json
+import math
 import time
-import psutil
-from flask import render_template, jsonify
-from utils import get_gpu_info
+from flask import current_app, render_template, jsonify, request, Response, abort
+from sampler import get_sampler
+from runner import get_registry
+import telemetry
+
+STREAM_KEEPALIVE = 15
 
 def monitor():
     return render_template("monitor.html")
 
 def metrics():
-    mem = psutil.virtual_memory()
-    cpu = psutil.cpu_percent(interval=None)
-    cpu_freq = psutil.cpu_freq()
-    cpu_cur = int(cpu_freq.current) if cpu_freq else None
-    cpu_max = int(cpu_freq.max) if cpu_freq else None
-    # Aggregate disks
-    total_disk = 0
-    used_disk = 0
-    for part in psutil.disk_partitions(all=False):
-        try:
-            usage = psutil.disk_usage(part.mountpoint)
-            total_disk += usage.total
-            used_disk += usage.used
-        except Exception:
-            continue
-    disk_percent = round((used_disk / total_disk) * 100, 1) if total_disk else 0
-    net = psutil.net_io_counters()
-    disk_io = psutil.disk_io_counters()
-    gpus = get_gpu_info()
-    return jsonify(
-        {
-            "ts": time.time(),
-            "cpu_percent": cpu,
-            "cpu_freq_cur": cpu_cur,
-            "cpu_freq_max": cpu_max,
-            "cpu_cores": psutil.cpu_count(logical=False) or 0,
-            "cpu_threads": psutil.cpu_count() or 0,
-            "mem_total": mem.total,
-            "mem_used": mem.used,
-            "mem_percent": mem.percent,
-            "mem_available": mem.available,
-            "disk_total": total_disk,
-            "disk_used": used_disk,
-            "disk_percent": disk_percent,
-            "net_bytes_sent": net.bytes_sent,
-            "net_bytes_recv": net.bytes_recv,
-            "disk_read_bytes": getattr(disk_io, "read_bytes", 0),
-            "disk_write_bytes": getattr(disk_io, "write_bytes", 0),
-            "gpus": gpus,
-        }
+    return jsonify(get_sampler(current_app).latest())
+
+def metrics_history():
+    since = request.args.get("since", type=float)
+    sampler = get_sampler(current_app)
+    return jsonify({"interval": sampler.interval, "samples": sampler.history(since)})
+
+def metrics_range():
+    store = get_sampler(current_app).store
+    if store is None:
+        return jsonify({"error": "Metric store disabled"}), 404
+    now = time.time()
+    end = request.args.get("to", type=float) or now
+    start = request.args.get("from", type=float)
+    if start is None:
+        start = end - 3600
+    step = request.args.get("step", type=float)
+    # float() accepts "nan" and "inf", which would break the bucket maths
+    if not all(math.isfinite(v) for v in (start, end, step or 0)):
+        return jsonify({"error": "Invalid range"}), 400
+    return jsonify(store.query(start, end, step))
+
+def metrics_prometheus():
+    token = current_app.config.get("METRICS_TOKEN")
+    if token:
+        # Scrapers authenticate with a static token instead of the session login
+        supplied = request.args.get("token", "")
+        auth = request.headers.get("Authorization", "")
+        if auth.startswith("Bearer "):
+            supplied = auth[7:].strip()
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            abort(401)
+    runs = get_registry(current_app).active()
+    running = sum(1 for r in runs if r.status == "running")
+    extra = [
+        telemetry.gauge("rsc_scripts_running", "Scripts currently running.", [((), running)]),
+        telemetry.gauge("rsc_scripts_queued", "Script runs waiting for a worker.", [((), len(runs) - running)]),
+    ]
+    body = telemetry.render(get_sampler(current_app).latest(), extra)
+    return Response(body, content_type="text/plain; version=0.0.4; charset=utf-8")
+
+def metric_delta(prev, cur):
+    return {k: v for k, v in cur.items() if prev.get(k) != v}
+
+def sse_frame(event, data, event_id=None):
+    out = f"event: {event}\n"
+    if event_id is not None:
+        out += f"id: {event_id}\n"
+    return out + f"data: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+def metrics_stream():
+    sampler = get_sampler(current_app)
+
+    def generate():
+        # First frame is the full snapshot, then only the fields that changed
+        yield "retry: 3000\n\n"
+        seq = sampler.seq
+        prev = sampler.latest()
+        yield sse_frame("snapshot", prev, seq)
+        while True:
+            seq, snap = sampler.wait_next(seq, timeout=STREAM_KEEPALIVE)
+            if snap is None:
+                # Comment line keeps proxies from closing the connection and
+                # surfaces a dead client as a write error
+                yield ": keepalive\n\n"
+                continue
+            if snap is prev:
+                continue
+            yield sse_frame("delta", metric_delta(prev, snap), seq)
+            prev = snap
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
@@ -1,32 +1,84 @@
-import subprocess
+import socket
+import threading
+import time
 import psutil
-from flask import render_template
+from flask import current_app, render_template, request, jsonify
+from proctracker import get_process_tracker
+
+# net_connections() walks every process's fd table on Linux; during an incident
+# the page is hit repeatedly, so share one result for a couple of seconds
+CONN_TTL = 2.0
+_CONN_CACHE = {"ts": 0.0, "rows": []}
+_CONN_LOCK = threading.Lock()
+
+def fmt_addr(addr):
+    if not addr:
+        return "-"
+    ip, port = addr.ip, addr.port
+    if ":" in ip:
+        return f"[{ip}]:{port}"
+    return f"{ip}:{port}"
+
+def list_connections():
+    with _CONN_LOCK:
+        if time.monotonic() - _CONN_CACHE["ts"] < CONN_TTL:
+            return _CONN_CACHE["rows"]
+        rows = []
+        try:
+            conns = psutil.net_connections(kind="inet")
+        except psutil.AccessDenied:
+            # macOS needs root for the system-wide table; fall back to our own sockets
+            conns = psutil.Process().connections(kind="inet")
+        for c in conns:
+            rows.append({
+                "proto": "TCP" if c.type == socket.SOCK_STREAM else "UDP",
+                "family": "IPv6" if c.family == socket.AF_INET6 else "IPv4",
+                "local": fmt_addr(c.laddr),
+                "local_port": c.laddr.port if c.laddr else None,
+                "remote": fmt_addr(c.raddr),
+                "remote_port": c.raddr.port if c.raddr else None,
+                "state": c.status if c.status and c.status != psutil.CONN_NONE else "-",
+                "pid": c.pid,
+            })
+        rows.sort(key=lambda r: (r["proto"], r["local_port"] or 0))
+        _CONN_CACHE["ts"] = time.monotonic()
+        _CONN_CACHE["rows"] = rows
+        return rows
+
+def filtered_connections(args):
+    proto = args.get("proto", "").upper()
+    state = args.get("state", "").upper()
+    port = args.get("port", type=int)
+    pid = args.get("pid", type=int)
+    names = get_process_tracker(current_app).snapshot().by_pid
+    out = []
+    for r in list_connections():
+        if proto and r["proto"] != proto:
+            continue
+        if state and r["state"] != state:
+            continue
+        if port is not None and port not in (r["local_port"], r["remote_port"]):
+            continue
+        if pid is not None and r["pid"] != pid:
+            continue
+        proc = names.get(r["pid"])
+        out.append(dict(r, name=proc["name"] if proc else None))
+    return out
 
 def ports():
-    entries = []
-    pid_name = {}
-    try:
-        for p in psutil.process_iter(attrs=["pid", "name"]):
-            pid_name[p.info["pid"]] = p.info["name"]
-    except Exception:
-        pass
-    try:
-        res = subprocess.run(["netstat", "-ano"], capture_output=True, text=True, encoding="cp866", errors="replace")
-        for line in res.stdout.splitlines():
-            line = line.strip()
-            if line.startswith("TCP") or line.startswith("UDP"):
-                parts = [p for p in line.split() if p]
-                if parts[0] == "TCP" and len(parts) >= 5:
-                    proto, local, remote, state, pid = parts[0], parts[1], parts[2], parts[3], parts[4]
-                elif parts[0] == "UDP" and len(parts) >= 4:
-                    proto, local, remote, state, pid = parts[0], parts[1], parts[2], "-", parts[3]
-                else:
-                    continue
-                try:
-                    pid_int = int(pid)
-                except Exception:
-                    pid_int = None
-                entries.append({"proto": proto, "local": local, "remote": remote, "state": state, "pid": pid_int, "name": pid_name.get(pid_int)})
-    except Exception:
-        pass
-    return render_template("ports.html", entries=entries[:500])
+    entries = filtered_connections(request.args)
+    states = sorted({r["state"] for r in list_connections() if r["state"] != "-"})
+    limit = 500
+    return render_template(
+        "ports.html",
+        entries=entries[:limit],
+        total=len(entries),
+        states=states,
+        filters=request.args,
+    )
+
+def api_ports():
+    entries = filtered_connections(request.args)
+    limit = max(1, min(request.args.get("limit", 1000, type=int), 10000))
+    offset = max(0, request.args.get("offset", 0, type=int))
+    return jsonify({"total": len(entries), "offset": offset, "items": entries[offset:offset + limit]})
@@ -1,23 +1,111 @@
+import bisect
+import json
+import re
 import psutil
-from flask import render_template, request, flash, redirect, url_for
+from flask import current_app, render_template, request, flash, redirect, url_for, jsonify
 from i18n import tr
+from proctracker import get_process_tracker, SORT_KEYS
 
 def processes():
-    procs = []
-    for p in psutil.process_iter(attrs=["pid", "name", "username", "cpu_percent", "memory_info"]):
-        info = p.info
-        mem = info.get("memory_info")
-        procs.append(
-            {
-                "pid": info.get("pid"),
-                "name": info.get("name"),
-                "user": info.get("username"),
-                "cpu": info.get("cpu_percent"),
-                "mem": mem.rss if mem else 0,
-            }
-        )
-    procs.sort(key=lambda x: (x["cpu"] or 0), reverse=True)
-    return render_template("processes.html", processes=procs[:200])
+    snap = get_process_tracker(current_app).snapshot()
+    return render_template("processes.html", processes=snap.rows[:200])
+
+def api_processes():
+    """Page through the cached process table.
+    sort: cpu|rss|pid|name|user|threads|io; order: asc|desc (defaults to the
+    key's natural order); q: substring of name or exact PID (regex=1 for a
+    regular expression); user: exact username; cursor/limit: pagination.
+    The cursor is the (sort value, pid) of the last row returned, so paging
+    continues in the right place after the table was re-swept."""
+    snap = get_process_tracker(current_app).snapshot()
+    sort = request.args.get("sort", "cpu")
+    if sort not in SORT_KEYS:
+        return jsonify({"error": f"Unknown sort key: {sort}"}), 400
+    natural_desc = SORT_KEYS[sort][1]
+    order = request.args.get("order")
+    reverse = order is not None and (order == "desc") != natural_desc
+    limit = max(1, min(request.args.get("limit", 100, type=int), 1000))
+    cursor = None
+    if request.args.get("cursor"):
+        try:
+            value, pid = json.loads(request.args["cursor"])
+            cursor = (value, int(pid))
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid cursor"}), 400
+    user = request.args.get("user", "").strip()
+    q = request.args.get("q", "").strip()
+    match = None
+    if q:
+        if request.args.get("regex") == "1":
+            try:
+                rx = re.compile(q, re.IGNORECASE)
+            except re.error as e:
+                return jsonify({"error": f"Invalid regex: {e}"}), 400
+            match = lambda r: bool(rx.search(r["name"] or ""))
+        elif q.isdigit():
+            pid = int(q)
+            match = lambda r: r["pid"] == pid
+        else:
+            needle = q.lower()
+            match = lambda r: needle in (r["name"] or "").lower()
+
+    index = snap.order[sort]
+    keys = snap.keys[sort]
+    n = len(index)
+    descending = natural_desc != reverse
+    # Position just past the cursor in walking order (index is ascending)
+    try:
+        if cursor is None:
+            pos = n - 1 if descending else 0
+        else:
+            pos = bisect.bisect_left(keys, cursor) - 1 if descending else bisect.bisect_right(keys, cursor)
+    except TypeError:
+        return jsonify({"error": "Invalid cursor"}), 400
+    step = -1 if descending else 1
+    items = []
+    # Walk the pre-sorted index from the cursor; only scanned rows cost anything
+    while 0 <= pos < n and len(items) < limit:
+        row = index[pos]
+        pos += step
+        if user and row["user"] != user:
+            continue
+        if match is not None and not match(row):
+            continue
+        items.append(row)
+    more = 0 <= pos < n
+    return jsonify({
+        "generation": snap.generation,
+        "ts": snap.ts,
+        "total": n,
+        "sort": sort,
+        "order": ("asc" if natural_desc else "desc") if reverse else ("desc" if natural_desc else "asc"),
+        "items": items,
+        "next_cursor": json.dumps(keys[pos - step]) if more else None,
+        "births": len(snap.births),
+        "deaths": len(snap.deaths),
+    })
+
+def api_processes_tree():
+    """Process tree in depth-first order with per-subtree totals; root=PID
+    limits the result to that process and its descendants."""
+    snap = get_process_tracker(current_app).snapshot()
+    children, roots, totals = snap.tree()
+    root = request.args.get("root", type=int)
+    if root is not None:
+        if root not in snap.by_pid:
+            return jsonify({"error": tr("proc.not_found")}), 404
+        roots = [root]
+    items = []
+    stack = [(pid, 0) for pid in reversed(roots)]
+    while stack:
+        pid, depth = stack.pop()
+        row = dict(snap.by_pid[pid])
+        row["depth"] = depth
+        row["children"] = len(children.get(pid, ()))
+        row["subtree"] = totals[pid]
+        items.append(row)
+        stack.extend((c, depth + 1) for c in reversed(children.get(pid, ())))
+    return jsonify({"generation": snap.generation, "ts": snap.ts, "total": len(snap.rows), "items": items})
 
 def processes_kill():
     pid = request.form.get("pid", type=int)
@@ -34,3 +122,37 @@ def processes_kill():
     except Exception as e:
         flash(f"{tr('msg.error')}: {e}", "danger")
     return redirect(url_for("processes"))
+
+def processes_kill_tree():
+    pid = request.form.get("pid", type=int)
+    if not pid:
+        flash(tr("proc.pid_not_specified"), "warning")
+        return redirect(url_for("processes"))
+    try:
+        parent = psutil.Process(pid)
+        # Children first so the parent can't respawn them while we work
+        procs = parent.children(recursive=True)[::-1] + [parent]
+    except psutil.NoSuchProcess:
+        flash(tr("proc.not_found"), "warning")
+        return redirect(url_for("processes"))
+    except psutil.AccessDenied:
+        flash(tr("proc.access_denied"), "danger")
+        return redirect(url_for("processes"))
+    denied = 0
+    for p in procs:
+        try:
+            p.terminate()
+        except psutil.NoSuchProcess:
+            pass
+        except psutil.AccessDenied:
+            denied += 1
+    _, alive = psutil.wait_procs(procs, timeout=3)
+    for p in alive:
+        try:
+            p.kill()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    if denied:
+        flash(f"{tr('proc.access_denied')} ({denied})", "danger")
+    flash(f"{tr('proc.tree_terminated')} {pid} ({len(procs)})", "success")
+    return redirect(url_for("processes"))
@@ -1,75 +1,46 @@
 import os
-import sys
-import pathlib
-import subprocess
-import threading
-import time
-from datetime import datetime
 from flask import current_app, render_template, request, flash, redirect, url_for, jsonify
 from werkzeug.utils import secure_filename
 from utils import safe_join
 from i18n import tr
+from runner import Run, RunLimitError, SCRIPT_EXTS, IONICE_CLASSES, get_registry
 
-# Global state
-# SCRIPT_STATES: script_name -> {
-#   'status': 'running' | 'finished' | 'stopped' | 'error',
-#   'pid': int,
-#   'returncode': int,
-#   'stdout': str,
-#   'stderr': str,
-#   'start_time': str,
-#   'end_time': str
-# }
-SCRIPT_STATES = {}
-ACTIVE_PROCESSES = {} # script_name -> Popen object
-
-def monitor_process(script_name, process):
-    try:
-        stdout, stderr = process.communicate()
-        returncode = process.returncode
-    except Exception as e:
-        stdout = ""
-        stderr = str(e)
-        returncode = -1
-
-    if script_name in ACTIVE_PROCESSES:
-        del ACTIVE_PROCESSES[script_name]
-    
-    state = SCRIPT_STATES.get(script_name, {})
-    state['returncode'] = returncode
-    state['stdout'] = stdout or ""
-    state['stderr'] = stderr or ""
-    state['end_time'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    if returncode == 0:
-        state['status'] = 'finished'
-    else:
-        state['status'] = 'error'
-    
-    SCRIPT_STATES[script_name] = state
+OUTPUT_CHUNK = 64 * 1024  # default bytes returned per output request
+MAX_READ = 1024 * 1024  # max bytes returned per output request
 
 def scripts():
     scripts_root = current_app.config["SCRIPTS_DIR"]
     os.makedirs(scripts_root, exist_ok=True)
+    registry = get_registry(current_app)
     entries = []
     try:
         for name in os.listdir(scripts_root):
             full = os.path.join(scripts_root, name)
-            if os.path.isfile(full) and os.path.splitext(name)[1].lower() in [".py", ".bat", ".sh", ".ps1"]:
-                state = SCRIPT_STATES.get(name, {'status': 'stopped'})
+            if os.path.isfile(full) and os.path.splitext(name)[1].lower() in SCRIPT_EXTS:
+                active = registry.active(name)
+                last = registry.latest(name)
+                if isinstance(last, Run):
+                    last = last.meta()
+                last = last or {}
+                running = sum(1 for r in active if r.status == "running")
                 entries.append({
                     "name": name,
-                    "status": state.get('status', 'stopped'),
-                    "returncode": state.get('returncode'),
-                    "start_time": state.get('start_time'),
-                    "end_time": state.get('end_time')
+                    "status": "running" if running else last.get("status", "stopped"),
+                    "running": running,
+                    "queued": len(active) - running,
+                    "concurrency": registry.concurrency(name),
+                    "settings": registry.script_settings(name),
+                    "returncode": None if running else last.get("returncode"),
+                    "start_time": last.get("start_time"),
+                    "end_time": last.get("end_time"),
                 })
     except Exception:
         pass
     
     # Sort: running first, then by name
     entries.sort(key=lambda x: (0 if x['status'] == 'running' else 1, x["name"].lower()))
-    return render_template("scripts.html", scripts=entries)
+    return render_template("scripts.html", scripts=entries, active=registry.active(),
+                           max_workers=registry.max_workers)
 
 def run_script():
     script_name = request.form.get("script")
@@ -79,19 +50,15 @@ def run_script():
         flash(tr("msg.script_not_chosen"), "warning")
         return redirect(url_for("scripts"))
 
-    if script_name in ACTIVE_PROCESSES:
-        flash(tr("msg.script_running"), "warning")
-        return redirect(url_for("scripts"))
-
     scripts_root = current_app.config["SCRIPTS_DIR"]
-    script_path = safe_join(scripts_root, secure_filename(script_name))
+    script_name = secure_filename(script_name)
+    script_path = safe_join(scripts_root, script_name)
     
     if not os.path.exists(script_path):
         flash(tr("msg.script_not_found"), "danger")
         return redirect(url_for("scripts"))
 
-    ext = pathlib.Path(script_path).suffix.lower()
-    if ext not in [".py", ".bat", ".sh", ".ps1"]:
+    if os.path.splitext(script_path)[1].lower() not in SCRIPT_EXTS:
         flash(tr("msg.only_py_bat"), "danger")
         return redirect(url_for("scripts"))
 
@@ -100,67 +67,68 @@ def run_script():
     else:
         extra_args = []
 
-    cmd = []
-    if ext == ".py":
-        cmd = [sys.executable, "-u", script_path] + extra_args # -u for unbuffered
-    elif ext == ".bat":
-        cmd = ["cmd", "/c", script_path] + extra_args
-    elif ext == ".ps1":
-        cmd = ["powershell", "-ExecutionPolicy", "Bypass", "-File", script_path] + extra_args
-    else:
-        # Default fallback
-        cmd = [script_path] + extra_args
-
     try:
-        # Start background process
-        proc = subprocess.Popen(
-            cmd,
-            cwd=os.path.dirname(script_path),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            encoding="utf-8",
-            errors="replace",
-            shell=False # Better security
-        )
-        
-        ACTIVE_PROCESSES[script_name] = proc
-        SCRIPT_STATES[script_name] = {
-            'status': 'running',
-            'pid': proc.pid,
-            'start_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'stdout': '',
-            'stderr': ''
-        }
-        
-        # Start monitoring thread
-        thread = threading.Thread(target=monitor_process, args=(script_name, proc))
-        thread.daemon = True
-        thread.start()
-        
-        # flash(f"Script {script_name} started (PID: {proc.pid})", "success")
-        return redirect(url_for("scripts"))
-        
-    except Exception as e:
-        flash(f"{tr('msg.script_error')}: {e}", "danger")
+        run = get_registry(current_app).submit(script_name, script_path, extra_args)
+    except RunLimitError:
+        flash(tr("msg.run_queue_full"), "danger")
         return redirect(url_for("scripts"))
 
+    if run.status == "queued":
+        flash(tr("msg.run_queued"), "info")
+    elif run.status == "error":
+        flash(tr("msg.script_error"), "danger")
+    return redirect(url_for("scripts"))
+
 def stop_script(name):
-    if name in ACTIVE_PROCESSES:
-        proc = ACTIVE_PROCESSES[name]
+    """Stop every running or queued run of a script."""
+    registry = get_registry(current_app)
+    try:
+        for run in registry.active(secure_filename(name)):
+            registry.stop(run.run_id)
+        flash(tr("msg.script_stopped"), "success")
+    except Exception as e:
+        flash(f"Error stopping script: {e}", "danger")
+    
+    return redirect(request.referrer or url_for("scripts"))
+
+def stop_run(name, run_id):
+    registry = get_registry(current_app)
+    name = secure_filename(name)
+    run = registry.get(name, run_id)
+    # A dict here may be a run supervised by another worker process
+    if isinstance(run, Run) or (run and run.get("status") == "running"):
         try:
-            proc.terminate()
-            # Give it a moment to terminate gracefully
-            try:
-                proc.wait(timeout=2)
-            except subprocess.TimeoutExpired:
-                proc.kill()
-            
+            registry.stop(run_id, script=name)
             flash(tr("msg.script_stopped"), "success")
         except Exception as e:
             flash(f"Error stopping script: {e}", "danger")
-    
-    return redirect(url_for("scripts"))
+    return redirect(request.referrer or url_for("scripts"))
+
+def script_settings(name):
+    """Concurrency and resource limits of a script; empty fields clear them."""
+    name = secure_filename(name)
+    form = request.form
+    values = {}
+    concurrency = form.get("concurrency", type=int)
+    values["concurrency"] = max(1, min(concurrency, 64)) if concurrency is not None else None
+    for key in ("max_wall", "max_rss_mb", "cpu_pct"):
+        v = form.get(key, type=float)
+        values[key] = v if v and v > 0 else None
+    nice = form.get("nice", type=int)
+    values["nice"] = max(-20, min(nice, 19)) if nice is not None else None
+    values["ionice"] = form.get("ionice") if form.get("ionice") in IONICE_CLASSES else None
+    get_registry(current_app).update_settings(name, **values)
+    flash(tr("msg.settings_saved"), "success")
+    return redirect(request.referrer or url_for("scripts"))
+
+def script_history():
+    script = request.args.get("script")
+    script = secure_filename(script) if script else None
+    registry = get_registry(current_app)
+    runs = registry.history(script)
+    if request.args.get("format") == "json":
+        return jsonify({"runs": runs})
+    return render_template("script_history.html", runs=runs, script=script)
 
 def upload_script():
     if "file" not in request.files:
@@ -174,7 +142,7 @@ def upload_script():
         
     filename = secure_filename(f.filename)
     ext = os.path.splitext(filename)[1].lower()
-    if ext not in [".py", ".bat", ".sh", ".ps1"]:
+    if ext not in SCRIPT_EXTS:
         flash(tr("msg.only_py_bat"), "danger")
         return redirect(url_for("scripts"))
         
@@ -190,14 +158,53 @@ def upload_script():
         
     return redirect(url_for("scripts"))
 
-def get_script_output(name):
-    state = SCRIPT_STATES.get(name)
-    if not state:
-        return jsonify({"error": "No state found"}), 404
-    
+def output_response(run):
+    """JSON slice of a run's output starting at `offset` (negative counts back
+    from the end); `limit` caps the returned bytes."""
+    registry = get_registry(current_app)
+    log = registry.open_log(run)
+    state = run.meta() if isinstance(run, Run) else run
+
+    offset = request.args.get("offset", 0, type=int)
+    limit = max(1, min(request.args.get("limit", OUTPUT_CHUNK, type=int), MAX_READ))
+    if log is not None:
+        if offset < 0:
+            # Negative offset: start that many bytes before the current end
+            offset = max(0, log.end + offset)
+        offset, chunk, next_offset, truncated = log.read(offset, limit)
+        end = log.end
+    else:
+        chunk, next_offset, truncated, end = b"", offset, False, offset
     return jsonify({
         "status": state.get("status"),
-        "stdout": state.get("stdout", ""),
-        "stderr": state.get("stderr", ""),
-        "returncode": state.get("returncode")
+        "returncode": state.get("returncode"),
+        "start_time": state.get("start_time"),
+        "end_time": state.get("end_time"),
+        "run_id": state.get("run_id"),
+        "duration": state.get("duration"),
+        "peak_rss": state.get("peak_rss"),
+        "rss": state.get("rss"),
+        "cpu_time": state.get("cpu_time"),
+        "read_bytes": state.get("read_bytes"),
+        "write_bytes": state.get("write_bytes"),
+        "procs": state.get("procs"),
+        "limit": state.get("limit"),
+        "offset": offset,
+        "next_offset": next_offset,
+        "end": end,
+        "truncated": truncated,
+        "data": chunk.decode("utf-8", errors="replace"),
     })
+
+def get_script_output(name):
+    """Output of the newest run of a script."""
+    run = get_registry(current_app).latest(secure_filename(name))
+    if run is None:
+        return jsonify({"error": "No state found"}), 404
+    return output_response(run)
+
+def get_run_output(name, run_id):
+    run = get_registry(current_app).get(secure_filename(name), run_id)
+    if run is None:
+        return jsonify({"error": "No state found"}), 404
+    return output_response(run)
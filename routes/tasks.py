@@ -1,7 +1,11 @@
+import os
 import subprocess
-from flask import render_template, request, flash, redirect, url_for
+from flask import current_app, render_template, request, flash, redirect, url_for, jsonify
+from werkzeug.utils import secure_filename
 from utils import schtasks_list
 from i18n import tr
+from runner import SCRIPT_EXTS
+from scheduler import get_scheduler
 
 def tasks():
     if request.method == "POST":
@@ -42,4 +46,53 @@ def tasks():
                 flash(str(e), "danger")
         return redirect(url_for("tasks"))
         
-    return render_template("tasks.html", tasks=schtasks_list())
+    scripts_root = current_app.config["SCRIPTS_DIR"]
+    try:
+        script_names = sorted(n for n in os.listdir(scripts_root) if os.path.splitext(n)[1].lower() in SCRIPT_EXTS)
+    except OSError:
+        script_names = []
+    return render_template(
+        "tasks.html",
+        tasks=schtasks_list(),
+        schedules=get_scheduler(current_app).list(),
+        script_names=script_names,
+    )
+
+def schedule_add():
+    script = secure_filename(request.form.get("script", ""))
+    cron = request.form.get("cron", "").strip()
+    args = request.form.get("args", "").split()
+    if not script or not os.path.isfile(os.path.join(current_app.config["SCRIPTS_DIR"], script)):
+        flash(tr("msg.script_not_found"), "danger")
+        return redirect(url_for("tasks"))
+    try:
+        get_scheduler(current_app).add(
+            script,
+            args,
+            cron,
+            jitter=request.form.get("jitter", 0, type=int),
+            catchup=request.form.get("catchup", "skip"),
+        )
+        flash(tr("sched.added"), "success")
+    except ValueError as e:
+        flash(f"{tr('sched.bad_cron')}: {e}", "danger")
+    return redirect(url_for("tasks"))
+
+def schedule_action():
+    job_id = request.form.get("id", "")
+    action = request.form.get("action", "")
+    scheduler = get_scheduler(current_app)
+    if action == "run":
+        status = scheduler.run_now(job_id)
+        if status is not None:
+            flash(f"{tr('task.started')}: {status}", "success")
+    elif action in ("enable", "disable"):
+        if scheduler.set_enabled(job_id, action == "enable"):
+            flash(tr("task.enabled" if action == "enable" else "task.disabled"), "success")
+    elif action == "delete":
+        if scheduler.remove(job_id):
+            flash(tr("task.deleted"), "success")
+    return redirect(url_for("tasks"))
+
+def api_schedules():
+    return jsonify({"schedules": get_scheduler(current_app).list()})
@@ -1,37 +1,88 @@
 import subprocess
 import os
+import json
+import codecs
+import secrets
+import signal
+import threading
 import platform
-from flask import current_app, request, flash, redirect, url_for, render_template, session, jsonify
+import select
+import time
+from urllib.parse import urlsplit
+from flask import current_app, request, flash, redirect, url_for, render_template, session, jsonify, Response
 from utils import safe_join
 from i18n import tr
+from telemetry import TERMINAL_COMMANDS
+from pty_sessions import PTY_AVAILABLE, PtyLimitError, get_pty_manager
+from termhistory import get_history_store
+from routes.monitor import sse_frame
+
+HISTORY_PAGE = 20
+STREAM_CHUNK = 16 * 1024
+STREAM_IDLE = 5  # seconds without output before a keepalive probes the client
+
+# Streaming commands that can be cancelled: exec_id -> (term_id, Popen)
+RUNNING_EXECS = {}
+RUNNING_LOCK = threading.Lock()
 
 def get_default_shell():
     if platform.system().lower() == "windows":
         return "powershell"
     return "/bin/bash"
 
+def term_id():
+    """Key of this browser's terminal history in the server-side store."""
+    if "term_id" not in session:
+        session["term_id"] = secrets.token_urlsafe(16)
+    # History used to live in the cookie itself
+    session.pop("term_output_history", None)
+    session.pop("cmd_history", None)
+    return session["term_id"]
+
+def build_shell_command(shell, cmdline):
+    if platform.system().lower() == "windows":
+        if shell == "powershell":
+            return ["powershell", "-NoProfile", "-NonInteractive", "-Command", cmdline]
+        return ["cmd", "/c", cmdline]
+    # Linux/Unix
+    return [shell, "-c", cmdline]
+
+def kill_group(proc):
+    """Kill a streamed command together with everything it started."""
+    if proc.poll() is not None:
+        return
+    try:
+        if os.name == "nt":
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)], capture_output=True)
+        else:
+            # start_new_session made the shell a group leader
+            os.killpg(proc.pid, signal.SIGTERM)
+            try:
+                proc.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
 def terminal():
     # Session state for CWD
     if "term_cwd" not in session:
         session["term_cwd"] = current_app.config["BASE_DIR"]
-    
-    # Session state for full output history (list of {cmd, output, cwd, timestamp})
-    if "term_output_history" not in session:
-        session["term_output_history"] = []
-        
-    hist = session.get("cmd_history", [])
+
+    # Output history is fetched page by page from /terminal/history
+    hist = get_history_store(current_app).commands(term_id())
     
     hide_nav = request.args.get('embedded') == 'true'
 
     return render_template(
         "terminal.html", 
         last_cmd=None, 
-        output_history=session["term_output_history"],
         cmd_history=hist, 
         current_cwd=session["term_cwd"],
         default_shell=get_default_shell(),
         is_windows=(platform.system().lower() == "windows"),
-        hide_nav=hide_nav
+        hide_nav=hide_nav,
+        pty_available=PTY_AVAILABLE and "terminal_ws" in current_app.view_functions,
     )
 
 def terminal_exec():
@@ -65,16 +116,12 @@ def terminal_exec():
             output = str(e)
             returncode = 1
     else:
+        if request.args.get("stream"):
+            return stream_exec(cmdline, build_shell_command(shell, cmdline), workdir)
+
         # Run actual command
         try:
-            if platform.system().lower() == "windows":
-                if shell == "powershell":
-                    command = ["powershell", "-NoProfile", "-NonInteractive", "-Command", cmdline]
-                else:
-                    command = ["cmd", "/c", cmdline]
-            else:
-                # Linux/Unix
-                command = [shell, "-c", cmdline]
+            command = build_shell_command(shell, cmdline)
 
             proc = subprocess.run(
                 command,
@@ -95,22 +142,10 @@ def terminal_exec():
             output = f"Execution error: {e}"
             returncode = -1
 
-    # Update history
-    cmd_hist = session.get("cmd_history", [])
-    if cmdline not in cmd_hist:
-        cmd_hist = (cmd_hist + [cmdline])[-20:]
-    session["cmd_history"] = cmd_hist
-    
-    # Append to output history
-    out_hist = session.get("term_output_history", [])
-    out_hist.append({
-        "cmd": cmdline,
-        "output": output,
-        "cwd": workdir,
-        "code": returncode
-    })
-    # Keep last 50 entries to avoid session bloat
-    session["term_output_history"] = out_hist[-50:]
+    TERMINAL_COMMANDS.inc("ok" if returncode == 0 else "error")
+
+    # Update history (server-side; the cookie only carries term_id)
+    get_history_store(current_app).append(term_id(), cmdline, output, workdir, returncode)
     
     # Return JSON if requested
     if request.args.get('ajax') or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -123,18 +158,181 @@ def terminal_exec():
 
     return redirect(url_for("terminal"))
 
+def stream_exec(cmdline, command, workdir):
+    """Run a command and forward its output as server-sent events while it
+    runs: "start" {id}, "output" {data}..., "end" {code, cwd, truncated}.
+    Output past TERM_STREAM_MAX_BYTES is discarded (the command keeps
+    running); /terminal/cancel or a client disconnect kills the process group."""
+    store = get_history_store(current_app)
+    sid = term_id()
+    max_bytes = current_app.config.get("TERM_STREAM_MAX_BYTES", 16 * 1024 * 1024)
+    timeout = current_app.config.get("TERM_STREAM_TIMEOUT", 3600)
+    exec_id = secrets.token_hex(8)
+
+    def generate():
+        kwargs = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP} if os.name == "nt" else {"start_new_session": True}
+        try:
+            proc = subprocess.Popen(
+                command,
+                cwd=workdir,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                shell=False,
+                **kwargs,
+            )
+        except Exception as e:
+            output = f"Execution error: {e}"
+            store.append(sid, cmdline, output, workdir, -1)
+            TERMINAL_COMMANDS.inc("error")
+            yield sse_frame("start", {"id": exec_id})
+            yield sse_frame("output", {"data": output})
+            yield sse_frame("end", {"code": -1, "cwd": workdir, "truncated": False})
+            return
+        with RUNNING_LOCK:
+            RUNNING_EXECS[exec_id] = (sid, proc)
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        parts = []
+        sent = 0
+        truncated = False
+        deadline = threading.Timer(timeout, kill_group, (proc,))
+        deadline.daemon = True
+        deadline.start()
+        try:
+            yield sse_frame("start", {"id": exec_id})
+            fd = proc.stdout.fileno()
+            last_yield = time.monotonic()
+            while True:
+                # A silent command must still notice a dead client: the keepalive
+                # write fails and closing the generator kills the group below.
+                # Windows can't select() on pipes and reads blocking instead.
+                if os.name != "nt" and not select.select([fd], [], [], STREAM_IDLE)[0]:
+                    last_yield = time.monotonic()
+                    yield ": keepalive\n\n"
+                    continue
+                chunk = os.read(fd, STREAM_CHUNK)
+                if not chunk:
+                    break
+                if sent >= max_bytes:
+                    # Drain so the command isn't blocked on a full pipe
+                    if time.monotonic() - last_yield >= STREAM_IDLE:
+                        last_yield = time.monotonic()
+                        yield ": keepalive\n\n"
+                    continue
+                chunk = chunk[:max_bytes - sent]
+                sent += len(chunk)
+                text = decoder.decode(chunk)
+                if sent >= max_bytes:
+                    truncated = True
+                    text += decoder.decode(b"", final=True) + f"\n[output truncated at {max_bytes} bytes]\n"
+                if text:
+                    parts.append(text)
+                    last_yield = time.monotonic()
+                    yield sse_frame("output", {"data": text})
+            returncode = proc.wait()
+            TERMINAL_COMMANDS.inc("ok" if returncode == 0 else "error")
+            store.append(sid, cmdline, "".join(parts), workdir, returncode)
+            yield sse_frame("end", {"code": returncode, "cwd": workdir, "truncated": truncated})
+        finally:
+            # Also reached when the client goes away mid-stream
+            deadline.cancel()
+            kill_group(proc)
+            proc.stdout.close()
+            with RUNNING_LOCK:
+                RUNNING_EXECS.pop(exec_id, None)
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def terminal_cancel():
+    exec_id = request.form.get("id") or request.args.get("id", "")
+    with RUNNING_LOCK:
+        entry = RUNNING_EXECS.get(exec_id)
+    # Only the terminal session that started a command may cancel it
+    if entry is None or entry[0] != session.get("term_id"):
+        return jsonify({"error": "Not running"}), 404
+    kill_group(entry[1])
+    return jsonify({"status": "cancelled"})
+
+def terminal_history():
+    """A page of output history, oldest first; pass `before` from the previous
+    response to get older entries."""
+    before = request.args.get("before", type=int)
+    limit = max(1, min(request.args.get("limit", HISTORY_PAGE, type=int), 200))
+    entries, next_before = get_history_store(current_app).page(term_id(), before, limit)
+    return jsonify({"entries": entries, "before": next_before})
+
 def terminal_clear():
-    session["term_output_history"] = []
-    # Don't clear cmd_history (up arrow), just the screen
+    # Don't clear command history (up arrow), just the screen
+    get_history_store(current_app).clear(term_id(), keep_commands=True)
     if request.args.get('ajax') or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return jsonify({'status': 'cleared'})
     return redirect(url_for("terminal"))
 
 def terminal_reset():
     session["term_cwd"] = current_app.config["BASE_DIR"]
-    session["term_output_history"] = []
-    session["cmd_history"] = []
+    get_history_store(current_app).clear(term_id())
     if request.args.get('ajax') or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return jsonify({'status': 'reset', 'cwd': session["term_cwd"]})
     flash(tr("msg.history_cleared"), "success")
     return redirect(url_for("terminal"))
+
+def terminal_pty():
+    if not PTY_AVAILABLE or "terminal_ws" not in current_app.view_functions:
+        flash(tr("term.pty_unavailable"), "warning")
+        return redirect(url_for("terminal"))
+    # The WebSocket handshake can't set cookies, so the session key is issued here
+    if "pty_id" not in session:
+        session["pty_id"] = secrets.token_urlsafe(16)
+    return render_template("pty.html", hide_nav=request.args.get("embedded") == "true")
+
+def same_origin():
+    """True if the request's Origin header names this server."""
+    origin = request.headers.get("Origin")
+    return bool(origin) and urlsplit(origin).netloc.lower() == request.host.lower()
+
+def terminal_ws(ws):
+    """Bridge between the browser and the user's PTY session. Binary frames
+    are keystrokes, text frames JSON control messages ({"type": "resize",
+    "cols", "rows"}); output is pushed by the PTY manager's reader thread."""
+    sid = session.get("pty_id")
+    if not sid:
+        ws.close(reason=1008, message="No terminal session")
+        return
+    try:
+        pty_sess = get_pty_manager(current_app).open(
+            sid,
+            os.environ.get("SHELL", get_default_shell()),
+            session.get("term_cwd", current_app.config["BASE_DIR"]),
+            request.args.get("cols", 80, type=int),
+            request.args.get("rows", 24, type=int),
+        )
+    except PtyLimitError as e:
+        ws.send(f"\r\n{e}\r\n")
+        return
+    pty_sess.attach(ws)
+    try:
+        while pty_sess.alive:
+            msg = ws.receive(timeout=5)
+            if msg is None:
+                continue
+            if isinstance(msg, bytes):
+                pty_sess.write(msg)
+                continue
+            try:
+                ctl = json.loads(msg)
+            except ValueError:
+                continue
+            if ctl.get("type") == "resize":
+                pty_sess.resize(ctl.get("cols", 80), ctl.get("rows", 24))
+    finally:
+        pty_sess.detach(ws)
+
+def terminal_pty_close():
+    sid = session.get("pty_id")
+    if sid and PTY_AVAILABLE:
+        get_pty_manager(current_app).close(sid)
+    return jsonify({"status": "closed"})
@@ -0,0 +1,167 @@
+import json
+import os
+import secrets
+import threading
+import time
+
+TAIL_BYTES = 256 * 1024  # recent output kept in memory for live viewers
+READ_CHUNK = 64 * 1024
+
+def utf8_safe_len(chunk):
+    """Length of `chunk` without a trailing incomplete UTF-8 sequence."""
+    for back in range(1, min(4, len(chunk)) + 1):
+        b = chunk[-back]
+        if b & 0xC0 == 0x80:
+            continue  # continuation byte, keep looking for the lead byte
+        if b & 0x80 == 0:
+            return len(chunk)
+        need = 2 if b & 0xE0 == 0xC0 else 3 if b & 0xF0 == 0xE0 else 4
+        return len(chunk) if back >= need else len(chunk) - back
+    return len(chunk)
+
+def new_run_id():
+    return time.strftime("%Y%m%d-%H%M%S") + "-" + secrets.token_hex(3)
+
+class RunLog:
+    """Output of one script run, appended to `<run_id>.log` on disk and
+    addressed by absolute byte offset. When the file passes `max_bytes` it is
+    rotated to `.log.1` (replacing the older segment), so a run never takes
+    more than twice `max_bytes` of disk. The last TAIL_BYTES stay in memory
+    so live pollers don't touch the file."""
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, meta=None, writable=True):
+        self.path = path
+        self.max_bytes = max_bytes
+        meta = meta or {}
+        # Absolute offsets of the first byte in the current / rotated segment
+        self.base = meta.get("log_base", 0)
+        self.prev_base = meta.get("log_prev_base")
+        self.lock = threading.Lock()
+        self.tail = bytearray()
+        self.closed = not writable
+        self.f = None
+        if writable:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.f = open(path, "ab", buffering=0)
+            self.size = self.f.tell()
+        else:
+            try:
+                self.size = os.path.getsize(path)
+            except OSError:
+                self.size = 0
+
+    def append(self, chunk):
+        with self.lock:
+            if self.f is None:
+                return
+            self.f.write(chunk)
+            self.size += len(chunk)
+            self.tail += chunk
+            if len(self.tail) > 2 * TAIL_BYTES:
+                del self.tail[:len(self.tail) - TAIL_BYTES]
+            if self.size >= self.max_bytes:
+                self._rotate()
+
+    def _rotate(self):
+        self.f.close()
+        os.replace(self.path, self.path + ".1")
+        self.prev_base = self.base
+        self.base += self.size
+        self.size = 0
+        self.f = open(self.path, "ab", buffering=0)
+
+    def close(self):
+        with self.lock:
+            if self.f is not None:
+                self.f.close()
+                self.f = None
+            self.closed = True
+
+    @property
+    def end(self):
+        with self.lock:
+            return self.base + self.size
+
+    def meta(self):
+        with self.lock:
+            return {"log_base": self.base, "log_prev_base": self.prev_base, "log_end": self.base + self.size}
+
+    def read(self, offset, max_bytes=READ_CHUNK):
+        """Return (offset, data, next_offset, truncated). `truncated` means
+        the requested offset was rotated away and reading resumed later."""
+        with self.lock:
+            end = self.base + self.size
+            earliest = self.prev_base if self.prev_base is not None else self.base
+            truncated = offset < earliest
+            offset = min(max(offset, earliest), end)
+            tail_start = end - len(self.tail)
+            if offset >= tail_start:
+                rel = offset - tail_start
+                chunk = bytes(self.tail[rel:rel + max_bytes])
+            elif offset >= self.base:
+                chunk = self._read_file(self.path, offset - self.base, max_bytes)
+            else:
+                # Still inside the rotated segment; stop at its end
+                chunk = self._read_file(self.path + ".1", offset - self.prev_base, min(max_bytes, self.base - offset))
+            if not self.closed or offset + len(chunk) < end:
+                chunk = chunk[:utf8_safe_len(chunk)]
+            return offset, chunk, offset + len(chunk), truncated
+
+    @staticmethod
+    def _read_file(path, pos, length):
+        try:
+            with open(path, "rb") as f:
+                f.seek(pos)
+                return f.read(length)
+        except OSError:
+            return b""
+
+def script_runs_dir(runs_root, script_name):
+    return os.path.join(runs_root, script_name)
+
+def save_meta(runs_root, script_name, meta):
+    path = os.path.join(script_runs_dir(runs_root, script_name), meta["run_id"] + ".json")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, path)
+
+def load_runs(runs_root, script_name):
+    """Metadata of all recorded runs of a script, newest first."""
+    d = script_runs_dir(runs_root, script_name)
+    runs = []
+    try:
+        names = os.listdir(d)
+    except OSError:
+        return runs
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(d, name), "r", encoding="utf-8") as f:
+                runs.append(json.load(f))
+        except Exception:
+            continue
+    runs.sort(key=lambda m: m.get("run_id", ""), reverse=True)
+    return runs
+
+def open_log(runs_root, script_name, meta, max_bytes=64 * 1024 * 1024):
+    """Read-only view of a finished run's log."""
+    path = os.path.join(script_runs_dir(runs_root, script_name), meta["run_id"] + ".log")
+    return RunLog(path, max_bytes=max_bytes, meta=meta, writable=False)
+
+def prune_runs(runs_root, script_name, keep=20, max_age_days=30, active=()):
+    """Delete runs beyond the newest `keep` or older than `max_age_days`."""
+    d = script_runs_dir(runs_root, script_name)
+    cutoff = time.time() - max_age_days * 86400
+    for i, meta in enumerate(load_runs(runs_root, script_name)):
+        run_id = meta.get("run_id")
+        if not run_id or run_id in active:
+            continue
+        if i < keep and meta.get("started", time.time()) >= cutoff:
+            continue
+        for suffix in (".log", ".log.1", ".json"):
+            try:
+                os.remove(os.path.join(d, run_id + suffix))
+            except OSError:
+                pass
@@ -0,0 +1,604 @@
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+import psutil
+from runlog import RunLog, new_run_id, script_runs_dir, save_meta, load_runs, open_log, prune_runs
+from shared import FileSemaphore
+from telemetry import SCRIPT_RUNS
+
+SCRIPT_EXTS = [".py", ".bat", ".sh", ".ps1"]
+PIPE_CHUNK = 64 * 1024
+SAMPLE_INTERVAL = 1.0
+KILL_GRACE = 3  # seconds between terminate() and kill() when stopping a run
+SLOT_POLL = 1.0  # re-check slots held by other worker processes this often
+
+# Per-script limits kept in scripts.json next to "concurrency"
+LIMIT_KEYS = ("max_wall", "max_rss_mb", "nice", "ionice", "cpu_pct")
+IONICE_CLASSES = {"idle": "IOPRIO_CLASS_IDLE", "best-effort": "IOPRIO_CLASS_BE"}
+
+_REGISTRY = None
+_REGISTRY_LOCK = threading.Lock()
+
+class RunLimitError(Exception):
+    pass
+
+def build_command(script_path, extra_args):
+    ext = os.path.splitext(script_path)[1].lower()
+    if ext == ".py":
+        return [sys.executable, "-u", script_path] + extra_args # -u for unbuffered
+    if ext == ".bat":
+        return ["cmd", "/c", script_path] + extra_args
+    if ext == ".ps1":
+        return ["powershell", "-ExecutionPolicy", "Bypass", "-File", script_path] + extra_args
+    # Default fallback
+    return [script_path] + extra_args
+
+def kill_tree(pid, grace=KILL_GRACE):
+    """Terminate a process and all its descendants, children first, then
+    kill whatever is still alive after `grace` seconds."""
+    try:
+        parent = psutil.Process(pid)
+        procs = parent.children(recursive=True)
+    except psutil.Error:
+        return
+    procs.reverse()
+    procs.append(parent)
+    for p in procs:
+        try:
+            p.terminate()
+        except psutil.Error:
+            pass
+    _, alive = psutil.wait_procs(procs, timeout=grace)
+    for p in alive:
+        try:
+            p.kill()
+        except psutil.Error:
+            pass
+
+def now_str():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+class Run:
+    def __init__(self, script, script_path, args):
+        self.run_id = new_run_id()
+        self.script = script
+        self.script_path = script_path
+        self.args = args
+        self.status = "queued"
+        self.pid = None
+        self.owner = os.getpid()  # server process supervising the run
+        self.returncode = None
+        self.queued = time.time()
+        self.started = None
+        self.ended = None
+        self.start_time = None
+        self.end_time = None
+        self.peak_rss = 0
+        self.rss = 0
+        self.cpu_time = 0.0
+        self.read_bytes = 0
+        self.write_bytes = 0
+        self.procs = 0
+        self.limit = None  # "wall" / "rss" when the supervisor killed the run
+        self.cgroup = None
+        self.seen = {}  # (pid, create_time) -> (cpu, read, write), dead ones keep their last value
+        self.proc = None
+        self.log = None
+        self.slots = []
+        self.stop_requested = False
+
+    @property
+    def duration(self):
+        if not self.started:
+            return None
+        return round((self.ended or time.time()) - self.started, 1)
+
+    def meta(self):
+        m = {
+            "run_id": self.run_id,
+            "script": self.script,
+            "args": self.args,
+            "pid": self.pid,
+            "owner": self.owner,
+            "status": self.status,
+            "returncode": self.returncode,
+            "started": self.started,
+            "ended": self.ended,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration": self.duration,
+            "peak_rss": self.peak_rss,
+            "rss": self.rss,
+            "cpu_time": round(self.cpu_time, 2),
+            "read_bytes": self.read_bytes,
+            "write_bytes": self.write_bytes,
+            "procs": self.procs,
+            "limit": self.limit,
+        }
+        if self.log is not None:
+            m.update(self.log.meta())
+        return m
+
+class RunRegistry:
+    """Every invocation of a script is a Run with its own ID and log. At most
+    `max_workers` runs execute at once, and at most `concurrency(script)` of
+    the same script; anything over the caps waits in a FIFO queue and starts
+    as soon as a slot frees up.
+
+    A supervisor thread per run samples CPU time, RSS and I/O of the child and
+    its descendants, and enforces the script's limits (wall time, RSS, nice,
+    ionice and, when `cgroup_root` is a delegated cgroup v2 directory, kernel
+    memory/CPU caps).
+
+    With `lock_dir` the caps hold across several server processes: each run
+    takes a slot of a global and a per-script file semaphore, and queued runs
+    are re-checked every SLOT_POLL seconds since other processes can't wake
+    this one when they free a slot. Runs started by another process show up
+    in history as running for as long as that process lives."""
+
+    def __init__(self, runs_root, settings_path, max_workers=4, default_concurrency=1,
+                 max_queue=100, log_max_bytes=64 * 1024 * 1024, keep=20, max_age_days=30,
+                 cgroup_root=None, lock_dir=None):
+        self.runs_root = runs_root
+        self.cgroup_root = cgroup_root
+        self.lock_dir = lock_dir
+        self.poller = None
+        self.settings_path = settings_path
+        self.max_workers = max(1, max_workers)
+        self.default_concurrency = max(1, default_concurrency)
+        self.max_queue = max_queue
+        self.log_max_bytes = log_max_bytes
+        self.keep = keep
+        self.max_age_days = max_age_days
+        self.lock = threading.RLock()
+        self.running = {}  # run_id -> Run
+        self.queue = deque()
+        self.recent = {}  # run_id -> Run, finished runs still in memory
+        self.settings_mtime = None
+        self.settings = self._load_settings()
+
+    # Per-script settings (scripts.json): {"name.py": {"concurrency": 2, ...}}
+    def _settings_file_mtime(self):
+        try:
+            return os.stat(self.settings_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load_settings(self):
+        self.settings_mtime = self._settings_file_mtime()
+        try:
+            with open(self.settings_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except Exception:
+            return {}
+
+    def _sync_settings(self):
+        """Pick up edits saved by another server process. Lock held."""
+        if self._settings_file_mtime() != self.settings_mtime:
+            self.settings = self._load_settings()
+
+    def script_settings(self, script):
+        with self.lock:
+            self._sync_settings()
+            return dict(self.settings.get(script, {}))
+
+    def update_settings(self, script, **values):
+        with self.lock:
+            self._sync_settings()
+            cur = self.settings.setdefault(script, {})
+            for k, v in values.items():
+                if v is None:
+                    cur.pop(k, None)
+                else:
+                    cur[k] = v
+            if not cur:
+                self.settings.pop(script, None)
+            os.makedirs(os.path.dirname(self.settings_path), exist_ok=True)
+            tmp = self.settings_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.settings, f, indent=2)
+            os.replace(tmp, self.settings_path)
+            self.settings_mtime = self._settings_file_mtime()
+        self._dispatch()
+
+    def concurrency(self, script):
+        try:
+            return max(1, int(self.script_settings(script).get("concurrency", self.default_concurrency)))
+        except (TypeError, ValueError):
+            return self.default_concurrency
+
+    def submit(self, script, script_path, args):
+        run = Run(script, script_path, args)
+        with self.lock:
+            if len(self.queue) >= self.max_queue:
+                raise RunLimitError("Run queue is full")
+            self.queue.append(run)
+        self._dispatch()
+        return run
+
+    def _can_start(self, run):
+        if len(self.running) >= self.max_workers:
+            return False
+        same = sum(1 for r in self.running.values() if r.script == run.script)
+        return same < self.concurrency(run.script)
+
+    def _take_slots(self, run):
+        """Global and per-script semaphore slots shared with the other
+        server processes; False (holding nothing) if either is full."""
+        if self.lock_dir is None:
+            return True
+        script_key = "script-" + hashlib.sha1(run.script.encode("utf-8")).hexdigest()[:12]
+        for name, n in (("workers", self.max_workers), (script_key, self.concurrency(run.script))):
+            slot = FileSemaphore(self.lock_dir, name, n).try_acquire()
+            if slot is None:
+                self._release_slots(run)
+                return False
+            run.slots.append(slot)
+        return True
+
+    @staticmethod
+    def _release_slots(run):
+        slots, run.slots = run.slots, []
+        for slot in slots:
+            slot.release()
+
+    def _dispatch(self):
+        with self.lock:
+            # FIFO, but a run blocked by its own script's limit doesn't hold up others
+            for run in list(self.queue):
+                if len(self.running) >= self.max_workers:
+                    break
+                if run in self.queue and self._can_start(run) and self._take_slots(run):
+                    self.queue.remove(run)
+                    self._start(run)
+            if self.lock_dir is not None and self.queue and self.poller is None:
+                self.poller = threading.Thread(target=self._poll, name="rsc-run-poll", daemon=True)
+                self.poller.start()
+
+    def _poll(self):
+        while True:
+            time.sleep(SLOT_POLL)
+            with self.lock:
+                if not self.queue:
+                    self.poller = None
+                    return
+            self._dispatch()
+
+    def _start(self, run):
+        run.started = time.time()
+        run.start_time = now_str()
+        self.running[run.run_id] = run
+        try:
+            run.log = RunLog(
+                os.path.join(script_runs_dir(self.runs_root, run.script), run.run_id + ".log"),
+                max_bytes=self.log_max_bytes,
+            )
+            kwargs = {} if os.name == "nt" else {"preexec_fn": self._limits_preexec(run)}
+            run.proc = subprocess.Popen(
+                build_command(run.script_path, run.args),
+                cwd=os.path.dirname(run.script_path),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT, # interleaved, in the order the script wrote it
+                shell=False, # Better security
+                **kwargs,
+            )
+        except Exception as e:
+            if run.log is not None:
+                run.log.append(f"{e}\n".encode("utf-8", errors="replace"))
+            self._cgroup_release(run)
+            self._finish(run, -1, "error")
+            return
+        run.pid = run.proc.pid
+        run.status = "running"
+        SCRIPT_RUNS.inc()
+        try:
+            save_meta(self.runs_root, run.script, run.meta())
+            prune_runs(self.runs_root, run.script, keep=self.keep, max_age_days=self.max_age_days,
+                       active=set(self.running))
+        except Exception:
+            pass
+        threading.Thread(target=self._supervise, args=(run,), name=f"rsc-run-{run.run_id}", daemon=True).start()
+
+    def _limits_preexec(self, run):
+        """Return a function that applies the script's priority and cgroup
+        placement in the child between fork and exec, so the script and
+        everything it starts inherit them from the first instruction."""
+        settings = self.script_settings(run.script)
+        cgroup = self._cgroup_create(run, settings) if self.cgroup_root else None
+        nice = settings.get("nice")
+        ioclass = IONICE_CLASSES.get(settings.get("ionice"))
+        ioclass = getattr(psutil, ioclass) if ioclass and hasattr(psutil, ioclass) else None
+
+        def preexec():
+            # Errors go to stderr, which already is the run's log pipe
+            if nice is not None:
+                try:
+                    os.setpriority(os.PRIO_PROCESS, 0, int(nice))
+                except (OSError, ValueError) as e:
+                    os.write(2, f"[nice: {e}]\n".encode())
+            if ioclass is not None:
+                try:
+                    psutil.Process().ionice(ioclass)
+                except (psutil.Error, OSError, ValueError) as e:
+                    os.write(2, f"[ionice: {e}]\n".encode())
+            if cgroup:
+                try:
+                    self._cg_write(cgroup, "cgroup.procs", str(os.getpid()))
+                except OSError as e:
+                    os.write(2, f"[cgroup: {e}]\n".encode())
+        return preexec
+
+    def _cgroup_create(self, run, settings):
+        """Create the run's cgroup with its limits set; the child joins it."""
+        path = os.path.join(self.cgroup_root, "rsc-" + run.run_id)
+        try:
+            os.mkdir(path)
+            if settings.get("max_rss_mb"):
+                self._cg_write(path, "memory.max", str(int(float(settings["max_rss_mb"]) * 1024 * 1024)))
+                # On OOM kill the whole run, not just the biggest process in it
+                self._cg_write(path, "memory.oom.group", "1")
+            if settings.get("cpu_pct"):
+                period = 100000
+                self._cg_write(path, "cpu.max", f"{int(float(settings['cpu_pct']) * period / 100)} {period}")
+            run.cgroup = path
+            return path
+        except (OSError, ValueError) as e:
+            run.log.append(f"[cgroup: {e}]\n".encode())
+            try:
+                os.rmdir(path)
+            except OSError:
+                pass
+            return None
+
+    @staticmethod
+    def _cg_write(path, name, value):
+        with open(os.path.join(path, name), "w") as f:
+            f.write(value)
+
+    def _cgroup_release(self, run):
+        if not run.cgroup:
+            return
+        try:
+            with open(os.path.join(run.cgroup, "memory.events")) as f:
+                for line in f:
+                    key, _, val = line.partition(" ")
+                    if key == "oom_kill" and int(val) > 0:
+                        run.limit = "rss"
+        except (OSError, ValueError):
+            pass
+        try:
+            os.rmdir(run.cgroup)
+        except OSError:
+            pass
+
+    def _supervise(self, run):
+        reader = threading.Thread(target=self._pump, args=(run,), daemon=True)
+        reader.start()
+        try:
+            ps = psutil.Process(run.pid)
+        except psutil.Error:
+            ps = None
+        settings = self.script_settings(run.script)
+        returncode = None
+        ticks = 0
+        while returncode is None:
+            # Sample quickly at first so short runs still get accounted
+            timeout = min(SAMPLE_INTERVAL, 0.1 * 2 ** ticks)
+            ticks += 1
+            try:
+                returncode = run.proc.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self._sample(run, ps)
+                self._enforce(run, settings)
+        reader.join()
+        self._cgroup_release(run)
+        if run.limit:
+            status = "killed"
+        elif run.stop_requested:
+            status = "stopped"
+        else:
+            status = "finished" if returncode == 0 else "error"
+        self._finish(run, returncode, status)
+
+    def _enforce(self, run, settings):
+        if run.limit or run.stop_requested:
+            return
+        try:
+            max_wall = float(settings.get("max_wall") or 0)
+            max_rss = float(settings.get("max_rss_mb") or 0) * 1024 * 1024
+        except (TypeError, ValueError):
+            return
+        if max_wall and time.time() - run.started > max_wall:
+            run.limit = "wall"
+        elif max_rss and run.rss > max_rss:
+            run.limit = "rss"
+        else:
+            return
+        run.log.append(f"\n[limit exceeded: {run.limit}, killing process tree]\n".encode())
+        threading.Thread(target=kill_tree, args=(run.pid,), daemon=True).start()
+
+    def _sample(self, run, ps):
+        if ps is None:
+            return
+        try:
+            procs = [ps] + ps.children(recursive=True)
+        except psutil.Error:
+            return
+        rss = 0
+        alive = 0
+        for p in procs:
+            try:
+                with p.oneshot():
+                    key = (p.pid, p.create_time())
+                    cpu = p.cpu_times()
+                    mem = p.memory_info().rss
+                    try:
+                        io = p.io_counters()
+                    except (psutil.Error, AttributeError):
+                        io = None  # not available on macOS / without permission
+            except psutil.Error:
+                continue
+            rss += mem
+            alive += 1
+            run.seen[key] = (
+                cpu.user + cpu.system,
+                io.read_bytes if io else 0,
+                io.write_bytes if io else 0,
+            )
+        run.rss = rss
+        run.procs = alive
+        run.peak_rss = max(run.peak_rss, rss)
+        run.cpu_time = sum(v[0] for v in run.seen.values())
+        run.read_bytes = sum(v[1] for v in run.seen.values())
+        run.write_bytes = sum(v[2] for v in run.seen.values())
+
+    def _pump(self, run):
+        stream = run.proc.stdout
+        try:
+            fd = stream.fileno()
+            while True:
+                chunk = os.read(fd, PIPE_CHUNK)
+                if not chunk:
+                    break
+                run.log.append(chunk)
+        except Exception as e:
+            run.log.append(f"\n[output error: {e}]\n".encode())
+        finally:
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+    def _finish(self, run, returncode, status):
+        run.returncode = returncode
+        run.status = status
+        run.rss = 0
+        run.procs = 0
+        run.ended = time.time()
+        run.end_time = now_str()
+        if run.log is not None:
+            run.log.close()
+        run.proc = None
+        self._release_slots(run)
+        with self.lock:
+            self.running.pop(run.run_id, None)
+            self.recent[run.run_id] = run
+            # Keep only a handful of finished runs in memory; history is on disk
+            while len(self.recent) > 200:
+                self.recent.pop(next(iter(self.recent)))
+        try:
+            save_meta(self.runs_root, run.script, run.meta())
+        except Exception:
+            pass
+        self._dispatch()
+
+    def stop(self, run_id, script=None):
+        """Stop a queued or running run. With `script`, a run supervised by
+        another server process is stopped too (its process tree is killed,
+        and that process records the exit)."""
+        with self.lock:
+            for run in list(self.queue):
+                if run.run_id == run_id:
+                    self.queue.remove(run)
+                    run.status = "stopped"
+                    run.ended = time.time()
+                    run.end_time = now_str()
+                    self.recent[run.run_id] = run
+                    return True
+            run = self.running.get(run_id)
+        if run is None and script is not None:
+            meta = self.get(script, run_id)
+            if isinstance(meta, dict) and meta.get("status") == "running" and meta.get("pid"):
+                kill_tree(meta["pid"])
+                return True
+        if run is None or run.proc is None:
+            return False
+        run.stop_requested = True
+        kill_tree(run.pid)
+        return True
+
+    def active(self, script=None):
+        with self.lock:
+            runs = list(self.running.values()) + list(self.queue)
+        return [r for r in runs if script is None or r.script == script]
+
+    def get(self, script, run_id):
+        """Run object if it is live or recent, else its metadata dict from disk."""
+        with self.lock:
+            for r in list(self.running.values()) + list(self.queue) + list(self.recent.values()):
+                if r.run_id == run_id and r.script == script:
+                    return r
+        for meta in load_runs(self.runs_root, script):
+            if meta.get("run_id") == run_id:
+                return self._disk_meta(meta)
+        return None
+
+    def _disk_meta(self, meta):
+        if meta.get("status") == "running" and meta.get("run_id") not in self.running:
+            owner = meta.get("owner")
+            if owner and owner != os.getpid() and psutil.pid_exists(owner):
+                return meta  # supervised by another server process
+            # Server restarted while the script was running
+            meta = dict(meta, status="stopped")
+        return meta
+
+    def history(self, script=None, limit=200):
+        """Metadata of recorded runs (newest first), plus queued runs."""
+        if script is not None:
+            scripts = [script]
+        else:
+            try:
+                scripts = [d for d in os.listdir(self.runs_root) if os.path.isdir(os.path.join(self.runs_root, d))]
+            except OSError:
+                scripts = []
+        with self.lock:
+            live = {r.run_id: r for r in self.running.values()}
+            queued = [r.meta() for r in self.queue if script is None or r.script == script]
+        metas = []
+        for s in scripts:
+            for meta in load_runs(self.runs_root, s):
+                run = live.get(meta.get("run_id"))
+                metas.append(run.meta() if run else self._disk_meta(meta))
+        metas.sort(key=lambda m: m.get("started") or 0, reverse=True)
+        return queued + metas[:limit]
+
+    def latest(self, script):
+        """Newest run of a script: live Run object or disk metadata."""
+        with self.lock:
+            runs = [r for r in list(self.running.values()) + list(self.recent.values()) if r.script == script]
+        if runs:
+            return max(runs, key=lambda r: r.started or r.queued)
+        metas = load_runs(self.runs_root, script)
+        return self._disk_meta(metas[0]) if metas else None
+
+    def open_log(self, run):
+        if isinstance(run, Run):
+            return run.log
+        return open_log(self.runs_root, run["script"], run, self.log_max_bytes)
+
+def get_registry(app):
+    global _REGISTRY
+    if _REGISTRY is None:
+        with _REGISTRY_LOCK:
+            if _REGISTRY is None:
+                cfg = app.config
+                _REGISTRY = RunRegistry(
+                    cfg["RUNS_DIR"],
+                    os.path.join(cfg["DATA_DIR"], "scripts.json"),
+                    max_workers=cfg.get("RUN_MAX_WORKERS", 4),
+                    default_concurrency=cfg.get("RUN_CONCURRENCY", 1),
+                    log_max_bytes=cfg.get("RUN_LOG_MAX_BYTES", 64 * 1024 * 1024),
+                    keep=cfg.get("RUN_KEEP", 20),
+                    max_age_days=cfg.get("RUN_MAX_AGE_DAYS", 30),
+                    cgroup_root=cfg.get("RUN_CGROUP_ROOT"),
+                    lock_dir=os.path.join(cfg["DATA_DIR"], "locks") if cfg.get("WORKERS", 1) > 1 else None,
+                )
+    return _REGISTRY
@@ -0,0 +1,216 @@
+import threading
+import time
+from collections import deque
+import psutil
+from utils import get_gpu_info
+from tsdb import TimeSeriesStore
+from shared import get_primary_lock
+
+FIRST_SAMPLE_TIMEOUT = 5  # seconds latest() waits for the first snapshot
+
+_SAMPLER = None
+_SAMPLER_LOCK = threading.Lock()
+
+class MetricsSampler:
+    """Probes the host once per interval in a background thread and keeps
+    the last `history` snapshots in a ring buffer, so readers never touch psutil."""
+
+    def __init__(self, interval=1.0, history=600, store=None, store_writer=None):
+        self.interval = max(0.2, float(interval))
+        self.buffer = deque(maxlen=max(1, int(history)))
+        self.lock = threading.Lock()
+        # Subscribers (SSE streams) block on this until a new snapshot lands
+        self.cond = threading.Condition(self.lock)
+        self.seq = 0
+        self.thread = None
+        # Optional long-term sink (tsdb.TimeSeriesStore); with several worker
+        # processes only the one for which store_writer() is true writes to it
+        self.store = store
+        self.store_writer = store_writer
+        self.cpu_cores = psutil.cpu_count(logical=False) or 0
+        self.cpu_threads = psutil.cpu_count() or 0
+        # Previous per-NIC / per-disk counters for rate computation
+        self.prev_io = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        # Prime cpu_percent so the first real sample is not 0.0
+        psutil.cpu_percent(interval=None)
+        self.thread = threading.Thread(target=self._run, name="rsc-metrics-sampler", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while True:
+            try:
+                snap = self.sample()
+                with self.cond:
+                    self.buffer.append(snap)
+                    self.seq += 1
+                    self.cond.notify_all()
+                if self.store is not None and (self.store_writer is None or self.store_writer()):
+                    self.store.add(snap)
+            except Exception:
+                pass
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                # We fell behind (suspend, slow probe); resync instead of bursting
+                next_tick = time.monotonic()
+                delay = 0
+            time.sleep(delay)
+
+    def sample(self):
+        mem = psutil.virtual_memory()
+        cpu = psutil.cpu_percent(interval=None)
+        cpu_freq = psutil.cpu_freq()
+        cpu_cur = int(cpu_freq.current) if cpu_freq else None
+        cpu_max = int(cpu_freq.max) if cpu_freq else None
+        # Aggregate disks
+        total_disk = 0
+        used_disk = 0
+        for part in psutil.disk_partitions(all=False):
+            try:
+                usage = psutil.disk_usage(part.mountpoint)
+                total_disk += usage.total
+                used_disk += usage.used
+            except Exception:
+                continue
+        disk_percent = round((used_disk / total_disk) * 100, 1) if total_disk else 0
+        rates = self.io_rates()
+        _, nics, _, disk_io = self.prev_io
+        gpus = get_gpu_info()
+        return {
+            "ts": time.time(),
+            "cpu_percent": cpu,
+            "cpu_freq_cur": cpu_cur,
+            "cpu_freq_max": cpu_max,
+            "cpu_cores": self.cpu_cores,
+            "cpu_threads": self.cpu_threads,
+            "mem_total": mem.total,
+            "mem_used": mem.used,
+            "mem_percent": mem.percent,
+            "mem_available": mem.available,
+            "disk_total": total_disk,
+            "disk_used": used_disk,
+            "disk_percent": disk_percent,
+            "net_bytes_sent": sum(n.bytes_sent for n in nics.values()),
+            "net_bytes_recv": sum(n.bytes_recv for n in nics.values()),
+            "disk_read_bytes": getattr(disk_io, "read_bytes", 0),
+            "disk_write_bytes": getattr(disk_io, "write_bytes", 0),
+            "net_sent_rate": sum(r["bytes_sent"] for r in rates["net"].values()),
+            "net_recv_rate": sum(r["bytes_recv"] for r in rates["net"].values()),
+            "disk_read_rate": rates["disk_read"],
+            "disk_write_rate": rates["disk_write"],
+            "net_rates": rates["net"],
+            "disk_rates": rates["disk"],
+            "gpus": gpus,
+        }
+
+    def io_rates(self):
+        """Per-NIC and per-disk rates since the previous sample, in units per second."""
+        now = time.monotonic()
+        try:
+            nics = psutil.net_io_counters(pernic=True) or {}
+        except Exception:
+            nics = {}
+        try:
+            disks = psutil.disk_io_counters(perdisk=True) or {}
+        except Exception:
+            disks = {}
+        try:
+            disk_total = psutil.disk_io_counters()
+        except Exception:
+            disk_total = None
+        prev = self.prev_io
+        self.prev_io = (now, nics, disks, disk_total)
+        rates = {"net": {}, "disk": {}, "disk_read": 0.0, "disk_write": 0.0}
+        dt = now - prev[0] if prev else 0
+        if dt <= 0:
+            for name in nics:
+                rates["net"][name] = {"bytes_sent": 0.0, "bytes_recv": 0.0, "packets_sent": 0.0, "packets_recv": 0.0}
+            for name in disks:
+                rates["disk"][name] = {"read_bytes": 0.0, "write_bytes": 0.0, "read_iops": 0.0, "write_iops": 0.0}
+            return rates
+
+        def per_sec(cur, old, field):
+            # Counters can reset (interface re-created); never report negative rates
+            return round(max(0, getattr(cur, field, 0) - getattr(old, field, 0)) / dt, 1)
+
+        for name, cur in nics.items():
+            old = prev[1].get(name)
+            if old is None:
+                old = cur
+            rates["net"][name] = {
+                "bytes_sent": per_sec(cur, old, "bytes_sent"),
+                "bytes_recv": per_sec(cur, old, "bytes_recv"),
+                "packets_sent": per_sec(cur, old, "packets_sent"),
+                "packets_recv": per_sec(cur, old, "packets_recv"),
+            }
+        for name, cur in disks.items():
+            old = prev[2].get(name)
+            if old is None:
+                old = cur
+            rates["disk"][name] = {
+                "read_bytes": per_sec(cur, old, "read_bytes"),
+                "write_bytes": per_sec(cur, old, "write_bytes"),
+                "read_iops": per_sec(cur, old, "read_count"),
+                "write_iops": per_sec(cur, old, "write_count"),
+            }
+        # Totals come from the aggregate counter, which (unlike a sum over
+        # perdisk) does not count a partition and its parent disk twice
+        if disk_total is not None and prev[3] is not None:
+            rates["disk_read"] = per_sec(disk_total, prev[3], "read_bytes")
+            rates["disk_write"] = per_sec(disk_total, prev[3], "write_bytes")
+        return rates
+
+    def latest(self, timeout=FIRST_SAMPLE_TIMEOUT):
+        """Newest snapshot; right after start waits for the sampler thread's
+        first one, and returns {} if none arrives within `timeout`."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.buffer, timeout)
+            return self.buffer[-1] if self.buffer else {}
+
+    def wait_next(self, seq, timeout=None):
+        """Block until a snapshot newer than `seq` exists.
+        Returns (seq, snapshot), or (seq, None) on timeout."""
+        with self.cond:
+            if self.seq <= seq:
+                self.cond.wait_for(lambda: self.seq > seq, timeout)
+            if self.seq > seq and self.buffer:
+                return self.seq, self.buffer[-1]
+            return seq, None
+
+    def history(self, since=None):
+        with self.lock:
+            items = list(self.buffer)
+        if since is None:
+            return items
+        # Buffer is ordered by ts; walk back from the newest end
+        idx = len(items)
+        while idx > 0 and items[idx - 1]["ts"] > since:
+            idx -= 1
+        return items[idx:]
+
+def get_sampler(app):
+    global _SAMPLER
+    if _SAMPLER is None:
+        with _SAMPLER_LOCK:
+            if _SAMPLER is None:
+                store = None
+                store_dir = app.config.get("METRICS_STORE_DIR")
+                if store_dir:
+                    try:
+                        store = TimeSeriesStore(store_dir)
+                    except Exception:
+                        store = None
+                s = MetricsSampler(
+                    interval=app.config.get("METRICS_INTERVAL", 1.0),
+                    history=app.config.get("METRICS_HISTORY", 600),
+                    store=store,
+                    store_writer=get_primary_lock(app).check,
+                )
+                s.start()
+                _SAMPLER = s
+    return _SAMPLER
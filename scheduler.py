@@ -0,0 +1,359 @@
+import bisect
+import heapq
+import itertools
+import json
+import os
+import random
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+from runner import Run, get_registry
+from shared import FileLock, get_primary_lock
+
+MISFIRE_GRACE = 60  # a fire later than this counts as missed (server down, suspend, ...)
+MAX_WAIT = 60  # re-check the clock at least this often, in case it jumps
+SHARED_WAIT = 5  # ... and schedules.json this often when several workers share it
+CATCHUP_POLICIES = ("skip", "once")
+
+_SCHEDULER = None
+_SCHEDULER_LOCK = threading.Lock()
+
+MONTH_NAMES = {m: i + 1 for i, m in enumerate("jan feb mar apr may jun jul aug sep oct nov dec".split())}
+DAY_NAMES = {d: i for i, d in enumerate("sun mon tue wed thu fri sat".split())}
+ALIASES = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+
+def parse_field(text, lo, hi, names=None):
+    values = set()
+    for part in text.lower().split(","):
+        rng, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if step < 1:
+            raise ValueError(f"bad step in '{part}'")
+        if rng == "*":
+            start, end = lo, hi
+        else:
+            a, _, b = rng.partition("-")
+            start = names[a] if names and a in names else int(a)
+            if b:
+                end = names[b] if names and b in names else int(b)
+            else:
+                end = hi if step > 1 else start  # "5/15" means 5-59/15
+        if not lo <= start <= end <= hi:
+            raise ValueError(f"'{part}' out of range {lo}-{hi}")
+        values.update(range(start, end + 1, step))
+    return sorted(values)
+
+class CronExpr:
+    """Standard 5-field cron expression (minute hour day month weekday) with
+    lists, ranges, steps, month/day names and @daily-style aliases. When both
+    day fields are restricted a time matches if either does, as in Vixie cron."""
+
+    def __init__(self, expr):
+        self.expr = expr.strip()
+        parts = ALIASES.get(self.expr.lower(), self.expr).split()
+        if len(parts) != 5:
+            raise ValueError("cron expression needs 5 fields")
+        self.minutes = parse_field(parts[0], 0, 59)
+        self.hours = set(parse_field(parts[1], 0, 23))
+        self.days = set(parse_field(parts[2], 1, 31))
+        self.months = set(parse_field(parts[3], 1, 12, MONTH_NAMES))
+        self.weekdays = {d % 7 for d in parse_field(parts[4], 0, 7, DAY_NAMES)}  # 7 is Sunday too
+        self.dom_any = parts[2] == "*"
+        self.dow_any = parts[4] == "*"
+
+    def _day_ok(self, dt):
+        dom = dt.day in self.days
+        dow = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.dom_any and self.dow_any:
+            return True
+        if self.dom_any:
+            return dow
+        if self.dow_any:
+            return dom
+        return dom or dow
+
+    def next_after(self, dt):
+        """First matching minute strictly after naive local datetime `dt`."""
+        dt = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt.year + 5
+        while dt.year <= limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                continue
+            if not self._day_ok(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+                continue
+            i = bisect.bisect_left(self.minutes, dt.minute)
+            if i == len(self.minutes):
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+                continue
+            return dt.replace(minute=self.minutes[i])
+        raise ValueError(f"'{self.expr}' never fires")
+
+class Scheduler:
+    """Fires scripts through the run registry on cron schedules. All jobs share
+    one thread sleeping on a heap of (fire time, job) entries; editing a job
+    bumps its token so stale heap entries are dropped when they surface.
+    Jobs are persisted to `path` along with their last fire time, so missed
+    fires can be caught up after a restart according to the job's policy:
+    "skip" waits for the next regular time, "once" runs a single catch-up.
+    A job never overlaps itself: if its previous run is still queued or
+    running the fire is skipped.
+
+    Several worker processes may share `path`: edits are made under a file
+    lock after reloading the file if another process changed it, and only
+    the process for which `primary()` is true fires jobs."""
+
+    PERSIST_KEYS = ("id", "script", "args", "cron", "jitter", "catchup", "enabled", "created",
+                    "last_fire", "last_run_id", "last_status", "skipped", "missed")
+
+    def __init__(self, path, registry, scripts_dir, primary=None):
+        self.path = path
+        self.registry = registry
+        self.scripts_dir = scripts_dir
+        self.primary = primary or (lambda: True)
+        self.file_lock = FileLock(path + ".lock")
+        self.mtime = None
+        self.jobs = {}
+        self.heap = []
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+        self.thread = None
+        with self.cond:
+            self._load()
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load(self):
+        self.mtime = self._file_mtime()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except Exception:
+            saved = []
+        for job in self.jobs.values():
+            self._unschedule(job)
+        self.jobs = {}
+        now = time.time()
+        for data in saved:
+            try:
+                job = self._make_job(data)
+            except (KeyError, ValueError):
+                continue
+            self.jobs[job["id"]] = job
+            if not job["enabled"]:
+                continue
+            last = job.get("last_fire") or job["created"]
+            try:
+                missed = job["_cron"].next_after(datetime.fromtimestamp(last)).timestamp()
+                if missed <= now and job["catchup"] == "once":
+                    self._push(job, now, now)  # one catch-up fire, right away
+                else:
+                    self._schedule(job, max(last, now - MISFIRE_GRACE))
+            except ValueError:
+                job["last_status"] = "error"  # kept, but left unscheduled
+
+    def _sync(self):
+        """Reload if another process rewrote the file. Cond held."""
+        if self._file_mtime() != self.mtime:
+            self._load()
+
+    def _make_job(self, data):
+        cron = CronExpr(data["cron"])
+        cron.next_after(datetime.now())  # ValueError for "0 0 30 2 *" and the like
+        job = {
+            "id": data.get("id") or secrets.token_hex(4),
+            "script": data["script"],
+            "args": list(data.get("args") or []),
+            "cron": data["cron"],
+            "jitter": max(0, int(data.get("jitter") or 0)),
+            "catchup": data.get("catchup") if data.get("catchup") in CATCHUP_POLICIES else "skip",
+            "enabled": bool(data.get("enabled", True)),
+            "created": data.get("created") or time.time(),
+            "last_fire": data.get("last_fire"),
+            "last_run_id": data.get("last_run_id"),
+            "last_status": data.get("last_status"),
+            "skipped": data.get("skipped", 0),
+            "missed": data.get("missed", 0),
+            "next_fire": None,
+            "_cron": cron,
+            "_token": 0,
+        }
+        return job
+
+    def _save(self):
+        data = [{k: job[k] for k in self.PERSIST_KEYS} for job in self.jobs.values()]
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self.path)
+        self.mtime = self._file_mtime()
+
+    def _push(self, job, base, fire):
+        job["_token"] += 1
+        job["next_fire"] = fire
+        heapq.heappush(self.heap, (fire, next(self.counter), job["id"], job["_token"], base))
+        self.cond.notify()
+
+    def _schedule(self, job, after):
+        base = job["_cron"].next_after(datetime.fromtimestamp(after)).timestamp()
+        fire = base + (random.uniform(0, job["jitter"]) if job["jitter"] else 0)
+        self._push(job, base, fire)
+
+    def _unschedule(self, job):
+        job["_token"] += 1
+        job["next_fire"] = None
+
+    # Public API, called from request handlers
+    def add(self, script, args, cron, jitter=0, catchup="skip"):
+        job = self._make_job({"script": script, "args": args, "cron": cron, "jitter": jitter, "catchup": catchup})
+        with self.cond, self.file_lock:
+            self._sync()
+            self.jobs[job["id"]] = job
+            self._schedule(job, time.time())
+            self._save()
+        return self.public(job)
+
+    def remove(self, job_id):
+        with self.cond, self.file_lock:
+            self._sync()
+            job = self.jobs.pop(job_id, None)
+            if job is None:
+                return False
+            self._unschedule(job)
+            self._save()
+        return True
+
+    def set_enabled(self, job_id, enabled):
+        with self.cond, self.file_lock:
+            self._sync()
+            job = self.jobs.get(job_id)
+            if job is None:
+                return False
+            job["enabled"] = enabled
+            if enabled:
+                self._schedule(job, time.time())
+            else:
+                self._unschedule(job)
+            self._save()
+        return True
+
+    def run_now(self, job_id):
+        with self.cond, self.file_lock:
+            self._sync()
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            self._fire(job, 0)
+            self._save()
+            return job["last_status"]
+
+    def public(self, job):
+        return {k: v for k, v in job.items() if not k.startswith("_")}
+
+    def list(self):
+        with self.cond:
+            self._sync()
+            jobs = [self.public(j) for j in self.jobs.values()]
+        jobs.sort(key=lambda j: (j["next_fire"] is None, j["next_fire"] or 0, j["script"]))
+        return jobs
+
+    # Timer thread
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="rsc-scheduler", daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        with self.cond:
+            while True:
+                try:
+                    self._sync()
+                except OSError:
+                    pass
+                if not self.primary():
+                    # Another worker fires; just follow its writes to the file
+                    self.cond.wait(SHARED_WAIT)
+                    continue
+                if self.heap and self.heap[0][0] <= time.time():
+                    with self.file_lock:
+                        self._sync()
+                        self._fire_due()
+                timeout = MAX_WAIT
+                if self.heap:
+                    timeout = min(MAX_WAIT, max(0.0, self.heap[0][0] - time.time()))
+                self.cond.wait(timeout)
+
+    def _fire_due(self):
+        now = time.time()
+        fired = False
+        while self.heap and self.heap[0][0] <= now:
+            fire, _, job_id, token, base = heapq.heappop(self.heap)
+            job = self.jobs.get(job_id)
+            if job is None or job["_token"] != token or not job["enabled"]:
+                continue  # edited, disabled or deleted since it was queued
+            self._fire(job, now - fire)
+            self._schedule(job, max(base, now))
+            fired = True
+        if fired:
+            try:
+                self._save()
+            except OSError:
+                pass
+
+    def _fire(self, job, late):
+        job["last_fire"] = time.time()
+        if late > MISFIRE_GRACE and job["catchup"] == "skip":
+            job["missed"] += 1
+            job["last_status"] = "missed"
+            return
+        prev = self.registry.get(job["script"], job["last_run_id"]) if job["last_run_id"] else None
+        if isinstance(prev, Run) and prev.status in ("queued", "running"):
+            job["skipped"] += 1
+            job["last_status"] = "skipped"
+            return
+        script_path = os.path.join(self.scripts_dir, job["script"])
+        if not os.path.isfile(script_path):
+            job["last_status"] = "missing"
+            return
+        try:
+            run = self.registry.submit(job["script"], script_path, job["args"])
+        except Exception:
+            job["last_status"] = "error"
+            return
+        job["last_run_id"] = run.run_id
+        job["last_status"] = run.status
+
+def get_scheduler(app, start=False):
+    """The shared scheduler. Only start_background() passes start=True, so
+    looking at /tasks doesn't start firing jobs (RSC_SCHEDULER=0)."""
+    global _SCHEDULER
+    if _SCHEDULER is None:
+        with _SCHEDULER_LOCK:
+            if _SCHEDULER is None:
+                _SCHEDULER = Scheduler(
+                    os.path.join(app.config["DATA_DIR"], "schedules.json"),
+                    get_registry(app),
+                    app.config["SCRIPTS_DIR"],
+                    primary=get_primary_lock(app).check,
+                )
+    if start:
+        _SCHEDULER.start()
+    return _SCHEDULER
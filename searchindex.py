@@ -0,0 +1,566 @@
+import ctypes
+import ctypes.util
+import gzip
+import heapq
+import json
+import os
+import re
+import select
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+
+EVENT_DELAY = 0.5  # let a burst of inotify events settle before rescanning
+RESCAN_INTERVAL = 60  # mtime sweep over directories inotify doesn't cover
+REBUILD_PENDING = 2000  # changes kept beside the blob before it is rebuilt...
+REBUILD_AGE = 30  # ...or this many seconds after the first of them
+SAVE_INTERVAL = 300
+MAX_CANDIDATES = 5000  # matches ranked per query; more only sets "truncated"
+DIR_SCAN_MAX = 100_000  # entries of the selected directories checked one by one rather than via the blob
+MODES = ("substring", "glob", "fuzzy")
+
+# inotify(7)
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct("iIII")
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+class Inotify:
+    """Just enough of inotify, through libc (Linux only)."""
+
+    MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add = libc.inotify_add_watch
+        self._add.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._rm = libc.inotify_rm_watch
+        self._rm.argtypes = (ctypes.c_int, ctypes.c_int)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add(self, path):
+        wd = self._add(self.fd, os.fsencode(path), self.MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def remove(self, wd):
+        self._rm(self.fd, wd)
+
+    def read(self):
+        """[(wd, mask)] of the queued events."""
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        pos = 0
+        while pos + EVENT_HEADER.size <= len(buf):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(buf, pos)
+            events.append((wd, mask))
+            pos += EVENT_HEADER.size + length
+        return events
+
+def glob_regex(pattern):
+    """Compiled glob for fullmatch(). "*" and "?" stop at "/", "**" doesn't,
+    and "**/" or a trailing "/**" also match no directory at all."""
+    out = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("/**", i) and i + 3 == len(pattern):
+            out.append("(?:/.*)?")
+            break
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                out.append("\\[")
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append("[" + body.replace("\\", "\\\\") + "]")
+                i = end
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return re.compile("".join(out), re.S)
+
+def glob_literal(pattern):
+    """Longest wildcard-free run of `pattern`, to find candidates with."""
+    return max(re.split(r"\*|\?|\[[^\]]*\]", pattern), key=len)
+
+def fuzzy_regex(q):
+    """Names containing the characters of `q` in order. Each gap is a
+    negated class, so the match is found without backtracking."""
+    parts = [re.escape(q[0])]
+    for c in q[1:]:
+        parts.append("[^\\n%s]*%s" % (re.escape(c), re.escape(c)))
+    return re.compile("".join(parts))
+
+def fuzzy_score(text, q):
+    """fzf-like score of `q` as a subsequence of `text`, None if it isn't."""
+    pos = -1
+    prev = -2
+    first = None
+    score = 0
+    for ch in q:
+        pos = text.find(ch, pos + 1)
+        if pos < 0:
+            return None
+        if first is None:
+            first = pos
+        if pos == prev + 1:
+            score += 5  # consecutive
+        if pos == 0 or text[pos - 1] in "/_-. ":
+            score += 3  # start of a word
+        prev = pos
+    return score - (prev - first + 1 - len(q))  # gaps
+
+class SearchIndex:
+    """Path index of a directory tree for the file browser's search.
+
+    The tree is kept as {dir: [mtime_ns, files, subdirs]} and flattened into
+    a table of directories plus one lower-cased, newline-separated "blob" of
+    entry names, so a query is a str.find()/regex scan in C rather than a
+    Python loop over a million strings; `starts` maps a match offset back to
+    its entry and `parents` to its directory. A query without "/" matches
+    names; "a/b" matches entries named b* in directories ending in a, which
+    is every path containing "a/b" short of those under such an entry.
+    Changes made after the blob was built sit in `added`/`removed` until
+    the next rebuild.
+
+    A background thread crawls the tree once (or loads the persisted tree
+    and re-checks directory mtimes), then follows it with inotify where
+    available. Directories without a watch (no inotify, or the watch limit
+    reached) are re-checked every RESCAN_INTERVAL by mtime, one stat per
+    directory. Symlinked directories are listed but not entered."""
+
+    def __init__(self, root, exclude=(), persist_path=None):
+        self.root = os.path.abspath(root)
+        self.exclude = {os.path.abspath(p) for p in exclude}
+        self.persist_path = persist_path
+        self.lock = threading.RLock()
+        self.dirs = {}  # rel dir ("" is the root) -> [mtime_ns, set(files), set(subdirs)]
+        self.dir_paths = [""]
+        self.dir_lower = [""]
+        self.dir_first = array("q", [0, 0])  # entries of dir i are dir_first[i]:dir_first[i + 1]
+        self.names = []
+        self.parents = array("i")
+        self.blob = ""
+        self.starts = array("q")
+        self.added = {}  # rel path -> None, insertion ordered
+        self.removed = set()
+        self.pending_since = None
+        self.building = True
+        self.ready = False
+        self.saved = True
+        self.last_save = time.monotonic()
+        self.inotify = None
+        self.watches = {}  # wd -> rel dir
+        self.dir_watches = {}  # rel dir -> wd
+        self.watch_full = False
+        self.dirty = set()
+        self.dirty_since = None
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="rsc-search", daemon=True)
+            self.thread.start()
+
+    # Tree maintenance (crawler thread)
+    def _abs(self, rel):
+        return os.path.join(self.root, rel) if rel else self.root
+
+    def _scan(self, rel):
+        path = self._abs(rel)
+        files, subdirs = set(), set()
+        with os.scandir(path) as it:
+            for e in it:
+                try:
+                    is_dir = e.is_dir(follow_symlinks=False)
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    if e.path not in self.exclude:
+                        subdirs.add(e.name)
+                else:
+                    files.add(e.name)
+        return os.stat(path).st_mtime_ns, files, subdirs
+
+    def _watch(self, rel):
+        if self.inotify is None or self.watch_full or rel in self.dir_watches:
+            return
+        try:
+            wd = self.inotify.add(self._abs(rel))
+        except OSError as e:
+            if e.errno == 28:  # ENOSPC: max_user_watches reached, the mtime sweep covers the rest
+                self.watch_full = True
+            return
+        self.watches[wd] = rel
+        self.dir_watches[rel] = wd
+
+    def _unwatch(self, rel):
+        wd = self.dir_watches.pop(rel, None)
+        if wd is not None:
+            self.watches.pop(wd, None)
+            self.inotify.remove(wd)
+
+    def _add(self, path):
+        if self.building:
+            return
+        if path in self.removed:
+            self.removed.discard(path)  # back to what the blob says
+            return
+        self.added[path] = None
+        if self.pending_since is None:
+            self.pending_since = time.monotonic()
+
+    def _remove(self, path):
+        if self.building:
+            return
+        if path in self.added:
+            del self.added[path]  # never made it into the blob
+            return
+        self.removed.add(path)
+        if self.pending_since is None:
+            self.pending_since = time.monotonic()
+
+    def _update_dir(self, rel):
+        """Rescan one directory and apply the difference. Returns the new
+        subdirectories, which the caller crawls."""
+        self._watch(rel)
+        try:
+            mtime, files, subdirs = self._scan(rel)
+        except OSError:
+            return []  # gone: its parent's rescan drops it
+        prefix = rel + "/" if rel else ""
+        with self.lock:
+            old = self.dirs.get(rel)
+            old_files, old_subdirs = (old[1], old[2]) if old else (set(), set())
+            self.dirs[rel] = [mtime, files, subdirs]
+            for name in files - old_files:
+                self._add(prefix + name)
+            for name in old_files - files:
+                self._remove(prefix + name)
+            for name in old_subdirs - subdirs:
+                self._drop_tree(prefix + name)
+            new = [prefix + name for name in subdirs - old_subdirs]
+            for path in new:
+                self._add(path)
+        return new
+
+    def _drop_tree(self, rel):
+        self._remove(rel)
+        stack = [rel]
+        while stack:
+            d = stack.pop()
+            entry = self.dirs.pop(d, None)
+            if self.inotify is not None:
+                self._unwatch(d)
+            if entry is None:
+                continue
+            for name in entry[1]:
+                self._remove(d + "/" + name)
+            for name in entry[2]:
+                self._remove(d + "/" + name)
+                stack.append(d + "/" + name)
+
+    def _crawl(self, rel):
+        stack = [rel]
+        while stack:
+            stack.extend(self._update_dir(stack.pop()))
+        self.saved = False
+
+    def _sweep(self, unwatched_only=False):
+        """Rescan directories whose mtime changed."""
+        for rel in list(self.dirs):
+            if unwatched_only and rel in self.dir_watches:
+                continue
+            entry = self.dirs.get(rel)
+            if entry is None:
+                continue  # dropped along with its parent meanwhile
+            try:
+                mtime = os.stat(self._abs(rel)).st_mtime_ns
+            except OSError:
+                continue
+            if mtime != entry[0]:
+                for sub in self._update_dir(rel):
+                    self._crawl(sub)
+                self.saved = False
+
+    def _rebuild(self):
+        # Runs on the crawler thread, the only writer of the tree, so only the swap needs the lock
+        dir_paths = list(self.dirs)
+        dir_first = array("q", [0])
+        names = []
+        parents = array("i")
+        for i, d in enumerate(dir_paths):
+            _, files, subdirs = self.dirs[d]
+            names.extend(files)
+            names.extend(subdirs)
+            parents.extend(array("i", [i]) * (len(files) + len(subdirs)))
+            dir_first.append(len(names))
+        lowered = [n.lower() for n in names]  # lower() may change the length, so starts come from these
+        starts = array("q", accumulate((len(n) + 1 for n in lowered), initial=0))
+        starts.pop()
+        blob = "\n".join(lowered)
+        dir_lower = [d.lower() for d in dir_paths]
+        with self.lock:
+            self.dir_paths, self.dir_lower, self.dir_first = dir_paths, dir_lower, dir_first
+            self.names, self.parents, self.blob, self.starts = names, parents, blob, starts
+            self.added = {}
+            self.removed = set()
+            self.pending_since = None
+            self.building = False
+
+    def _load(self):
+        try:
+            with gzip.open(self.persist_path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("root") != self.root:
+            return False
+        self.dirs = {d: [m, set(files), set(subdirs)] for d, (m, files, subdirs) in data["dirs"].items()}
+        return bool(self.dirs)
+
+    def _save(self):
+        with self.lock:
+            data = {"root": self.root, "dirs": {d: [m, list(f), list(s)] for d, (m, f, s) in self.dirs.items()}}
+        os.makedirs(os.path.dirname(self.persist_path), exist_ok=True)
+        tmp = self.persist_path + ".tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=1) as f:
+            json.dump(data, f)
+        os.replace(tmp, self.persist_path)
+        self.saved = True
+        self.last_save = time.monotonic()
+
+    def _try_save(self):
+        try:
+            self._save()
+        except OSError:
+            self.last_save = time.monotonic()  # retried after SAVE_INTERVAL
+
+    def _run(self):
+        try:
+            self.inotify = Inotify()
+        except (OSError, AttributeError):
+            self.inotify = None  # not Linux: mtime sweeps only
+        if self.persist_path and self._load():
+            # Searchable right away; then catch up with what changed while down
+            self._rebuild()
+            self.ready = True
+            for rel in list(self.dirs):
+                self._watch(rel)
+            self._sweep()
+        else:
+            self._crawl("")
+            self._rebuild()
+            self.ready = True
+            if self.persist_path:
+                self._try_save()
+        last_sweep = time.monotonic()
+        while True:
+            self._wait_events()
+            now = time.monotonic()
+            if self.dirty and now - self.dirty_since >= EVENT_DELAY:
+                dirty, self.dirty, self.dirty_since = self.dirty, set(), None
+                for rel in dirty:
+                    if rel in self.dirs:
+                        for sub in self._update_dir(rel):
+                            self._crawl(sub)
+                self.saved = False
+            if now - last_sweep >= RESCAN_INTERVAL and (self.inotify is None or self.watch_full):
+                self._sweep(unwatched_only=self.inotify is not None)
+                last_sweep = now
+            if self.pending_since is not None and (
+                    len(self.added) + len(self.removed) > REBUILD_PENDING or now - self.pending_since > REBUILD_AGE):
+                self._rebuild()
+            if self.persist_path and not self.saved and now - self.last_save > SAVE_INTERVAL:
+                self._try_save()
+
+    def _wait_events(self):
+        if self.inotify is None:
+            time.sleep(1.0)
+            return
+        ready, _, _ = select.select([self.inotify.fd], [], [], EVENT_DELAY)
+        if not ready:
+            return
+        for wd, mask in self.inotify.read():
+            if mask & IN_Q_OVERFLOW:
+                self.dirty.update(self.dirs)  # events were lost: re-check everything
+            elif wd in self.watches:
+                self.dirty.add(self.watches[wd])
+        if self.dirty and self.dirty_since is None:
+            self.dirty_since = time.monotonic()
+
+    # Queries (request threads)
+    def search(self, q, mode="substring", limit=100, scope=""):
+        """Ranked matches of `q` under `scope` (a relative directory, "" for
+        everything). Returns (paths, total, truncated)."""
+        q = q.strip().lower()
+        if mode == "fuzzy":
+            q = q.replace(" ", "")
+        if not q:
+            return [], 0, False
+        head, sep, tail = q.rpartition("/")
+        if mode == "glob":
+            if "**" in tail:
+                head, sep, tail = q, "/", "*"  # "src/**": everything below src
+            rx = glob_regex(tail)
+            literal = glob_literal(tail)
+            anchored = tail.startswith(literal) and literal != ""
+            name_ok = rx.fullmatch if tail else None
+            dir_ok = glob_regex(head).fullmatch if sep else None
+        elif mode == "fuzzy":
+            rx = fuzzy_regex(tail) if tail else None
+            literal = anchored = None
+            name_ok = rx.search if tail else None
+            dir_ok = fuzzy_regex(head).search if head else None
+        else:
+            rx = None
+            literal, anchored = tail, bool(sep)
+            name_ok = (lambda n: n.startswith(tail)) if sep else (lambda n: tail in n)
+            dir_ok = (lambda d: d.endswith(head)) if sep else None
+        scope = scope.strip("/").lower()
+        scope_prefix = scope + "/"
+        in_scope = (lambda d: d == scope or d.startswith(scope_prefix)) if scope else None
+
+        with self.lock:
+            names, parents, dir_paths, dir_first = self.names, self.parents, self.dir_paths, self.dir_first
+            dirs = None
+            if dir_ok or in_scope:
+                dirs = [i for i, d in enumerate(self.dir_lower)
+                        if (in_scope is None or in_scope(d)) and (dir_ok is None or dir_ok(d))]
+            if dirs is not None and sum(dir_first[i + 1] - dir_first[i] for i in dirs) <= DIR_SCAN_MAX:
+                # Few enough entries to check one by one
+                found = (j for i in dirs for j in range(dir_first[i], dir_first[i + 1])
+                         if name_ok is None or name_ok(names[j].lower()))
+            else:
+                found = self._scan_blob(literal, anchored, rx)
+                if mode == "glob" and name_ok is not None:
+                    found = (j for j in found if name_ok(names[j].lower()))  # the literal only narrows it down
+                if dirs is not None:
+                    wanted = set(dirs)
+                    found = (j for j in found if parents[j] in wanted)
+            candidates = []
+            truncated = False
+            for j in found:
+                d = dir_paths[parents[j]]
+                path = d + "/" + names[j] if d else names[j]
+                if self.removed and path in self.removed:
+                    continue
+                candidates.append(path)
+                if len(candidates) >= MAX_CANDIDATES:
+                    truncated = True
+                    break
+            for path in self.added:
+                d, _, name = path.lower().rpartition("/")
+                if ((in_scope is None or in_scope(d)) and (dir_ok is None or dir_ok(d))
+                        and (name_ok is None or name_ok(name))):
+                    candidates.append(path)
+        key = tail if mode != "glob" else None
+        ranked = heapq.nsmallest(limit, ((-self._score(p, key, mode), len(p), p) for p in candidates))
+        return [p for _, _, p in ranked], len(candidates), truncated
+
+    def _scan_blob(self, literal, anchored, rx):
+        """Indexes of the names containing `literal` (at their start when
+        `anchored`), or matching `rx`, in blob order."""
+        blob, starts = self.blob, self.starts
+        if rx is None and not literal:
+            yield from range(len(starts))
+            return
+        if rx is not None and literal is None:
+            last = -1
+            for m in rx.finditer(blob):
+                j = bisect_right(starts, m.start()) - 1
+                if j != last:
+                    yield j
+                    last = j
+            return
+        if anchored:
+            if blob.startswith(literal):
+                yield 0
+            needle = "\n" + literal
+            pos = blob.find(needle)
+            while pos != -1:
+                yield bisect_right(starts, pos + 1) - 1
+                pos = blob.find(needle, pos + 1)
+            return
+        pos = blob.find(literal)
+        while pos != -1:
+            j = bisect_right(starts, pos) - 1
+            yield j
+            if j + 1 >= len(starts):
+                return
+            pos = blob.find(literal, starts[j + 1])
+
+    @staticmethod
+    def _score(path, q, mode):
+        low = path.lower()
+        name = low.rsplit("/", 1)[-1]
+        if not q:
+            return 50 - low.count("/")  # globs, and "dir/" listings: shallow first
+        if mode == "fuzzy":
+            s = fuzzy_score(name, q)
+            return s if s is not None else 0
+        if name == q:
+            return 100
+        if name.startswith(q):
+            return 80
+        return 60
+
+    def stats(self):
+        with self.lock:
+            return {
+                "ready": self.ready,
+                "dirs": len(self.dirs),
+                "paths": len(self.names) + len(self.added) - len(self.removed),
+                "inotify": self.inotify is not None,
+                "watches": len(self.dir_watches),
+                "watch_full": self.watch_full,
+            }
+
+def get_search_index(app):
+    global _INDEX
+    if _INDEX is None:
+        with _INDEX_LOCK:
+            if _INDEX is None:
+                cfg = app.config
+                _INDEX = SearchIndex(
+                    cfg["BASE_DIR"],
+                    exclude=[cfg["DATA_DIR"]],
+                    persist_path=os.path.join(cfg["DATA_DIR"], "search-index.json.gz") if cfg.get("SEARCH_PERSIST") else None,
+                )
+                _INDEX.start()
+    return _INDEX
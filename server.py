@@ -0,0 +1,80 @@
+import os
+import sys
+from scheduler import get_scheduler
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # not available on Windows
+    BaseApplication = None
+
+try:
+    import waitress
+except ImportError:
+    waitress = None
+
+def ensure_cert(data_dir):
+    """(cert, key) paths for HTTPS. RSC_TLS_CERT/RSC_TLS_KEY point at a real
+    certificate; otherwise a self-signed one is generated once into
+    DATA_DIR/tls and reused, so browsers keep their security exception
+    across restarts."""
+    cert = os.environ.get("RSC_TLS_CERT")
+    key = os.environ.get("RSC_TLS_KEY")
+    if cert and key:
+        return cert, key
+    base = os.path.join(data_dir, "tls", "server")
+    cert, key = base + ".crt", base + ".key"
+    if not (os.path.isfile(cert) and os.path.isfile(key)):
+        from werkzeug.serving import make_ssl_devcert
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        make_ssl_devcert(base, host="localhost")
+        os.chmod(key, 0o600)
+    return cert, key
+
+def start_background(app):
+    """Background jobs that must run without anyone opening a page."""
+    if os.environ.get("RSC_SCHEDULER", "1") == "1":
+        get_scheduler(app, start=True)
+
+if BaseApplication is not None:
+    class GunicornApp(BaseApplication):
+        def __init__(self, app, options):
+            self.application = app
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+def serve(app, host, port, workers=1, threads=16, cert=None):
+    """Production server: gunicorn with threaded workers where available,
+    else waitress (plain HTTP only), else Werkzeug's threaded server without
+    debugger or reloader. Long-lived requests (SSE, WebSockets, downloads)
+    each hold a thread, so `threads` bounds them per worker."""
+    if BaseApplication is not None:
+        options = {
+            "bind": f"{host}:{port}",
+            "workers": workers,
+            "worker_class": "gthread",
+            "threads": threads,
+            "timeout": 120,
+            "graceful_timeout": 10,
+            # Each worker forks from the master, so background threads start there
+            "post_worker_init": lambda worker: start_background(app),
+        }
+        if cert:
+            options["certfile"], options["keyfile"] = cert
+        GunicornApp(app, options).run()
+        return
+    if workers > 1:
+        print(" * gunicorn not available: serving from a single process", file=sys.stderr)
+    start_background(app)
+    if waitress is not None and not cert:
+        # No WebSocket support here: the PTY terminal is unavailable
+        waitress.serve(app, host=host, port=port, threads=threads)
+        return
+    from werkzeug.serving import run_simple
+    run_simple(host, port, app, threaded=True, ssl_context=cert)
@@ -0,0 +1,221 @@
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+SWEEP_INTERVAL = 60
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session data kept on the server; the cookie carries only `sid`."""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.accessed = False
+        self.regenerated = None  # old sid to drop after regenerate()
+
+    def regenerate(self):
+        """Issue a fresh ID (e.g. on login) so a pre-login ID can't be reused."""
+        if self.regenerated is None:
+            self.regenerated = self.sid
+        self.sid = new_sid()
+        self.modified = True
+
+def new_sid():
+    return secrets.token_urlsafe(32)
+
+class MemorySessionStore:
+    """Sessions in a dict with an idle TTL; expired entries are swept lazily.
+    Only valid with a single server process."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.data = {}  # sid -> (expires, blob)
+        self.lock = threading.Lock()
+        self.last_sweep = time.monotonic()
+
+    def load(self, sid):
+        now = time.time()
+        with self.lock:
+            self._sweep(now)
+            item = self.data.get(sid)
+            if item is None or item[0] < now:
+                return None
+            # Sliding expiry
+            self.data[sid] = (now + self.ttl, item[1])
+            return item[1]
+
+    def save(self, sid, blob):
+        with self.lock:
+            self.data[sid] = (time.time() + self.ttl, blob)
+
+    def touch(self, sid):
+        pass  # load() already slides the expiry
+
+    def delete(self, sid):
+        with self.lock:
+            self.data.pop(sid, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def _sweep(self, now):
+        if time.monotonic() - self.last_sweep < SWEEP_INTERVAL:
+            return
+        self.last_sweep = time.monotonic()
+        for sid in [s for s, (exp, _) in self.data.items() if exp < now]:
+            del self.data[sid]
+
+class SqliteSessionStore:
+    """Sessions in a SQLite file, shared by every worker process on the host."""
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self.local = threading.local()
+        self.last_sweep = 0.0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Not kept: a connection opened here would be inherited by forked workers
+        db = sqlite3.connect(path, timeout=10)
+        db.execute("CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, data TEXT, expires REAL)")
+        db.commit()
+        db.close()
+
+    def _db(self):
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db = db
+        return db
+
+    def load(self, sid):
+        now = time.time()
+        db = self._db()
+        if now - self.last_sweep > SWEEP_INTERVAL:
+            self.last_sweep = now
+            db.execute("DELETE FROM sessions WHERE expires < ?", (now,))
+            db.commit()
+        row = db.execute("SELECT data, expires FROM sessions WHERE sid = ?", (sid,)).fetchone()
+        if row is None or row[1] < now:
+            return None
+        # Only write the sliding expiry back once half the TTL has passed
+        if row[1] - now < self.ttl / 2:
+            self.touch(sid)
+        return row[0]
+
+    def save(self, sid, blob):
+        db = self._db()
+        db.execute("INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)", (sid, blob, time.time() + self.ttl))
+        db.commit()
+
+    def touch(self, sid):
+        db = self._db()
+        db.execute("UPDATE sessions SET expires = ? WHERE sid = ?", (time.time() + self.ttl, sid))
+        db.commit()
+
+    def delete(self, sid):
+        db = self._db()
+        db.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+        db.commit()
+
+    def clear(self):
+        db = self._db()
+        db.execute("DELETE FROM sessions")
+        db.commit()
+
+class ServerSessionInterface(SessionInterface):
+    """Flask session interface backed by a session store. Requests that don't
+    change the session (the 1 s metric polls, for example) cost one lookup and
+    send no Set-Cookie header."""
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            blob = self.store.load(sid)
+            if blob is not None:
+                try:
+                    return ServerSession(self.serializer.loads(blob), sid=sid)
+                except Exception:
+                    pass
+        return ServerSession(sid=new_sid(), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.regenerated:
+            self.store.delete(session.regenerated)
+        if not session:
+            if not session.new:
+                # Emptied (logout): revoke server-side and drop the cookie
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if session.accessed:
+            response.vary.add("Cookie")
+        if not (session.modified or session.new):
+            return
+        self.store.save(session.sid, self.serializer.dumps(dict(session)))
+        if session.new or session.regenerated:
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+def load_secret_key(data_dir):
+    """FLASK_SECRET_KEY, or a random key generated once and kept in DATA_DIR."""
+    key = os.environ.get("FLASK_SECRET_KEY")
+    if key:
+        return key
+    path = os.path.join(data_dir, "secret_key")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            key = f.read().strip()
+        if key:
+            return key
+    except OSError:
+        pass
+    key = secrets.token_hex(32)
+    os.makedirs(data_dir, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(key)
+    return key
+
+def init_sessions(app):
+    """Install the session backend named by SESSION_BACKEND: "memory",
+    "sqlite" or "cookie" (Flask's signed-cookie default). In-memory sessions
+    would be private to one worker, so several workers always use SQLite."""
+    backend = app.config.get("SESSION_BACKEND", "memory")
+    if backend == "memory" and app.config.get("WORKERS", 1) > 1:
+        backend = "sqlite"
+    ttl = app.config.get("SESSION_TTL", 86400)
+    if backend == "memory":
+        app.session_interface = ServerSessionInterface(MemorySessionStore(ttl))
+    elif backend == "sqlite":
+        path = os.path.join(app.config["DATA_DIR"], "sessions.db")
+        app.session_interface = ServerSessionInterface(SqliteSessionStore(path, ttl))
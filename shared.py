@@ -0,0 +1,107 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+_PRIMARY = None
+_PRIMARY_LOCK = threading.Lock()
+
+class FileLock:
+    """Advisory lock on a file, shared between processes on this host. The OS
+    drops it when the holder exits, so a crashed worker never leaves it
+    stuck. Not reentrant across threads of one process; callers that need
+    that combine it with a threading.Lock."""
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def _open(self):
+        if self.fd is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    def acquire(self, blocking=True):
+        self._open()
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            else:
+                mode = msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK
+                os.lseek(self.fd, 0, os.SEEK_SET)
+                msvcrt.locking(self.fd, mode, 1)
+        except OSError:
+            if blocking:
+                raise
+            return False
+        return True
+
+    def release(self):
+        if self.fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self.fd, 0, os.SEEK_SET)
+                msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+        except OSError:
+            pass
+        os.close(self.fd)
+        self.fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class FileSemaphore:
+    """At most `n` holders across all processes: one lock file per slot."""
+
+    def __init__(self, directory, name, n):
+        self.directory = directory
+        self.name = name
+        self.n = n
+
+    def try_acquire(self):
+        """A held FileLock (release it when done), or None if all slots are taken."""
+        for i in range(self.n):
+            lock = FileLock(os.path.join(self.directory, f"{self.name}.{i}.lock"))
+            if lock.acquire(blocking=False):
+                return lock
+            lock.release()
+        return None
+
+class PrimaryLock:
+    """Elects one worker process to run host-wide background jobs (the
+    scheduler timer, metric store writes). Others keep retrying, so a
+    replacement takes over when the primary dies."""
+
+    def __init__(self, path):
+        self.lock = FileLock(path)
+        self.held = False
+        self.mutex = threading.Lock()
+
+    def check(self):
+        with self.mutex:
+            if not self.held:
+                self.held = self.lock.acquire(blocking=False)
+                if not self.held:
+                    self.lock.release()
+            return self.held
+
+def get_primary_lock(app):
+    """Call while `app` is at hand: background threads use lock.check, which
+    needs no application context."""
+    global _PRIMARY
+    if _PRIMARY is None:
+        with _PRIMARY_LOCK:
+            if _PRIMARY is None:
+                _PRIMARY = PrimaryLock(os.path.join(app.config["DATA_DIR"], "locks", "primary.lock"))
+    return _PRIMARY
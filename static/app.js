@@ -73,16 +73,6 @@
   if (prevThemeBtn) prevThemeBtn.addEventListener('click', (e) => { e.preventDefault(); e.stopPropagation(); cycleTheme(-1) })
   if (nextThemeBtn) nextThemeBtn.addEventListener('click', (e) => { e.preventDefault(); e.stopPropagation(); cycleTheme(1) })
 
-  const filter = document.getElementById('filesFilter')
-  if (filter) {
-    filter.addEventListener('input', () => {
-      const val = filter.value.toLowerCase()
-      document.querySelectorAll('#filesTable tbody tr').forEach(tr => {
-        const name = tr.getAttribute('data-name') || ''
-        tr.style.display = name.includes(val) ? '' : 'none'
-      })
-    })
-  }
   const copyBtn = document.getElementById('copyBtn')
   const codeText = document.getElementById('codeText')
   if (copyBtn && codeText) {
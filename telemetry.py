@@ -0,0 +1,153 @@
+import math
+import threading
+
+def _fmt_value(v):
+    if v is None:
+        return "NaN"
+    if isinstance(v, float):
+        if math.isinf(v):
+            return "+Inf" if v > 0 else "-Inf"
+        if math.isnan(v):
+            return "NaN"
+        return repr(v)
+    return str(v)
+
+def _fmt_labels(names, values):
+    if not names:
+        return ""
+    parts = []
+    for n, v in zip(names, values):
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{n}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            items = sorted(self.values.items())
+        if not items and not self.labels:
+            items = [((), 0)]
+        for key, value in items:
+            lines.append(f"{self.name}{_fmt_labels(self.labels, key)} {_fmt_value(value)}")
+        return lines
+
+class Histogram:
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            row = self.values.get(label_values)
+            if row is None:
+                row = [0] * (len(self.buckets) + 1) + [0.0]
+                self.values[label_values] = row
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    row[i] += 1
+                    break
+            else:
+                row[len(self.buckets)] += 1
+            row[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = sorted((k, list(v)) for k, v in self.values.items())
+        names = self.labels + ("le",)
+        for key, row in items:
+            cumulative = 0
+            for i, b in enumerate(self.buckets):
+                cumulative += row[i]
+                lines.append(f"{self.name}_bucket{_fmt_labels(names, key + (_fmt_value(float(b)),))} {cumulative}")
+            cumulative += row[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{_fmt_labels(names, key + ('+Inf',))} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {_fmt_value(row[-1])}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {cumulative}")
+        return lines
+
+def gauge(name, help_text, samples, labels=()):
+    """Render a gauge from an iterable of (label values, value)."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for key, value in samples:
+        lines.append(f"{name}{_fmt_labels(labels, key)} {_fmt_value(value)}")
+    return lines
+
+# Internal RSC counters
+REQUEST_LATENCY = Histogram("rsc_http_request_duration_seconds", "Time spent handling HTTP requests.", ("endpoint", "method"))
+TERMINAL_COMMANDS = Counter("rsc_terminal_commands_total", "Commands executed from the web terminal.", ("status",))
+FAILED_LOGINS = Counter("rsc_failed_logins_total", "Rejected login attempts.")
+SCRIPT_RUNS = Counter("rsc_script_runs_total", "Scripts started from the Scripts page.")
+
+def host_metrics(snap):
+    """Prometheus lines for a sampler snapshot."""
+    out = []
+    out += gauge("rsc_cpu_percent", "Host CPU utilisation.", [((), snap.get("cpu_percent"))])
+    out += gauge("rsc_cpu_frequency_mhz", "Current CPU frequency.", [((), snap.get("cpu_freq_cur"))])
+    out += gauge("rsc_memory_bytes", "Host memory.", [
+        (("total",), snap.get("mem_total")),
+        (("used",), snap.get("mem_used")),
+        (("available",), snap.get("mem_available")),
+    ], ("state",))
+    out += gauge("rsc_disk_bytes", "Space on mounted filesystems.", [
+        (("total",), snap.get("disk_total")),
+        (("used",), snap.get("disk_used")),
+    ], ("state",))
+    out += [
+        "# HELP rsc_network_bytes_total Bytes transferred over all interfaces.",
+        "# TYPE rsc_network_bytes_total counter",
+        f'rsc_network_bytes_total{{direction="sent"}} {_fmt_value(snap.get("net_bytes_sent"))}',
+        f'rsc_network_bytes_total{{direction="recv"}} {_fmt_value(snap.get("net_bytes_recv"))}',
+        "# HELP rsc_disk_io_bytes_total Bytes read from and written to disks.",
+        "# TYPE rsc_disk_io_bytes_total counter",
+        f'rsc_disk_io_bytes_total{{direction="read"}} {_fmt_value(snap.get("disk_read_bytes"))}',
+        f'rsc_disk_io_bytes_total{{direction="write"}} {_fmt_value(snap.get("disk_write_bytes"))}',
+    ]
+    nic_rates = snap.get("net_rates") or {}
+    out += gauge("rsc_network_interface_bytes_per_second", "Per-interface throughput over the last sample interval.", [
+        ((nic, d), r.get("bytes_" + d)) for nic, r in sorted(nic_rates.items()) for d in ("sent", "recv")
+    ], ("interface", "direction"))
+    disk_rates = snap.get("disk_rates") or {}
+    out += gauge("rsc_disk_device_bytes_per_second", "Per-disk throughput over the last sample interval.", [
+        ((dev, d), r.get(d + "_bytes")) for dev, r in sorted(disk_rates.items()) for d in ("read", "write")
+    ], ("device", "direction"))
+    out += gauge("rsc_disk_device_iops", "Per-disk operations per second over the last sample interval.", [
+        ((dev, d), r.get(d + "_iops")) for dev, r in sorted(disk_rates.items()) for d in ("read", "write")
+    ], ("device", "direction"))
+    gpus = snap.get("gpus") or []
+    if gpus:
+        out += gauge("rsc_gpu_utilization_percent", "GPU utilisation.", [
+            ((str(g.get("index")), g.get("name") or ""), g.get("util_percent")) for g in gpus
+        ], ("index", "name"))
+        out += gauge("rsc_gpu_memory_used_bytes", "GPU memory in use.", [
+            ((str(g.get("index")), g.get("name") or ""), g.get("mem_used")) for g in gpus
+        ], ("index", "name"))
+    out += gauge("rsc_sample_timestamp_seconds", "When the served host snapshot was taken.", [((), snap.get("ts"))])
+    return out
+
+def render(snap, extra=()):
+    lines = host_metrics(snap)
+    for metric in (REQUEST_LATENCY, TERMINAL_COMMANDS, FAILED_LOGINS, SCRIPT_RUNS):
+        lines += metric.render()
+    for block in extra:
+        lines += block
+    return "\n".join(lines) + "\n"
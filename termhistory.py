@@ -0,0 +1,148 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+MAX_ENTRY_OUTPUT = 256 * 1024  # chars of output kept per command
+CMD_HISTORY = 20  # recent distinct commands offered on arrow-up
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+def entry_size(entry):
+    return len(entry["output"]) + len(entry["cmd"]) + len(entry["cwd"]) + 64
+
+class TerminalHistory:
+    """Terminal output history keyed by an opaque terminal session ID (the
+    only thing the cookie carries). Recent sessions live in an in-memory LRU
+    bounded by `budget` bytes; whole sessions are evicted least recently used
+    first. With `db_path` every entry is also written to SQLite, so evicted
+    or pre-restart history is loaded back on demand."""
+
+    def __init__(self, budget=32 * 1024 * 1024, db_path=None, max_entries=1000):
+        self.budget = budget
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()  # sid -> {"entries": [...], "seq": int, "size": int, "commands": [...]}
+        self.size = 0
+        self.db = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS term_history ("
+                " sid TEXT NOT NULL, seq INTEGER NOT NULL, ts REAL, cmd TEXT, cwd TEXT,"
+                " code INTEGER, output TEXT, PRIMARY KEY (sid, seq))"
+            )
+            self.db.commit()
+
+    def _load(self, sid):
+        """Cached history of `sid`, loading it from SQLite on a miss. Lock held."""
+        hist = self.cache.get(sid)
+        if hist is not None:
+            self.cache.move_to_end(sid)
+            return hist
+        entries = []
+        if self.db is not None:
+            rows = self.db.execute(
+                "SELECT seq, ts, cmd, cwd, code, output FROM term_history WHERE sid = ? ORDER BY seq DESC LIMIT ?",
+                (sid, self.max_entries),
+            ).fetchall()
+            entries = [{"seq": r[0], "ts": r[1], "cmd": r[2], "cwd": r[3], "code": r[4], "output": r[5]}
+                       for r in reversed(rows)]
+        hist = {"entries": entries, "seq": entries[-1]["seq"] if entries else 0,
+                "size": sum(entry_size(e) for e in entries), "commands": []}
+        for e in entries:
+            self._remember(hist, e["cmd"])
+        self.cache[sid] = hist
+        self.size += hist["size"]
+        return hist
+
+    @staticmethod
+    def _remember(hist, cmd):
+        cmds = hist["commands"]
+        if cmd in cmds:
+            cmds.remove(cmd)
+        cmds.append(cmd)
+        del cmds[:-CMD_HISTORY]
+
+    def _evict(self, keep):
+        while self.size > self.budget and len(self.cache) > 1:
+            sid, hist = next(iter(self.cache.items()))
+            if sid == keep:
+                break
+            del self.cache[sid]
+            self.size -= hist["size"]
+        # A single session over budget drops its oldest entries
+        hist = self.cache.get(keep)
+        while hist and self.size > self.budget and len(hist["entries"]) > 1:
+            old = hist["entries"].pop(0)
+            hist["size"] -= entry_size(old)
+            self.size -= entry_size(old)
+
+    def append(self, sid, cmd, output, cwd, code):
+        if len(output) > MAX_ENTRY_OUTPUT:
+            output = "[...]\n" + output[-MAX_ENTRY_OUTPUT:]
+        with self.lock:
+            hist = self._load(sid)
+            hist["seq"] += 1
+            entry = {"seq": hist["seq"], "ts": time.time(), "cmd": cmd, "cwd": cwd, "code": code, "output": output}
+            hist["entries"].append(entry)
+            self._remember(hist, cmd)
+            hist["size"] += entry_size(entry)
+            self.size += entry_size(entry)
+            if len(hist["entries"]) > self.max_entries:
+                old = hist["entries"].pop(0)
+                hist["size"] -= entry_size(old)
+                self.size -= entry_size(old)
+            self._evict(sid)
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO term_history (sid, seq, ts, cmd, cwd, code, output) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (sid, entry["seq"], entry["ts"], cmd, cwd, code, output),
+                )
+                self.db.execute("DELETE FROM term_history WHERE sid = ? AND seq <= ?", (sid, entry["seq"] - self.max_entries))
+                self.db.commit()
+        return entry
+
+    def page(self, sid, before=None, limit=20):
+        """Up to `limit` entries older than seq `before` (oldest first) and
+        the cursor for the next older page, or None at the start."""
+        with self.lock:
+            entries = self._load(sid)["entries"]
+            if before is not None:
+                entries = [e for e in entries if e["seq"] < before]
+            page = entries[-limit:] if limit else []
+            more = len(entries) > len(page)
+        return [dict(e) for e in page], (page[0]["seq"] if more and page else None)
+
+    def commands(self, sid):
+        """Recent distinct commands, oldest first."""
+        with self.lock:
+            return list(self._load(sid)["commands"])
+
+    def clear(self, sid, keep_commands=False):
+        """Drop the output history; with `keep_commands` arrow-up recall
+        survives (until the history is next loaded from disk)."""
+        with self.lock:
+            hist = self.cache.pop(sid, None)
+            if hist is not None:
+                self.size -= hist["size"]
+                if keep_commands:
+                    self.cache[sid] = {"entries": [], "seq": hist["seq"], "size": 0, "commands": hist["commands"]}
+            if self.db is not None:
+                self.db.execute("DELETE FROM term_history WHERE sid = ?", (sid,))
+                self.db.commit()
+
+def get_history_store(app):
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = TerminalHistory(
+                    budget=app.config.get("TERM_HISTORY_BUDGET", 32 * 1024 * 1024),
+                    db_path=app.config.get("TERM_HISTORY_DB"),
+                )
+    return _STORE
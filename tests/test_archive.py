@@ -0,0 +1,139 @@
+import gzip
+import io
+import os
+import struct
+import tarfile
+import zipfile
+import zlib
+
+import pytest
+
+import archive
+from archive import BLOCK, _zip_central, deflate_block, incompressible, iter_files, stream_files, write_tar_gz, write_zip
+
+def _text(n):
+    return "".join(f"line {i} of some text\n" for i in range(n)).encode()
+
+@pytest.fixture
+def mixed(tmp_path):
+    (tmp_path / "a.txt").write_bytes(_text(40000))
+    (tmp_path / "b.jpg").write_bytes(os.urandom(200_000))
+    (tmp_path / "c.txt").write_bytes(_text(30000))
+    return [(str(tmp_path / n), n) for n in ("a.txt", "b.jpg", "c.txt")]
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_tar_gz_level_follows_each_file(mixed, threads):
+    # Text is deflated and the jpg stored, whichever block their bytes share
+    zip_size = len(b"".join(stream_files(mixed, "zip", "normal", threads)))
+    data = b"".join(stream_files(mixed, "tar.gz", "normal", threads))
+    assert len(data) < zip_size * 1.05
+    with tarfile.open(fileobj=io.BytesIO(gzip.decompress(data))) as tf:
+        for path, name in mixed:
+            with open(path, "rb") as f:
+                assert tf.extractfile(name).read() == f.read()
+
+class Sink(io.BytesIO):
+    """Write-only stand-in for QueueSink."""
+
+def _zip(files, level=6, threads=1):
+    out = Sink()
+    write_zip(out, files, level, threads)
+    return out.getvalue()
+
+def test_deflate_blocks_concatenate_into_one_stream():
+    data = _text(200000)
+    blocks = [data[i:i + BLOCK] for i in range(0, len(data), BLOCK)]
+    assert len(blocks) > 2
+    stream = b"".join(
+        deflate_block(b, 6, blocks[i - 1][-archive.WINDOW:] if i else b"", i == len(blocks) - 1)
+        for i, b in enumerate(blocks))
+    assert zlib.decompress(stream, -15) == data
+
+@pytest.mark.parametrize("threads", [1, 3])
+def test_zip_with_data_descriptors_round_trips(tmp_path, threads):
+    big = tmp_path / "big.txt"
+    big.write_bytes(_text(150000))  # several deflate blocks
+    media = tmp_path / "photo.jpg"
+    media.write_bytes(os.urandom(5000))
+    empty = tmp_path / "empty.txt"
+    empty.write_bytes(b"")
+    files = [(str(p), "dir/" + p.name) for p in (big, media, empty)]
+    with zipfile.ZipFile(io.BytesIO(_zip(files, threads=threads))) as zf:
+        assert zf.testzip() is None
+        infos = {i.filename: i for i in zf.infolist()}
+        assert infos["dir/big.txt"].compress_type == zipfile.ZIP_DEFLATED
+        assert infos["dir/photo.jpg"].compress_type == zipfile.ZIP_STORED
+        assert all(i.flag_bits & 0x08 for i in infos.values())  # sizes follow the data
+        for path, name in files:
+            with open(path, "rb") as f:
+                assert zf.read(name) == f.read()
+
+def test_zip_store_level(tmp_path):
+    p = tmp_path / "a.txt"
+    p.write_bytes(_text(1000))
+    with zipfile.ZipFile(io.BytesIO(_zip([(str(p), "a.txt")], level=0))) as zf:
+        assert zf.infolist()[0].compress_type == zipfile.ZIP_STORED
+        assert zf.read("a.txt") == p.read_bytes()
+
+def test_zip64_local_headers_still_readable(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ZIP64_FILE", 10)
+    p = tmp_path / "a.txt"
+    p.write_bytes(_text(1000))
+    data = _zip([(str(p), "a.txt")])
+    assert struct.unpack_from("<H", data, 4)[0] == 45  # version needed: ZIP64
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.read("a.txt") == p.read_bytes()
+
+def _entries(n, **over):
+    e = {"name": b"f", "method": 0, "zip64": False, "mode": 0o100644, "dos": (0, 33),
+         "crc": 0, "size": 0, "csize": 0, "offset": 0}
+    e.update(over)
+    return [dict(e, name=b"f%d" % i) for i in range(n)]
+
+def test_zip64_end_records_for_many_entries():
+    data = _zip_central(_entries(70000), 0)
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        names = zf.namelist()
+    assert len(names) == 70000 and names[-1] == "f69999"
+
+def test_zip64_extra_for_large_sizes_and_offsets():
+    big = 5 << 30
+    cd = _zip_central(_entries(1, size=big, csize=big, offset=big), big)
+    assert struct.unpack_from("<I", cd, 0)[0] == 0x02014B50
+    assert struct.unpack_from("<II", cd, 20) == (0xFFFFFFFF, 0xFFFFFFFF)
+    assert struct.unpack_from("<I", cd, 42)[0] == 0xFFFFFFFF
+    extra = cd[46 + 2:46 + 2 + 4 + 24]
+    assert struct.unpack("<HHQQQ", extra) == (1, 24, big, big, big)
+    zip64_end = cd.index(struct.pack("<I", 0x06064B50))
+    assert struct.unpack_from("<Q", cd, zip64_end + 48)[0] == big  # central directory offset
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_tar_gz_is_a_single_valid_gzip_member(tmp_path, threads):
+    p = tmp_path / "a.txt"
+    p.write_bytes(_text(120000))
+    out = Sink()
+    write_tar_gz(out, [(str(p), "a.txt")], 6, threads)
+    data = out.getvalue()
+    d = zlib.decompressobj(16 + 15)
+    raw = d.decompress(data)
+    assert d.eof and d.unused_data == b""  # one member, trailer matches (CRC, ISIZE)
+    with tarfile.open(fileobj=io.BytesIO(raw)) as tf:
+        assert tf.extractfile("a.txt").read() == p.read_bytes()
+
+def test_incompressible_detection(tmp_path):
+    noise = tmp_path / "noise.bin"
+    noise.write_bytes(os.urandom(300_000))
+    text = tmp_path / "text.bin"
+    text.write_bytes(_text(20000))
+    assert incompressible(str(noise), noise.stat().st_size)
+    assert not incompressible(str(text), text.stat().st_size)
+    assert incompressible(str(tmp_path / "x.ZIP"), 0)  # by extension
+
+def test_iter_files_skips_excluded_dirs(tmp_path):
+    (tmp_path / "keep").mkdir()
+    (tmp_path / "keep" / "a").write_text("a")
+    (tmp_path / ".rsc" / "tls").mkdir(parents=True)
+    (tmp_path / ".rsc" / "secret_key").write_text("k")
+    names = [n for _, n in iter_files(str(tmp_path), [str(tmp_path / ".rsc")])]
+    assert names == [tmp_path.name + "/keep/a"]
+    assert list(iter_files(str(tmp_path / ".rsc" / "secret_key"), [str(tmp_path / ".rsc")])) == []
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from backups import BackupStore
+
+def _run(store, target, incremental):
+    summary, files = store.start(str(target), "zip", incremental)
+    names = [arcname for _, arcname in files]
+    store.commit(summary)
+    return summary, names
+
+@pytest.fixture
+def tree(tmp_path):
+    base = tmp_path / "base"
+    (base / "docs").mkdir(parents=True)
+    (base / "docs" / "a.txt").write_text("alpha")
+    (base / "b.txt").write_text("beta")
+    return base
+
+def test_incremental_archives_only_changes(tree):
+    store = BackupStore(str(tree / ".rsc" / "backups"), str(tree.parent))
+    full, names = _run(store, tree, False)
+    assert full["kind"] == "full"
+    assert sorted(n for n in names if not n.startswith(".rsc-backup/")) == ["base/b.txt", "base/docs/a.txt"]
+
+    (tree / "b.txt").write_text("beta, changed")
+    os.utime(tree / "docs" / "a.txt")  # touched, same content
+    inc, names = _run(store, tree, True)
+    assert inc["kind"] == "incremental" and inc["parent"] == full["id"]
+    assert [n for n in names if not n.startswith(".rsc-backup/")] == ["base/b.txt"]
+
+    (tree / "docs" / "a.txt").unlink()
+    inc2, names = _run(store, tree, True)
+    assert inc2["deleted"] == ["base/docs/a.txt"]
+    assert [n for n in names if not n.startswith(".rsc-backup/")] == []
+
+def test_store_inside_target_is_not_archived(tree):
+    # The default DATA_DIR lives under BASE_DIR; earlier manifests must not
+    # show up as changes in every later backup
+    store = BackupStore(str(tree / ".rsc" / "backups"), str(tree.parent))
+    _run(store, tree, False)
+    for _ in range(2):
+        summary, names = _run(store, tree, True)
+        assert summary["archived"] == 0
+        assert all(not n.startswith("base/.rsc") for n in names)
+
+def test_restore_plan_follows_chain(tree):
+    store = BackupStore(str(tree / ".rsc" / "backups"), str(tree.parent))
+    full, _ = _run(store, tree, False)
+    (tree / "b.txt").write_text("beta, changed")
+    (tree / "c.txt").write_text("gamma")
+    inc, _ = _run(store, tree, True)
+    plan = store.plan(inc["id"])
+    assert [s["backup"] for s in plan["steps"]] == [full["id"], inc["id"]]
+    assert plan["steps"][0]["files"] == ["base/docs/a.txt"]
+    assert plan["steps"][1]["files"] == ["base/b.txt", "base/c.txt"]
+    assert plan["missing"] == []
+
+def test_excluded_dirs_are_skipped(tree):
+    (tree / "secret").mkdir()
+    (tree / "secret" / "key").write_text("x")
+    store = BackupStore(str(tree / ".rsc" / "backups"), str(tree.parent), exclude=[str(tree / "secret")])
+    _, names = _run(store, tree, False)
+    assert "base/secret/key" not in names
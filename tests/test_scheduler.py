@@ -0,0 +1,56 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from scheduler import CronExpr, Scheduler, parse_field
+
+def test_parse_field_lists_ranges_steps_names():
+    assert parse_field("1,5-7,*/20", 0, 59) == [0, 1, 5, 6, 7, 20, 40]
+    assert parse_field("5/15", 0, 59) == [5, 20, 35, 50]
+    assert parse_field("jan-mar", 1, 12, {"jan": 1, "feb": 2, "mar": 3}) == [1, 2, 3]
+
+@pytest.mark.parametrize("text", ["60", "*/0", "5-2", "x"])
+def test_parse_field_rejects(text):
+    with pytest.raises(ValueError):
+        parse_field(text, 0, 59)
+
+@pytest.mark.parametrize("expr, after, expected", [
+    ("*/15 * * * *", datetime(2024, 1, 1, 10, 7), datetime(2024, 1, 1, 10, 15)),
+    ("0 9 * * mon-fri", datetime(2024, 1, 5, 9, 0), datetime(2024, 1, 8, 9, 0)),  # Fri -> Mon
+    ("@monthly", datetime(2024, 1, 31, 12, 0), datetime(2024, 2, 1, 0, 0)),
+    ("0 0 29 2 *", datetime(2024, 3, 1), datetime(2028, 2, 29)),
+    ("30 23 31 * *", datetime(2024, 4, 1), datetime(2024, 5, 31, 23, 30)),
+    # Both day fields restricted: either one matches (Vixie cron)
+    ("0 0 13 * 5", datetime(2024, 1, 1), datetime(2024, 1, 5)),
+    ("0 0 * * 7", datetime(2024, 1, 1), datetime(2024, 1, 7)),  # 7 is Sunday
+])
+def test_next_after(expr, after, expected):
+    assert CronExpr(expr).next_after(after) == expected
+
+def test_next_after_is_strictly_later():
+    at = datetime(2024, 1, 1, 10, 15)
+    assert CronExpr("*/15 * * * *").next_after(at) == datetime(2024, 1, 1, 10, 30)
+
+def test_never_firing_expression():
+    with pytest.raises(ValueError):
+        CronExpr("0 0 30 2 *").next_after(datetime(2024, 1, 1))
+
+def test_never_firing_job_is_not_stored(tmp_path):
+    path = tmp_path / "schedules.json"
+    sched = Scheduler(str(path), None, str(tmp_path))
+    with pytest.raises(ValueError):
+        sched.add("job.sh", [], "0 0 30 2 *")
+    sched.add("job.sh", [], "*/5 * * * *")
+    assert [j["cron"] for j in json.loads(path.read_text())] == ["*/5 * * * *"]
+
+def test_load_skips_unschedulable_jobs(tmp_path):
+    path = tmp_path / "schedules.json"
+    sched = Scheduler(str(path), None, str(tmp_path))
+    good = sched.add("job.sh", [], "@hourly")
+    data = json.loads(path.read_text())
+    data.append(dict(data[0], id="bad", cron="0 0 30 2 *"))
+    path.write_text(json.dumps(data))
+    reloaded = Scheduler(str(path), None, str(tmp_path))
+    assert list(reloaded.jobs) == [good["id"]]
+    assert reloaded.jobs[good["id"]]["next_fire"] is not None
@@ -0,0 +1,116 @@
+import os
+import time
+
+import pytest
+
+import searchindex
+from searchindex import SearchIndex, fuzzy_regex, fuzzy_score, glob_literal, glob_regex
+
+@pytest.mark.parametrize("pattern, text, ok", [
+    ("*.py", "setup.py", True),
+    ("*.py", "a/setup.py", False),  # "*" stops at "/"
+    ("src/**", "src/a/b", True),
+    ("src/**", "src", True),
+    ("**/b", "b", True),
+    ("**/b", "x/y/b", True),
+    ("file?.[ch]", "file1.c", True),
+    ("file?.[!ch]", "file1.c", False),
+    ("[abc", "[abc", True),  # unclosed class is literal
+])
+def test_glob_regex(pattern, text, ok):
+    assert bool(glob_regex(pattern).fullmatch(text)) is ok
+
+def test_glob_literal():
+    assert glob_literal("core_12*.py") == "core_12"
+    assert glob_literal("*") == ""
+
+def test_fuzzy():
+    rx = fuzzy_regex("cfg")
+    assert rx.search("config.py") and not rx.search("c\nfg")
+    assert fuzzy_regex("a]^-\\").search("xa]y^-\\")
+    assert fuzzy_score("config.py", "cfg") is not None
+    assert fuzzy_score("config.py", "gfc") is None
+    # consecutive and word-start matches score higher
+    assert fuzzy_score("main.py", "main") > fuzzy_score("my_admin.py", "main")
+
+@pytest.fixture
+def tree(tmp_path):
+    for rel in ["src/app/models/User.py", "src/app/views.py", "src/data.json",
+                "docs/README.md", "setup.py", ".rsc/secret_key"]:
+        p = tmp_path / rel
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text("")
+    return tmp_path
+
+def _index(root, **kw):
+    idx = SearchIndex(str(root), exclude=[str(root / ".rsc")], **kw)
+    idx._crawl("")
+    idx._rebuild()
+    return idx
+
+def S(idx, q, mode="substring", scope=""):
+    return idx.search(q, mode, 50, scope)[0]
+
+def test_substring_ranks_names(tree):
+    idx = _index(tree)
+    assert S(idx, "setup.py") == ["setup.py"]
+    assert S(idx, ".py")[0] == "setup.py"  # shallow paths first among equals
+    assert S(idx, "user") == ["src/app/models/User.py"]
+    assert S(idx, "secret") == []  # DATA_DIR isn't indexed
+
+def test_path_queries(tree):
+    idx = _index(tree)
+    assert S(idx, "app/m") == ["src/app/models"]
+    assert sorted(S(idx, "app/")) == ["src/app/models", "src/app/views.py"]
+    assert S(idx, ".py", scope="src/app") == ["src/app/views.py", "src/app/models/User.py"]
+
+def test_glob_and_fuzzy(tree):
+    idx = _index(tree)
+    assert sorted(S(idx, "*.py", "glob")) == ["setup.py", "src/app/models/User.py", "src/app/views.py"]
+    assert sorted(S(idx, "src/**/*.py", "glob")) == ["src/app/models/User.py", "src/app/views.py"]
+    assert S(idx, "src/*.json", "glob") == ["src/data.json"]
+    assert S(idx, "usrpy", "fuzzy") == ["src/app/models/User.py"]
+
+def test_changes_between_rebuilds(tree):
+    idx = _index(tree)
+    (tree / "src" / "new_file.txt").write_text("")
+    (tree / "docs" / "README.md").unlink()
+    (tree / "newdir" / "deep").mkdir(parents=True)
+    (tree / "newdir" / "deep" / "inner.txt").write_text("")
+    for rel in ("", "src", "docs"):
+        for sub in idx._update_dir(rel):
+            idx._crawl(sub)
+    assert S(idx, "new_file") == ["src/new_file.txt"]
+    assert S(idx, "inner") == ["newdir/deep/inner.txt"]
+    assert S(idx, "readme") == []
+    idx._rebuild()
+    assert S(idx, "inner") == ["newdir/deep/inner.txt"] and S(idx, "readme") == []
+
+def test_removed_tree_and_sweep(tree):
+    idx = _index(tree)
+    for p in (tree / "src" / "app" / "models").iterdir():
+        p.unlink()
+    (tree / "src" / "app" / "models").rmdir()
+    time.sleep(0.01)
+    os.utime(tree / "src" / "app")
+    idx._sweep()
+    assert S(idx, "user") == [] and S(idx, "models") == []
+    assert "src/app/models" not in idx.dirs
+
+def test_persisted_index_catches_up(tree, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("state") / "index.json.gz")
+    idx = _index(tree, persist_path=path)
+    idx._save()
+    (tree / "while_down.txt").write_text("")
+    again = SearchIndex(str(tree), exclude=[str(tree / ".rsc")], persist_path=path)
+    assert again._load()
+    again._rebuild()
+    again._sweep()
+    assert S(again, "down") == ["while_down.txt"]
+    assert S(again, "user") == ["src/app/models/User.py"]
+
+def test_truncates_large_result_sets(tree, monkeypatch):
+    monkeypatch.setattr(searchindex, "MAX_CANDIDATES", 2)
+    idx = _index(tree)
+    paths, total, truncated = idx.search("s", "substring", 50)
+    assert truncated and total == 2 and len(paths) == 2
@@ -0,0 +1,65 @@
+import pytest
+
+import tsdb
+from tsdb import FIELDS, TimeSeriesStore
+
+TIERS = ((1, 60), (10, 60), (60, 60))  # 1 min, 10 min and 1 h of history
+
+@pytest.fixture
+def store(tmp_path):
+    s = TimeSeriesStore(str(tmp_path), tiers=TIERS)
+    yield s
+    s.close()
+
+def sample(ts, cpu):
+    return dict({f: 0 for f in FIELDS}, ts=ts, cpu_percent=cpu)
+
+@pytest.fixture
+def now(monkeypatch):
+    t = 1_700_000_000.0
+    monkeypatch.setattr(tsdb.time, "time", lambda: t)
+    return t
+
+def test_pick_tier_finest_covering_range(store, now):
+    assert store.pick_tier(now - 30, 1).step == 1
+    assert store.pick_tier(now - 300, 1).step == 10  # older than the 1 s tier keeps
+    assert store.pick_tier(now - 30, 10).step == 10  # coarsest tier still fine enough
+    assert store.pick_tier(now - 1800, 1).step == 60
+    assert store.pick_tier(now - 86400, 1).step == 60  # nothing covers it: longest retention
+
+def test_query_averages_into_steps(store, now):
+    for i in range(20):
+        store.add(sample(now - 20 + i, i))
+    res = store.query(now - 20, now, step=10)
+    assert res["tier"] == 10 and res["step"] == 10
+    assert [p[1] for p in res["points"]] == [4.5, 14.5]  # 0..9 and 10..19
+    fine = store.query(now - 20, now, step=1)
+    assert [p[1] for p in fine["points"]] == list(range(20))
+
+def test_query_caps_points(store, now):
+    for i in range(50):
+        store.add(sample(now - 50 + i, 1))
+    assert len(store.query(now - 50, now, max_points=5)["points"]) <= 6
+
+def test_stale_ring_slots_are_ignored(store, now):
+    store.add(sample(now - 60, 99))  # a lap ago: the slot `now` maps to
+    res = store.query(now - 30, now, step=1)
+    assert res["tier"] == 1 and res["points"] == []
+
+def test_reopen_keeps_data(tmp_path, now):
+    s = TimeSeriesStore(str(tmp_path), tiers=TIERS)
+    s.add(sample(now - 5, 42))
+    s.close()
+    s = TimeSeriesStore(str(tmp_path), tiers=TIERS)
+    assert [p[1] for p in s.query(now - 10, now, step=1)["points"]] == [42]
+    s.close()
+
+def test_reopen_mid_bucket_keeps_mean(tmp_path, now):
+    s = TimeSeriesStore(str(tmp_path), tiers=TIERS)
+    s.add(sample(now - 9, 10))
+    s.add(sample(now - 8, 20))
+    s.close()
+    s = TimeSeriesStore(str(tmp_path), tiers=TIERS)
+    s.add(sample(now - 7, 60))  # same 10 s bucket as before the restart
+    assert [p[1] for p in s.query(now - 10, now, step=10)["points"]] == [30]
+    s.close()
@@ -0,0 +1,168 @@
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+# Metrics kept long-term; everything is stored as float32 means per bucket
+FIELDS = (
+    "cpu_percent",
+    "mem_percent",
+    "disk_percent",
+    "net_sent_rate",
+    "net_recv_rate",
+    "disk_read_rate",
+    "disk_write_rate",
+)
+
+# (bucket seconds, slots): 1s for 1h, 10s for 24h, 1min for 7d, 1h for 1y
+TIERS = ((1, 3600), (10, 8640), (60, 10080), (3600, 8760))
+
+# Fixed-width record: bucket number (ts // step), sample count and the field
+# means. A slot is valid only if its stored bucket matches the one being looked
+# up, so stale data from a previous lap of the ring is ignored without clearing.
+RECORD = struct.Struct("<qI" + "f" * len(FIELDS))
+
+class Tier:
+    """One resolution: a round-robin file of `slots` records, memory-mapped."""
+
+    def __init__(self, directory, step, slots):
+        self.step = step
+        self.slots = slots
+        self.path = os.path.join(directory, f"metrics-{step}s.v2.bin")
+        size = slots * RECORD.size
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != size:
+                # New file or the layout changed: start from an empty ring
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+            self.mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.bucket = None
+        self.sums = [0.0] * len(FIELDS)
+        self.count = 0
+
+    def add(self, ts, values):
+        bucket = int(ts // self.step)
+        off = (bucket % self.slots) * RECORD.size
+        if bucket != self.bucket:
+            self.sums = [0.0] * len(FIELDS)
+            self.count = 0
+            if self.bucket is None:
+                # First sample since open: carry on with a bucket written
+                # before a restart instead of overwriting it
+                rec = RECORD.unpack_from(self.mm, off)
+                if rec[0] == bucket:
+                    self.count = rec[1]
+                    self.sums = [m * self.count for m in rec[2:]]
+            self.bucket = bucket
+        self.count += 1
+        for i, v in enumerate(values):
+            self.sums[i] += v
+        # Write the running mean through, so the open bucket is queryable
+        # and survives a crash
+        self.mm[off:off + RECORD.size] = RECORD.pack(bucket, self.count, *[s / self.count for s in self.sums])
+
+    def read(self, first, last):
+        """Yield (bucket, values) for valid buckets in [first, last]."""
+        first = max(first, last - self.slots + 1)
+        if first > last:
+            return
+        start = first % self.slots
+        n = last - first + 1
+        spans = [(start, min(n, self.slots - start))]
+        if spans[0][1] < n:
+            spans.append((0, n - spans[0][1]))
+        bucket = first
+        for slot, count in spans:
+            view = self.mm[slot * RECORD.size:(slot + count) * RECORD.size]
+            for rec in RECORD.iter_unpack(view):
+                if rec[0] == bucket:
+                    yield bucket, rec[2:]
+                bucket += 1
+
+    def retention(self):
+        return self.step * self.slots
+
+    def close(self):
+        try:
+            self.mm.flush()
+            self.mm.close()
+        except Exception:
+            pass
+
+class TimeSeriesStore:
+    """Fixed-size on-disk metric history at several resolutions. Every sample
+    is folded into each tier, so downsampling costs one record write per tier
+    and the files never grow."""
+
+    def __init__(self, directory, tiers=TIERS):
+        os.makedirs(directory, exist_ok=True)
+        self.tiers = [Tier(directory, step, slots) for step, slots in tiers]
+        self.lock = threading.Lock()
+
+    def add(self, snapshot):
+        values = []
+        for f in FIELDS:
+            try:
+                values.append(float(snapshot.get(f) or 0))
+            except (TypeError, ValueError):
+                values.append(0.0)
+        ts = snapshot.get("ts") or time.time()
+        with self.lock:
+            for tier in self.tiers:
+                tier.add(ts, values)
+
+    def pick_tier(self, start, step):
+        now = time.time()
+        covering = [t for t in self.tiers if now - t.retention() <= start]
+        if not covering:
+            return max(self.tiers, key=lambda t: t.retention())
+        fine_enough = [t for t in covering if t.step <= step]
+        if fine_enough:
+            return max(fine_enough, key=lambda t: t.step)
+        return min(covering, key=lambda t: t.step)
+
+    def query(self, start, end, step=None, max_points=2000):
+        """Return points between start and end (unix seconds) averaged into
+        `step`-second buckets: {"step", "tier", "fields", "points": [[ts, ...], ...]}."""
+        if end < start:
+            start, end = end, start
+        if not step or step <= 0:
+            step = max(1, math.ceil((end - start) / max_points))
+        # Never hand out more than max_points rows
+        step = max(step, math.ceil((end - start) / max_points))
+        tier = self.pick_tier(start, step)
+        step = max(step, tier.step)
+        ratio = max(1, int(step // tier.step))
+        step = ratio * tier.step
+        first = int(start // tier.step)
+        last = int(end // tier.step)
+        points = []
+        group = None
+        sums = None
+        count = 0
+        with self.lock:
+            rows = list(tier.read(first, last))
+        for bucket, values in rows:
+            g = bucket // ratio
+            if g != group:
+                if count:
+                    points.append([group * step] + [round(s / count, 2) for s in sums])
+                group = g
+                sums = [0.0] * len(FIELDS)
+                count = 0
+            for i, v in enumerate(values):
+                sums[i] += v
+            count += 1
+        if count:
+            points.append([group * step] + [round(s / count, 2) for s in sums])
+        return {"step": step, "tier": tier.step, "fields": list(FIELDS), "points": points}
+
+    def close(self):
+        with self.lock:
+            for tier in self.tiers:
+                tier.close()
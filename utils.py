@@ -2,7 +2,9 @@ import os
 import subprocess
 import psutil
 import socket
+from datetime import datetime
 from flask import abort
+from gpu import get_gpu_provider
 
 def safe_join(base, *paths):
     candidate = os.path.abspath(os.path.join(base, *paths))
@@ -70,61 +72,14 @@ def bytes_human(value):
         return f"{int(v)} {units[i]}"
     return f"{v:.1f} {units[i]}"
 
-def get_gpu_info():
-    gpus = []
-    # Try NVML (NVIDIA)
+def format_timestamp(value):
     try:
-        import pynvml
-        pynvml.nvmlInit()
-        count = pynvml.nvmlDeviceGetCount()
-        for i in range(count):
-            h = pynvml.nvmlDeviceGetHandleByIndex(i)
-            util = pynvml.nvmlDeviceGetUtilizationRates(h)
-            mem = pynvml.nvmlDeviceGetMemoryInfo(h)
-            name = pynvml.nvmlDeviceGetName(h).decode("utf-8", errors="ignore")
-            gpus.append(
-                {
-                    "index": i,
-                    "name": name,
-                    "util_percent": int(getattr(util, "gpu", 0)),
-                    "mem_total": int(getattr(mem, "total", 0)),
-                    "mem_used": int(getattr(mem, "used", 0)),
-                }
-            )
-        pynvml.nvmlShutdown()
-        return gpus
-    except Exception:
-        pass
-    # Fallback to nvidia-smi if available
-    try:
-        proc = subprocess.run(
-            ["nvidia-smi", "--query-gpu=name,utilization.gpu,memory.total,memory.used", "--format=csv,noheader,nounits"],
-            capture_output=True,
-            text=True,
-            encoding="utf-8",
-            errors="replace",
-            timeout=3,
-        )
-        if proc.returncode == 0 and proc.stdout:
-            for idx, line in enumerate(proc.stdout.strip().splitlines()):
-                parts = [p.strip() for p in line.split(",")]
-                if len(parts) >= 4:
-                    try:
-                        name, util, mem_total, mem_used = parts[:4]
-                        gpus.append(
-                            {
-                                "index": idx,
-                                "name": name,
-                                "util_percent": int(float(util)),
-                                "mem_total": int(float(mem_total) * 1024 * 1024),  # MB -> bytes
-                                "mem_used": int(float(mem_used) * 1024 * 1024),
-                            }
-                        )
-                    except Exception:
-                        continue
+        return datetime.fromtimestamp(float(value)).strftime("%Y-%m-%d %H:%M:%S")
     except Exception:
-        pass
-    return gpus
+        return value
+
+def get_gpu_info():
+    return get_gpu_provider().read()
 
 def parse_sc_query():
     if os.name == 'posix':